@@ -1,10 +1,14 @@
 import math
 import json
 import pycurl
+import random
 import sys
 
 from . import tests
 from .tests import Test
+from .binding import Context
+from .contenthandling import ContentHandler
+from .histogram import MetricHistogram, DEFAULT_HISTOGRAM_PRECISION, MAX_HISTOGRAM_PRECISION
 from . import parsing
 from .parsing import *
 
@@ -73,6 +77,11 @@ METRICS = {
     'num_connects': pycurl.NUM_CONNECTS
 }
 
+# Timing metrics measured from the start of a call
+# With rate-based benchmarks these are measured from when the call was scheduled to start
+SCHEDULED_TIME_METRICS = set(['namelookup_time', 'connect_time', 'appconnect_time',
+                              'pretransfer_time', 'starttransfer_time', 'total_time'])
+
 # Map statistical aggregate to the function to use to perform the
 # aggregation on an array
 AGGREGATES = {
@@ -81,40 +90,117 @@ AGGREGATES = {
     'mean':  # Alias for arithmetic mean
     lambda x: float(sum(x)) / float(len(x)),
     'mean_harmonic':  # Harmonic mean, better predicts average of rates: http://en.wikipedia.org/wiki/Harmonic_mean
-    lambda x: 1.0 / (sum([1.0 / float(y) for y in x]) / float(len(x))),
+    lambda x: 1.0 / (sum(1.0 / float(y) for y in x) / float(len(x))),
     'median': lambda x: median(x),
     'std_deviation': lambda x: std_deviation(x),
     'sum': lambda x: sum(x),
-    'total': lambda x: sum(x)
+    'total': lambda x: sum(x),
+    'min': lambda x: min(x),
+    'max': lambda x: max(x)
+}
+
+# Map statistical aggregate to the function to compute it from a MetricHistogram of the values
+# Mean, sum, min, max, std deviation and harmonic mean are exact, the rest are accurate to the histogram precision
+HISTOGRAM_AGGREGATES = {
+    'mean_arithmetic': lambda x: x.get_mean(),
+    'mean': lambda x: x.get_mean(),
+    'mean_harmonic': lambda x: x.get_harmonic_mean(),
+    'median': lambda x: x.get_percentile(50),
+    'std_deviation': lambda x: x.get_std_deviation(),
+    'sum': lambda x: x.sum,
+    'total': lambda x: x.sum,
+    'min': lambda x: x.min,
+    'max': lambda x: x.max
 }
 
+# Percentile aggregates are named with this and the percentile, such as 'percentile_99.9'
+PERCENTILE_PREFIX = 'percentile_'
+
+# Not a statistical aggregate: includes the histogram of the metric's values in the output
+HISTOGRAM = 'histogram'
+
 OUTPUT_FORMATS = [u'csv', u'json']
 
 
+def select(array, index):
+    """ Get the value at index in the sorted array, without sorting it
+        Uses quickselect, which takes linear time on average """
+    values = array
+    while True:
+        pivot = random.choice(values)
+        lower = [x for x in values if x < pivot]
+        if index < len(lower):
+            values = lower
+            continue
+        upper = [x for x in values if x > pivot]
+        equal = len(values) - len(lower) - len(upper)
+        if index < len(lower) + equal:
+            return pivot
+        index = index - len(lower) - equal
+        values = upper
+
+
 def median(array):
     """ Get the median of an array """
-    mysorted = [x for x in array]
-    mysorted.sort()
-    middle = int(len(mysorted) / 2)  # Gets the middle element, if present
-    if len(mysorted) % 2 == 0:  # Even, so need to average together the middle two values
-        return float((mysorted[middle] + mysorted[middle - 1])) / 2
+    middle = int(len(array) / 2)  # Gets the middle element, if present
+    if len(array) % 2 == 0:  # Even, so need to average together the middle two values
+        return float((select(array, middle) + select(array, middle - 1))) / 2
     else:
-        return mysorted[middle]
+        return select(array, middle)
+
+
+def percentile(array, percentile):
+    """ Get the value in an array that percentile percent of values are less than or equal to (nearest rank)
+        0 gives the minimum and 100 the maximum """
+    rank = int(math.ceil(percentile / 100.0 * len(array)))
+    return select(array, min(max(rank, 1), len(array)) - 1)
+
+
+def parse_percentile(aggregate_name):
+    """ Get the percentile from a percentile aggregate name such as 'percentile_99.9', or None if it isn't one """
+    if not aggregate_name.startswith(PERCENTILE_PREFIX):
+        return None
+    try:
+        value = float(aggregate_name[len(PERCENTILE_PREFIX):])
+    except ValueError:
+        return None
+    if value < 0 or value > 100:
+        return None
+    return value
+
+
+def get_aggregate(aggregate_name, histogram=False):
+    """ Get the function to compute an aggregate from an array of values,
+        or from a MetricHistogram of them if histogram is set
+        Returns None if the aggregate name isn't legal """
+    aggregates = AGGREGATES
+    if histogram:
+        aggregates = HISTOGRAM_AGGREGATES
+    function = aggregates.get(aggregate_name)
+    if function is None:
+        value = parse_percentile(aggregate_name)
+        if value is not None and histogram:
+            function = lambda x: x.get_percentile(value)
+        elif value is not None:
+            function = lambda x: percentile(x, value)
+    return function
 
 
 def std_deviation(array):
-    """ Compute the standard deviation of an array of numbers """
+    """ Compute the standard deviation of an array of numbers
+        Uses Welford's method, in one pass without building a list of differences """
     if not array or len(array) == 1:
         return 0
 
-    average = AGGREGATES['mean_arithmetic'](array)
-    variance = map(lambda x: (x - average)**2, array)
-    try:
-        len(variance)
-    except TypeError:  # Python 3.3 workaround until can use the statistics module from 3.4
-        variance = list(variance)
-    stdev = AGGREGATES['mean_arithmetic'](variance)
-    return math.sqrt(stdev)
+    count = 0
+    mean = 0.0
+    squares = 0.0
+    for value in array:
+        count = count + 1
+        delta = value - mean
+        mean = mean + delta / count
+        squares = squares + delta * (value - mean)
+    return math.sqrt(squares / count)
 
 
 class Benchmark(Test):
@@ -129,8 +215,13 @@ class Benchmark(Test):
     """
     warmup_runs = 10  # Times call is executed to warm up
     benchmark_runs = 100  # Times call is executed to generate benchmark results
+    concurrency = 1  # Number of calls in flight at once, simulating concurrent clients
+    rate = None  # If set, start calls on a fixed schedule of this many per second
+    duration = None  # If set, run calls for this many seconds rather than benchmark_runs times
+    profile = None  # If set, list of BenchmarkStages to run one after another
     output_format = u'csv'
     output_file = None
+    definition = None  # (base_url, configuration) this was parsed from, to send to distributed workers
 
     # Metrics to gather, both raw and aggregated
     metrics = set()
@@ -139,6 +230,8 @@ class Benchmark(Test):
     # Metrics where an aggregate is computed, maps key(metric name) ->
     # list(aggregates to use)
     aggregated_metrics = dict()
+    histogram_metrics = set()  # Metrics where the histogram of values is output
+    histogram_precision = DEFAULT_HISTOGRAM_PRECISION  # Significant digits for metric histograms
 
     def ninja_copy(self):
         """ Optimization: limited, fast copy of benchmark, overrides Test parent method """
@@ -149,7 +242,7 @@ class Benchmark(Test):
 
     def add_metric(self, metric_name, aggregate=None):
         """ Add a metric-aggregate pair to the benchmark, where metric is a number to measure from curl, and aggregate is an aggregation function
-            (See METRICS and AGGREGATES)
+            (See METRICS and AGGREGATES, or a percentile such as 'percentile_99.9')
             If aggregate is not defined (False,empty, or None), then the raw number is reported
             Returns self, for fluent-syle construction of config """
 
@@ -162,7 +255,9 @@ class Benchmark(Test):
 
         if not aggregate:
             self.raw_metrics.add(clean_metric)
-        elif aggregate.lower().strip() in AGGREGATES:
+        elif aggregate.lower().strip() == HISTOGRAM:
+            self.histogram_metrics.add(clean_metric)
+        elif get_aggregate(aggregate.lower().strip()) is not None:
             # Add aggregate to this metric
             clean_aggregate = aggregate.lower().strip()
             current_aggregates = self.aggregated_metrics.get(
@@ -175,36 +270,176 @@ class Benchmark(Test):
 
         return self
 
+    def create_metric_recorder(self, metric_name):
+        """ Create a MetricRecorder for values of a metric, keeping raw values only if it is a raw metric """
+        values = None
+        if metric_name in self.raw_metrics:
+            values = list()
+        histogram = None
+        if metric_name in self.aggregated_metrics or metric_name in self.histogram_metrics:
+            histogram = MetricHistogram(self.histogram_precision)
+        return MetricRecorder(values, histogram)
+
+    def realize_partial(self, context=None):
+        """ Template out everything that stays the same from run to run, overrides Test parent method
+            Returns a copy of the benchmark where only fields using variables set by generator_binds
+            are still templated, so only those are templated again for each run.
+            Static variable_binds are applied first, and files are read now unless their path is templated.
+        """
+        if not self.is_dynamic() and not isinstance(self._body, ContentHandler):
+            return self
+
+        # Benchmarks don't run extractors, so only generators change variables between runs
+        changing = set()
+        if self.generator_binds:
+            changing.update(str(key) for key in self.generator_binds.keys())
+        partial_context = Context()
+        if context is not None:
+            partial_context.bind_variables(context.get_values())
+        if self.variable_binds:
+            partial_context.bind_variables(self.variable_binds)
+
+        output = self.ninja_copy()
+        output._realized = None
+        output.templates = dict(self.templates or dict())
+        if self.NAME_URL in output.templates and not output.templates[self.NAME_URL].names & changing:
+            output._url = self.get_url(context=partial_context)
+            del output.templates[self.NAME_URL]
+        if self.NAME_HEADERS in output.templates:
+            header_names = set()
+            for key, val in output.templates[self.NAME_HEADERS]:
+                header_names.update(key.names)
+                header_names.update(val.names)
+            if not header_names & changing:
+                output._headers = self.get_headers(context=partial_context)
+                del output.templates[self.NAME_HEADERS]
+
+        body = self._body
+        if isinstance(body, ContentHandler):
+            body_names = body.get_template_variables()
+            if body_names is not None and not body_names & changing:
+                output._body = body.get_content(context=partial_context)
+            elif body.is_file and not body.is_template_path:
+                output._body = body.create_noread_version()
+        return output
+
     def __init__(self):
         self.metrics = set()
         self.raw_metrics = set()
         self.aggregated_metrics = dict()
+        self.histogram_metrics = set()
         super(Benchmark, self).__init__()
 
     def __str__(self):
         return json.dumps(self, default=safe_to_json)
 
 
-def realize_partial(self, context=None):
-    """ Attempt to template out what is possible for this benchmark """
-    if not self.is_dynamic():
-        return self
-    if self.is_context_modifier():
-        # Enhanceme - once extract is done, check if variables already bound,
-        # in that case template out
-        return self
-    else:
-        copyout = copy.cop
+class MetricRecorder(object):
+    """ Stores the values of one metric from benchmark calls
+        Values go into a MetricHistogram if aggregates are needed, so memory use doesn't grow with
+        the number of calls, and are only kept in a list as well if raw values are needed """
+    __slots__ = ('values', 'histogram')
+
+    def __init__(self, values=None, histogram=None):
+        self.values = values
+        self.histogram = histogram
+
+    def record(self, value):
+        if self.values is not None:
+            self.values.append(value)
+        if self.histogram is not None:
+            self.histogram.record(value)
 
-    pass
+    def merge(self, other):
+        """ Add values from another recorder for the same metric """
+        if self.values is not None:
+            self.values.extend(other.values)
+        if self.histogram is not None:
+            self.histogram.merge(other.histogram)
 
 
-def configure_curl(self, timeout=tests.DEFAULT_TIMEOUT, context=None, curl_handle=None):
-    curl = super().configure_curl(self, timeout=timeout,
-                                  context=context, curl_handle=curl_handle)
-    # Simulate results from different users hitting server
-    curl.setopt(pycurl.FORBID_REUSE, 1)
-    return curl
+class BenchmarkStage(object):
+    """ One stage of a benchmark load profile, run for a fixed duration in seconds
+
+        Concurrency and rate are either a single value, or a (start, end) tuple
+        that ramps linearly from start to end over the stage duration
+    """
+    duration = None
+    concurrency = None  # Calls in flight at once, if None the benchmark concurrency is used
+    rate = None  # Calls started per second, if None calls start as soon as concurrency allows
+
+    def __str__(self):
+        return json.dumps(self, default=safe_to_json)
+
+
+def parse_load_level(name, value, minimum=0):
+    """ Parse a concurrency or rate for a benchmark stage, which must be greater than minimum
+        Value is a single number, or a list of [start, end] numbers for a linear ramp """
+    if isinstance(value, list) or isinstance(value, tuple):
+        if len(value) != 2:
+            raise ValueError(
+                "Invalid benchmark stage {0}, ramp must be a list of [start, end]: {1}".format(name, value))
+        level = (float(value[0]), float(value[1]))
+        levels = level
+    else:
+        level = float(value)
+        levels = (level,)
+    for x in levels:
+        if x <= minimum:
+            raise ValueError(
+                "Invalid benchmark stage {0}, must be greater than {1}: {2}".format(name, minimum, value))
+    return level
+
+
+def parse_benchmark_stage(node):
+    """ Parse one stage of a benchmark load profile from configuration """
+    node = lowercase_keys(flatten_dictionaries(node))
+    if not isinstance(node, dict):
+        raise TypeError("Invalid benchmark stage, must be a dictionary: " + str(node))
+
+    stage = BenchmarkStage()
+    for key, value in node.items():
+        if key == u'duration':
+            stage.duration = float(value)
+            if stage.duration <= 0:
+                raise ValueError(
+                    "Invalid benchmark stage duration, must be greater than 0: {0}".format(value))
+        elif key == u'concurrency':
+            stage.concurrency = parse_load_level(u'concurrency', value, minimum=0)
+        elif key == u'rate':
+            stage.rate = parse_load_level(u'rate', value, minimum=0)
+        else:
+            raise ValueError("Invalid benchmark stage option: " + str(key))
+
+    if stage.duration is None:
+        raise ValueError("Benchmark stage must have a duration: " + str(node))
+    return stage
+
+
+def parse_metric_aggregate(benchmark, metricname, aggregate):
+    """ Add a metric with an aggregate from configuration to the benchmark
+        The aggregate is a name, or {percentiles: [50, 99, 99.9]} to add percentile aggregates """
+    if not isinstance(metricname, basestring):
+        raise TypeError(
+            "Invalid metric input: non-string metric name")
+    if isinstance(aggregate, dict):
+        aggregate = lowercase_keys(aggregate)
+        percentiles = aggregate.get(u'percentiles')
+        if len(aggregate) != 1 or not isinstance(percentiles, list):
+            raise TypeError(
+                "Invalid aggregate input: must be an aggregate name or {percentiles: [list of percentiles]}")
+        for value in percentiles:
+            aggregate_name = PERCENTILE_PREFIX + '{0:g}'.format(float(value))
+            if parse_percentile(aggregate_name) is None:
+                raise ValueError("Invalid percentile, must be from 0 to 100: {0}".format(value))
+            # TODO unicode-safe this
+            benchmark.add_metric(tests.coerce_to_string(metricname), aggregate_name)
+    elif isinstance(aggregate, basestring):
+        benchmark.add_metric(tests.coerce_to_string(metricname),
+            tests.coerce_to_string(aggregate))
+    else:
+        raise TypeError(
+            "Invalid aggregate input: non-string aggregate name")
 
 
 def parse_benchmark(base_url, node):
@@ -215,6 +450,7 @@ def parse_benchmark(base_url, node):
 
     # Read & set basic test parameters
     benchmark = Test.parse_test(base_url, node, benchmark)
+    benchmark.definition = (base_url, node)
 
     # Complex parsing because of list/dictionary/singleton legal cases
     for key, value in node.items():
@@ -222,12 +458,36 @@ def parse_benchmark(base_url, node):
             benchmark.warmup_runs = int(value)
         elif key == u'benchmark_runs':
             benchmark.benchmark_runs = int(value)
+        elif key == u'concurrency':
+            benchmark.concurrency = int(value)
+            if benchmark.concurrency < 1:
+                raise ValueError(
+                    "Invalid benchmark concurrency, must be at least 1: {0}".format(value))
+        elif key == u'rate':
+            benchmark.rate = float(value)
+            if benchmark.rate <= 0:
+                raise ValueError(
+                    "Invalid benchmark rate, must be greater than 0: {0}".format(value))
+        elif key == u'duration':
+            benchmark.duration = float(value)
+            if benchmark.duration <= 0:
+                raise ValueError(
+                    "Invalid benchmark duration, must be greater than 0: {0}".format(value))
+        elif key == u'profile':
+            if not isinstance(value, list) or not value:
+                raise TypeError("Invalid benchmark profile, must be a list of stages: " + str(value))
+            benchmark.profile = [parse_benchmark_stage(stage) for stage in value]
         elif key == u'output_format':
             format = value.lower()
             if format in OUTPUT_FORMATS:
                 benchmark.output_format = format
             else:
                 raise ValueError('Invalid benchmark output format: ' + format)
+        elif key == u'histogram_precision':
+            benchmark.histogram_precision = int(value)
+            if benchmark.histogram_precision < 1 or benchmark.histogram_precision > MAX_HISTOGRAM_PRECISION:
+                raise ValueError(
+                    "Invalid benchmark histogram precision, must be from 1 to {0}: {1}".format(MAX_HISTOGRAM_PRECISION, value))
         elif key == u'output_file':
             if not isinstance(value, basestring):
                 raise ValueError("Invalid output file format")
@@ -236,35 +496,19 @@ def parse_benchmark(base_url, node):
             if isinstance(value, basestring):
                 # Single value
                 benchmark.add_metric(tests.coerce_to_string(value))
-            # FIXME refactor the parsing of metrics here, lots of duplicated logic
             elif isinstance(value, list) or isinstance(value, set):
                 # List of single values or list of {metric:aggregate, ...}
                 for metric in value:
                     if isinstance(metric, dict):
                         for metricname, aggregate in metric.items():
-                            if not isinstance(metricname, basestring):
-                                raise TypeError(
-                                    "Invalid metric input: non-string metric name")
-                            if not isinstance(aggregate, basestring):
-                                raise TypeError(
-                                    "Invalid aggregate input: non-string aggregate name")
-                            # TODO unicode-safe this
-                            benchmark.add_metric(tests.coerce_to_string(metricname),
-                                tests.coerce_to_string(aggregate))
+                            parse_metric_aggregate(benchmark, metricname, aggregate)
 
                     elif isinstance(metric, basestring):
                         benchmark.add_metric(tests.coerce_to_string(metric))
             elif isinstance(value, dict):
                 # Dictionary of metric-aggregate pairs
                 for metricname, aggregate in value.items():
-                    if not isinstance(metricname, basestring):
-                        raise TypeError(
-                            "Invalid metric input: non-string metric name")
-                    if not isinstance(aggregate, basestring):
-                        raise TypeError(
-                            "Invalid aggregate input: non-string aggregate name")
-                    benchmark.add_metric(tests.coerce_to_string(metricname),
-                        tests.coerce_to_string(aggregate))
+                    parse_metric_aggregate(benchmark, metricname, aggregate)
             else:
                 raise TypeError(
                     "Invalid benchmark metric datatype: " + str(value))
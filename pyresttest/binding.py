@@ -20,8 +20,9 @@ class Context(object):
             This allows for passing in variables in testing """
         str_name = str(variable_name)
         prev = self.variables.get(str_name)
-        if prev != variable_value:
-            self.variables[str(variable_name)] = variable_value
+        # Equal values of another type (1 and True or 1.0) still template differently
+        if prev != variable_value or type(prev) != type(variable_value):
+            self.variables[str_name] = variable_value
             self.mod_count = self.mod_count + 1
             #logging.debug('Context: altered variable named {0} to value {1}'.format(str_name, variable_value))
 
@@ -47,7 +48,7 @@ class Context(object):
         val = next(self.generators[str_gen_name])
 
         prev = self.variables.get(str_name)
-        if prev != val:
+        if prev != val or type(prev) != type(val):
             self.variables[str_name] = val
             self.mod_count = self.mod_count + 1
             # Logging is /expensive/
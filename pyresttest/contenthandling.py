@@ -33,6 +33,8 @@ class ContentHandler:
     is_file = False
     is_template_path = False
     is_template_content = False
+    path_template = None  # CompiledTemplate for a templated path
+    content_template = None  # CompiledTemplate for the last templated content
 
     def is_dynamic(self):
         """ Is templating used? """
@@ -44,22 +46,47 @@ class ContentHandler:
         if self.is_file:
             path = self.content
             if self.is_template_path and context:
-                path = string.Template(path).safe_substitute(
-                    context.get_values())
+                self.path_template = compile_template(path, self.path_template)
+                path = self.path_template.render(context.get_values())
             data = None
             with open(path, 'r') as f:
                 data = f.read()
 
             if self.is_template_content and context:
-                return string.Template(data).safe_substitute(context.get_values())
+                # Only recompiled if the file content changes
+                self.content_template = compile_template(data, self.content_template)
+                return self.content_template.render(context.get_values())
             else:
                 return data
         else:
             if self.is_template_content and context:
-                return safe_substitute_unicode_template(self.content, context.get_values())
+                content = self.content
+                if PYTHON_MAJOR_VERSION == 2 and isinstance(content, binary_type):
+                    content = text_type(content, 'utf-8')  # Unicode templating, as with safe_substitute_unicode_template
+                self.content_template = compile_template(content, self.content_template)
+                return self.content_template.render(context.get_values())
             else:
                 return self.content
 
+    def get_template_variables(self):
+        """ Return the set of context variable names templating reads,
+            or None if they can't be known before templating (including if the file can't be read now) """
+        names = set()
+        if self.is_template_path:
+            names.update(get_template_variables(self.content))
+            if self.is_template_content:
+                return None  # File to read isn't known until path is templated
+        elif self.is_template_content:
+            data = self.content
+            if self.is_file:
+                try:
+                    with open(self.content, 'r') as f:
+                        data = f.read()
+                except (IOError, OSError):
+                    return None  # The test reports the error when it runs
+            names.update(get_template_variables(data))
+        return names
+
     def create_noread_version(self):
         """ Read file content if it is static and return content handler with no I/O """
         if not self.is_file or self.is_template_path:
@@ -1,6 +1,6 @@
 import traceback
-import json
 import sys
+from collections import OrderedDict
 PYTHON_MAJOR_VERSION = sys.version_info[0]
 
 import yaml
@@ -12,27 +12,48 @@ try:  # First try to load pyresttest from global namespace
     from pyresttest import binding
     from pyresttest import parsing
     from pyresttest import contenthandling
+    from pyresttest import responsehandling
 except ImportError:  # Then try a relative import if possible
     from .. import validators
     from .. import binding
     from .. import parsing
     from .. import contenthandling
+    from .. import responsehandling
+
+# Least recently used cache of compiled expressions for templated queries, by templated query string
+COMPILED_EXPRESSIONS = OrderedDict()
+MAX_COMPILED_EXPRESSIONS = 128
+
+
+def compile_expression(query):
+    """ Compile a JMESPath expression, using the cache if possible """
+    expression = COMPILED_EXPRESSIONS.pop(query, None)
+    if expression is None:
+        expression = jmespath.compile(query)
+        if len(COMPILED_EXPRESSIONS) >= MAX_COMPILED_EXPRESSIONS:
+            COMPILED_EXPRESSIONS.popitem(last=False)
+    COMPILED_EXPRESSIONS[query] = expression  # Now most recently used
+    return expression
+
 
 class JMESPathExtractor(validators.AbstractExtractor):
     """ Extractor that uses JMESPath syntax
         See http://jmespath.org/specification.html for details
+
+        Queries are compiled once at parse time, or for templated queries, once per
+        templated query string while it stays in the cache
     """
     extractor_type = 'jmespath'
     is_body_extractor = True
+    compiled_query = None  # Compiled expression for a query that isn't templated
 
     def extract_internal(self, query=None, args=None, body=None, headers=None):
-        mybody = body
-        if PYTHON_MAJOR_VERSION > 2:
-            if isinstance(mybody, bytes):
-                mybody = str(mybody, 'utf-8')
-
         try:
-            res = jmespath.search(query, json.loads(mybody)) # Better way
+            if self.compiled_query is not None and query == self.query:
+                expression = self.compiled_query
+            else:
+                expression = compile_expression(query)
+            res = expression.search(responsehandling.get_body_json(body)) # Better way
             return res
         except Exception as e:
             raise ValueError("Invalid query: " + query + " : " + str(e))
@@ -40,7 +61,12 @@ class JMESPathExtractor(validators.AbstractExtractor):
     @classmethod
     def parse(cls, config):
         base = JMESPathExtractor()
-        return cls.configure_base(config, base)
+        base = cls.configure_base(config, base)
+        if not base.is_templated:
+            try:
+                base.compiled_query = jmespath.compile(base.query)
+            except Exception:
+                pass  # Invalid queries fail when extracting, like other extraction errors
         return base
 
 EXTRACTORS = {'jmespath': JMESPathExtractor.parse}
@@ -1,5 +1,6 @@
 import traceback
-import json
+import os
+from collections import OrderedDict
 
 from sys import version_info
 import yaml
@@ -12,28 +13,72 @@ try:  # First try to load pyresttest from global namespace
     from pyresttest import binding
     from pyresttest import parsing
     from pyresttest import contenthandling    
+    from pyresttest import responsehandling
 except ImportError:  # Then try a relative import if possible
     from .. import validators
     from .. import binding
     from .. import parsing
     from .. import contenthandling
+    from .. import responsehandling
+
+# Least recently used cache of compiled schema validators, by rendered schema text
+COMPILED_SCHEMAS = OrderedDict()
+MAX_COMPILED_SCHEMAS = 64
+
+
+def compile_schema(schema_text):
+    """ Parse a schema and build a jsonschema validator for it, checking the schema is valid
+        Raises a jsonschema.exceptions.SchemaError if not """
+    schema = yaml.safe_load(schema_text)
+    validator_class = jsonschema.validators.validator_for(schema)
+    validator_class.check_schema(schema)
+    return validator_class(schema)
+
+
+def get_compiled_schema(schema_text):
+    """ Get a validator for a schema, using the cache if possible """
+    compiled = COMPILED_SCHEMAS.pop(schema_text, None)
+    if compiled is None:
+        compiled = compile_schema(schema_text)
+        if len(COMPILED_SCHEMAS) >= MAX_COMPILED_SCHEMAS:
+            COMPILED_SCHEMAS.popitem(last=False)
+    COMPILED_SCHEMAS[schema_text] = compiled  # Now most recently used
+    return compiled
+
 
 class JsonSchemaValidator(validators.AbstractValidator):
-    """ Json schema validator using the jsonschema library """
+    """ Json schema validator using the jsonschema library
+
+        The schema is parsed and checked once, not for every response.
+        Static schemas are compiled on first use, and schemas in files are recompiled if the file changes.
+        Templated schemas are compiled once per rendered schema, while it stays in the cache.
+    """
     schema = None
+    compiled_schema = None  # Validator for a static schema
+    schema_file_state = None  # (modification time, size) of the static schema file when compiled
+
+    def get_compiled_schema(self, context=None):
+        """ Get the jsonschema validator for the schema, rendered with context if templated """
+        schema = self.schema
+        if schema.is_dynamic():
+            return get_compiled_schema(schema.get_content(context=context))
+
+        file_state = None
+        if schema.is_file:
+            stat = os.stat(schema.content)
+            file_state = (stat.st_mtime, stat.st_size)
+        if self.compiled_schema is None or file_state != self.schema_file_state:
+            self.compiled_schema = compile_schema(schema.get_content(context=context))
+            self.schema_file_state = file_state
+        return self.compiled_schema
 
     def validate(self, body=None, headers=None, context=None):
-        schema_text = self.schema.get_content(context=context)
-        schema = yaml.safe_load(schema_text)
-        # TODO add caching of parsed schema
+        compiled_schema = self.get_compiled_schema(context=context)
 
         try:
             # TODO try draft3/draft4 iter_errors -
             # https://python-jsonschema.readthedocs.org/en/latest/validate/#jsonschema.IValidator.iter_errors
-            parsed_body = body
-            if PYTHON_MAJOR_VERSION > 2 and isinstance(body, bytes):
-                parsed_body = str(body, 'utf-8')
-            jsonschema.validate(json.loads(parsed_body), schema)
+            compiled_schema.validate(responsehandling.get_body_json(body))
             return True
         except jsonschema.exceptions.ValidationError as ve:
             trace = traceback.format_exc()
@@ -42,6 +87,9 @@ class JsonSchemaValidator(validators.AbstractValidator):
     def get_readable_config(self, context=None):
         return "JSON schema validation"
 
+    def get_template_variables(self):
+        return self.schema.get_template_variables()
+
     @classmethod
     def parse(cls, config):
         validator = JsonSchemaValidator()
@@ -3,8 +3,11 @@ import os
 import sys
 import time
 import json
+import socket
+import threading
 import unittest
 import logging
+import pycurl
 from multiprocessing import Process
 
 from django.core.management import call_command
@@ -20,6 +23,8 @@ from . import validators
 from . import six
 from .six import text_type
 from .six import binary_type
+from .six.moves import BaseHTTPServer
+from .six.moves import socketserver
 
 # Django testing settings, initial configuration
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "testapp.settings")
@@ -32,6 +37,26 @@ logging.basicConfig(level=logging.WARNING)
 """ Full functional testing of REST test suite, using a basic Django-tastypie REST app """
 
 
+class KeepAliveHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    """ Answers every GET with an empty JSON list, over HTTP/1.1 so connections stay open """
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        body = b'[]'
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class KeepAliveServer(socketserver.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+    daemon_threads = True
+
+
 class RestTestCase(unittest.TestCase):
     server_process = None
     prefix = 'http://localhost:8000'
@@ -58,6 +83,47 @@ class RestTestCase(unittest.TestCase):
         self.assertTrue(test_response.passed)
         self.assertEqual(200, test_response.response_code)
 
+    def test_get_keep_alive(self):
+        """ Connections are closed after each test unless keep_alive is set """
+        # The Django dev server speaks HTTP/1.0 and closes connections itself,
+        # so this uses a minimal HTTP/1.1 server that keeps them open
+        server = KeepAliveServer(('127.0.0.1', 0), KeepAliveHandler)
+        thread = threading.Thread(target=server.serve_forever)
+        thread.daemon = True
+        thread.start()
+        curl = pycurl.Curl()
+        try:
+            test = Test()
+            test.url = 'http://127.0.0.1:{0}/api/person/'.format(server.server_address[1])
+            test_config = resttest.TestConfig()
+            results = [resttest.run_test(test, test_config=test_config, curl_handle=curl) for x in range(0, 2)]
+            self.assertTrue(results[0].passed and results[1].passed)
+            self.assertEqual([1, 1], [x.num_connects for x in results])
+
+            # The second call reuses the connection the first left open
+            test_config.keep_alive = True
+            results = [resttest.run_test(test, test_config=test_config, curl_handle=curl) for x in range(0, 2)]
+            self.assertTrue(results[0].passed and results[1].passed)
+            self.assertEqual([1, 0], [x.num_connects for x in results])
+
+            # Turning keep_alive back off opens a new connection again
+            test_config.keep_alive = False
+            results = [resttest.run_test(test, test_config=test_config, curl_handle=curl) for x in range(0, 2)]
+            self.assertEqual(1, results[1].num_connects)
+        finally:
+            curl.close()
+            server.shutdown()
+            server.server_close()
+
+    def test_get_http_version(self):
+        """ Basic local get test, with HTTP versions the test server can use """
+        test = Test()
+        test.url = self.prefix + '/api/person/'
+        for http_version in ('1.0', '1.1', '2'):  # HTTP/2 falls back to 1.1 here
+            test_config = resttest.parse_configuration({'http_version': http_version})
+            test_response = resttest.run_test(test, test_config=test_config)
+            self.assertTrue(test_response.passed)
+
     def test_head(self):
         """ Calls github API to test the HEAD method, ugly but Django tastypie won't support it """
         test = Test()
@@ -292,6 +358,55 @@ class RestTestCase(unittest.TestCase):
         self.assertTrue(
             failures == 0, 'Simple tests failed where success expected')
 
+    def test_full_context_use_parallel(self):
+        """ Read and execute test set with context use, running tests in parallel where safe """
+        path = os.path.join(os.path.dirname(
+            os.path.realpath(__file__)), 'content-test.yaml')
+        tests = resttest.parse_testsets('http://localhost:8000', resttest.read_test_file(
+            path), working_directory=os.path.dirname(os.path.realpath(__file__)))
+        for testset in tests:
+            testset.config.test_parallel = True
+            testset.config.max_parallel = 1  # Tests in this file depend on server state
+        failures = resttest.run_testsets(tests)
+        self.assertTrue(
+            failures == 0, 'Parallel tests failed where success expected')
+
+    def test_run_tests_parallel(self):
+        """ Run independent tests concurrently, results come back in test order """
+        mytests = list()
+        for x in range(0, 10):
+            test = Test()
+            test.name = 'Get ' + str(x)
+            test.url = self.prefix + '/api/person/'
+            mytests.append(test)
+        failed = Test()
+        failed.url = self.prefix + '/api/person/500/'
+        mytests.append(failed)
+
+        config = resttest.TestConfig()
+        config.max_parallel = 4
+        results = resttest.run_tests_parallel(mytests, test_config=config)
+        self.assertEqual(len(mytests), len(results))
+        for x in range(0, len(mytests)):
+            self.assertTrue(mytests[x] is results[x][0])
+        for test, result in results[0:10]:
+            self.assertTrue(result.passed)
+            self.assertEqual(200, result.response_code)
+        self.assertFalse(results[10][1].passed)
+        self.assertEqual(404, results[10][1].response_code)
+
+    def test_run_testsets_workers(self):
+        """ Run test sets from separate files in worker processes, merging results """
+        mydir = os.path.dirname(os.path.realpath(__file__))
+        testsets = list()
+        for filename in ('content-test.yaml', 'unicode-test.yaml'):
+            path = os.path.join(mydir, filename)
+            testsets.extend(resttest.parse_testsets('http://localhost:8000', resttest.read_test_file(
+                path), working_directory=mydir))
+        failures = resttest.run_testsets(testsets, workers=2)
+        self.assertTrue(
+            failures == 0, 'Tests run in worker processes failed where success expected')
+
     def test_unicode_use(self):
         """ Read and execute test set  with context use, from file """
 
@@ -317,6 +432,70 @@ class RestTestCase(unittest.TestCase):
         self.assertTrue(benchmark_config.benchmark_runs, len(
             benchmark_result.results['total_time']))
 
+    def test_benchmark_get_concurrent(self):
+        """ Benchmark basic local get test, with multiple calls in flight """
+        benchmark_config = resttest.Benchmark()
+        benchmark_config.url = self.prefix + '/api/person/'
+        benchmark_config.concurrency = 4
+        benchmark_config.add_metric(
+            'total_time').add_metric('total_time', 'median')
+        benchmark_result = resttest.run_benchmark(benchmark_config)
+        self.assertEqual(0, benchmark_result.failures)
+        self.assertEqual(benchmark_config.benchmark_runs, len(
+            benchmark_result.results['total_time']))
+        self.assertTrue(benchmark_result.throughput > 0)
+
+    def test_benchmark_get_rate(self):
+        """ Benchmark basic local get test, starting calls at a fixed rate """
+        benchmark_config = resttest.Benchmark()
+        benchmark_config.url = self.prefix + '/api/person/'
+        benchmark_config.warmup_runs = 0
+        benchmark_config.benchmark_runs = 20
+        benchmark_config.rate = 50
+        benchmark_config.add_metric('total_time', 'mean')
+        benchmark_result = resttest.run_benchmark(benchmark_config)
+        self.assertEqual(0, benchmark_result.failures)
+        # 20 calls at 50/second can't finish in under 0.38 seconds
+        self.assertTrue(benchmark_result.run_time >= 0.38)
+
+    def test_benchmark_get_profile(self):
+        """ Benchmark basic local get test, with a timed load profile of two stages """
+        benchmark_config = resttest.Benchmark()
+        benchmark_config.url = self.prefix + '/api/person/'
+        benchmark_config.warmup_runs = 0
+        benchmark_config.profile = resttest.parse_benchmark('', [{'profile': [
+            {'duration': 0.5, 'rate': [10, 30]},
+            {'duration': 0.5, 'concurrency': 2}
+        ]}]).profile
+        benchmark_config.add_metric('total_time', 'mean')
+        benchmark_result = resttest.run_benchmark(benchmark_config)
+        self.assertEqual(0, benchmark_result.failures)
+        self.assertEqual(2, len(benchmark_result.stages))
+        self.assertTrue(benchmark_result.run_time >= 1.0)
+        for stage_result in benchmark_result.stages:
+            self.assertTrue(stage_result.throughput > 0)
+
+    def test_benchmark_get_distributed(self):
+        """ Benchmark basic local get test, on two distributed workers on localhost """
+        workers = list()
+        for x in range(0, 2):
+            listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            listener.bind(('127.0.0.1', 0))
+            listener.listen(1)
+            thread = threading.Thread(target=resttest.serve_benchmark_worker,
+                                      args=(listener,), kwargs={'max_jobs': 1})
+            thread.daemon = True
+            thread.start()
+            workers.append(listener.getsockname())
+
+        benchmark_config = resttest.parse_benchmark(self.prefix, [
+            {'url': '/api/person/'}, {'warmup_runs': 2}, {'benchmark_runs': 10},
+            {'metrics': ['total_time', {'total_time': 'mean'}]}])
+        benchmark_result = resttest.run_benchmark_distributed(benchmark_config, workers)
+        self.assertEqual(0, benchmark_result.failures)
+        self.assertEqual(20, len(benchmark_result.results['total_time']))
+        self.assertTrue(benchmark_result.aggregates[0][2] > 0)
+
     def test_use_validator_ext_jsonschema(self):
         try:
             import jsonschema           
@@ -0,0 +1,195 @@
+import math
+
+"""
+HDR-style histograms, for storing benchmark metric values in constant memory
+"""
+
+DEFAULT_HISTOGRAM_PRECISION = 3  # Significant decimal digits of precision
+MAX_HISTOGRAM_PRECISION = 5
+
+
+class MetricHistogram(object):
+    """ Log-bucketed histogram of non-negative metric values, in the style of HdrHistogram
+
+        Each power of 2 is split into equal sub-buckets, enough that every value is within
+        precision significant decimal digits of its bucket's value. The number of buckets only
+        depends on the range of values seen, so memory use stays constant however many are recorded.
+
+        Count, sum, min and max are tracked exactly, so the mean is exact too.
+        Variance is tracked as values are recorded (Welford's method) along with the sum of reciprocals,
+        so the standard deviation and harmonic mean are exact as well.
+        Percentiles computed from buckets are accurate to the precision.
+        Histograms with the same precision can be merged, and exported with to_dict()
+    """
+    __slots__ = ('precision', 'sub_buckets', 'counts', 'zero_count', 'count', 'sum', 'min', 'max',
+                 'mean', 'squares', 'reciprocals')
+
+    def __init__(self, precision=DEFAULT_HISTOGRAM_PRECISION):
+        precision = int(precision)
+        if precision < 1 or precision > MAX_HISTOGRAM_PRECISION:
+            raise ValueError("Invalid histogram precision, must be from 1 to {0} significant digits: {1}".format(
+                MAX_HISTOGRAM_PRECISION, precision))
+        self.precision = precision
+        # Sub-buckets per power of 2, halving the bucket width is enough for the precision
+        self.sub_buckets = 2 ** int(math.ceil(math.log(2 * 10 ** precision, 2)))
+        self.counts = dict()  # Maps bucket index to count of values in that bucket
+        self.zero_count = 0  # Zero gets a bucket of its own
+        self.count = 0
+        self.sum = 0
+        self.min = None
+        self.max = None
+        self.mean = 0.0  # Running mean, for updating squares
+        self.squares = 0.0  # Sum of squared differences from the mean, None if unknown
+        self.reciprocals = 0.0  # Sum of 1/value for values greater than 0, None if unknown
+
+    def get_bucket_index(self, value):
+        """ Index of the bucket for a value greater than 0 """
+        mantissa, exponent = math.frexp(value)  # mantissa in [0.5, 1)
+        return exponent * self.sub_buckets + int((mantissa - 0.5) * 2 * self.sub_buckets)
+
+    def get_bucket_value(self, index):
+        """ Value in the middle of the bucket at index, within precision of any value in the bucket """
+        exponent, sub_bucket = divmod(index, self.sub_buckets)
+        return math.ldexp(0.5 + (sub_bucket + 0.5) / (2.0 * self.sub_buckets), exponent)
+
+    def record(self, value, count=1):
+        """ Record a value, count times """
+        if value > 0:
+            index = self.get_bucket_index(value)
+            self.counts[index] = self.counts.get(index, 0) + count
+        elif value == 0:
+            self.zero_count = self.zero_count + count
+        else:
+            raise ValueError("Histogram values can't be negative: {0}".format(value))
+        total = self.count + count
+        if self.squares is not None:
+            delta = value - self.mean
+            self.mean = self.mean + delta * count / float(total)
+            self.squares = self.squares + delta * delta * self.count * count / float(total)
+        if self.reciprocals is not None and value > 0:
+            self.reciprocals = self.reciprocals + count / float(value)
+        self.count = total
+        self.sum = self.sum + value * count
+        if self.min is None or value < self.min:
+            self.min = value
+        if self.max is None or value > self.max:
+            self.max = value
+
+    def merge(self, other):
+        """ Add all values recorded in another histogram with the same precision to this one """
+        if other.precision != self.precision:
+            raise ValueError("Can't merge histograms with different precisions: {0} and {1}".format(
+                self.precision, other.precision))
+        counts = self.counts
+        for index, count in other.counts.items():
+            counts[index] = counts.get(index, 0) + count
+        self.zero_count = self.zero_count + other.zero_count
+        total = self.count + other.count
+        if self.squares is not None and other.squares is not None and total:
+            # Combine variances of the two sets of values (Chan et al)
+            delta = other.mean - self.mean
+            self.mean = self.mean + delta * other.count / float(total)
+            self.squares = self.squares + other.squares + delta * delta * self.count * other.count / float(total)
+        else:
+            self.squares = None
+        if self.reciprocals is not None and other.reciprocals is not None:
+            self.reciprocals = self.reciprocals + other.reciprocals
+        else:
+            self.reciprocals = None
+        self.count = total
+        self.sum = self.sum + other.sum
+        if other.min is not None and (self.min is None or other.min < self.min):
+            self.min = other.min
+        if other.max is not None and (self.max is None or other.max > self.max):
+            self.max = other.max
+        return self
+
+    def get_buckets(self):
+        """ List of (value, count) for each bucket with values in it, in order of value
+            Values are the middle of each bucket, limited to the min and max recorded """
+        buckets = list()
+        if self.zero_count:
+            buckets.append((0, self.zero_count))
+        for index in sorted(self.counts.keys()):
+            value = min(max(self.get_bucket_value(index), self.min), self.max)
+            buckets.append((value, self.counts[index]))
+        return buckets
+
+    def get_mean(self):
+        if not self.count:
+            return None
+        return float(self.sum) / float(self.count)
+
+    def get_percentile(self, percentile):
+        """ Value that percentile percent of values are less than or equal to, within precision
+            0 gives the minimum and 100 the maximum """
+        if not self.count:
+            return None
+        if percentile <= 0:
+            return self.min
+        if percentile >= 100:
+            return self.max
+        rank = max(1, int(math.ceil(percentile / 100.0 * self.count)))
+        seen = 0
+        for value, count in self.get_buckets():
+            seen = seen + count
+            if seen >= rank:
+                return value
+        return self.max
+
+    def get_std_deviation(self):
+        """ Standard deviation of values, within precision if it was loaded without the variance """
+        if self.count <= 1:
+            return 0
+        squares = self.squares
+        if squares is None:
+            mean = self.get_mean()
+            squares = sum([count * (value - mean) ** 2 for value, count in self.get_buckets()])
+        return math.sqrt(max(squares, 0.0) / float(self.count))
+
+    def get_harmonic_mean(self):
+        """ Harmonic mean of values, which is 0 if any value is 0
+            Within precision if it was loaded without the sum of reciprocals """
+        if not self.count:
+            return None
+        if self.zero_count:
+            return 0.0
+        reciprocals = self.reciprocals
+        if reciprocals is None:
+            reciprocals = sum([count / value for value, count in self.get_buckets()])
+        return self.count / reciprocals
+
+    def to_dict(self):
+        """ Export as a dictionary, that can be written as JSON and read back with from_dict """
+        return {
+            'precision': self.precision,
+            'count': self.count,
+            'sum': self.sum,
+            'min': self.min,
+            'max': self.max,
+            'squares': self.squares,
+            'reciprocals': self.reciprocals,
+            'buckets': [[value, count] for value, count in self.get_buckets()]
+        }
+
+    @staticmethod
+    def from_dict(input):
+        """ Rebuild a histogram exported by to_dict """
+        output = MetricHistogram(input.get('precision', DEFAULT_HISTOGRAM_PRECISION))
+        for value, count in input.get('buckets', list()):
+            if value > 0:
+                output.counts[output.get_bucket_index(value)] = count
+            else:
+                output.zero_count = count
+        output.count = input.get('count', 0)
+        output.sum = input.get('sum', 0)
+        output.min = input.get('min')
+        output.max = input.get('max')
+        output.mean = output.get_mean() or 0.0
+        output.squares = input.get('squares')  # Missing from older exports, so estimated from buckets
+        output.reciprocals = input.get('reciprocals')
+        return output
+
+    def __str__(self):
+        return 'MetricHistogram(count={0}, min={1}, max={2}, precision={3})'.format(
+            self.count, self.min, self.max, self.precision)
@@ -36,25 +36,96 @@ def encode_unicode_bytes(my_string):
         elif isinstance(my_string, bytes):
             return my_string
 
-# TODO create a full class that extends string.Template
+class CompiledTemplate(object):
+    """ A string.Template parsed once, so it can be substituted repeatedly without re-parsing
+        render(variables) gives the same output as string.Template(template).safe_substitute(variables),
+        except that unicode templates on python 2 accept UTF-8 encoded values, as safe_substitute_unicode_template does
+    """
+    __slots__ = ('template', 'parts', 'names')
+
+    def __init__(self, template):
+        self.template = template
+        empty = template[0:0]
+        parts = list()  # Literal text, alternating with (name, original text) of each variable
+        names = set()
+        literal = list()
+        position = 0
+        for match in string.Template.pattern.finditer(template):
+            literal.append(template[position:match.start()])
+            position = match.end()
+            name = match.group('named') or match.group('braced')
+            if name is not None:
+                parts.append(empty.join(literal))
+                parts.append((name, match.group()))
+                names.add(name)
+                literal = list()
+            elif match.group('escaped') is not None:
+                literal.append(template[match.start():match.start() + 1])  # Just the delimiter
+            else:  # Invalid placeholder, left as is
+                literal.append(match.group())
+        literal.append(template[position:])
+        parts.append(empty.join(literal))
+        self.parts = tuple(parts)
+        self.names = frozenset(names)
+
+    def render(self, variables):
+        """ Substitute variables from the dictionary given, leaving any missing ones in place """
+        parts = self.parts
+        if len(parts) == 1:
+            return parts[0]
+        output = list(parts)
+        convert_unicode = PYTHON_MAJOR_VERSION == 2 and isinstance(self.template, text_type)
+        for i in range(1, len(parts), 2):
+            name, original = parts[i]
+            if name not in variables:
+                output[i] = original
+                continue
+            value = variables[name]
+            if not convert_unicode:
+                output[i] = '%s' % (value,)
+            elif isinstance(value, binary_type):
+                output[i] = value.decode('utf-8')
+            else:
+                output[i] = text_type(value)
+        return self.template[0:0].join(output)
+
+    def __str__(self):
+        return str(self.template)
+
+
+def compile_template(template, compiled=None):
+    """ Get a CompiledTemplate for the template string, reusing compiled if it is for the same template
+        Lets an object keep its compiled template and only recompile if the template string changes """
+    if compiled is None or compiled.template != template:
+        compiled = CompiledTemplate(template)
+    return compiled
+
+
 def safe_substitute_unicode_template(templated_string, variable_map):
-    """ Perform string.Template safe_substitute on unicode input with unicode variable values by using escapes
+    """ Perform string.Template safe_substitute on unicode input with unicode variable values
         Catch: cannot accept unicode variable names, just values
         Returns a Unicode type output, if you want UTF-8 bytes, do encode_unicode_bytes on it
     """
-
-    if PYTHON_MAJOR_VERSION > 2:  # Python 3 handles unicode templating natively, yay!
-        return string.Template(templated_string).safe_substitute(variable_map)
-
-    my_template = string.Template(encode_unicode_bytes(templated_string))
-    my_escaped_dict = dict(map(lambda x: (x[0], encode_unicode_bytes(x[1])), variable_map.items()))
-    templated = my_template.safe_substitute(my_escaped_dict)
-    return text_type(templated, 'utf-8')
+    if PYTHON_MAJOR_VERSION == 2 and isinstance(templated_string, binary_type):
+        templated_string = text_type(templated_string, 'utf-8')
+    return CompiledTemplate(templated_string).render(variable_map)
+
+def get_template_variables(templated_string):
+    """ Return the set of variable names a string.Template substitution would read """
+    names = set()
+    for match in string.Template.pattern.finditer(text_type(templated_string)):
+        name = match.group('named') or match.group('braced')
+        if name is not None:
+            names.add(name)
+    return names
 
 def safe_to_json(in_obj):
-    """ Safely get dict from object if present for json dumping """
+    """ Safely get dict from object if present for json dumping
+        Objects with a to_dict() method are exported with it """
     if isinstance(in_obj, bytearray):
         return str(in_obj)
+    if hasattr(in_obj, 'to_dict'):
+        return in_obj.to_dict()
     if hasattr(in_obj, '__dict__'):
         return in_obj.__dict__
     try:
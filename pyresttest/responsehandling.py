@@ -0,0 +1,297 @@
+import io
+import json
+import mmap
+import sys
+import tempfile
+import threading
+
+# Python 3 compatibility shims
+from .six import binary_type
+from .six import text_type
+
+PYTHON_MAJOR_VERSION = sys.version_info[0]
+
+"""
+Encapsulates response handling logic, for capturing response bodies from curl
+"""
+
+DEFAULT_BODY_ENCODING = 'utf-8'  # Default JSON encoding
+
+
+class CachedBody(object):
+    """ Mixin for response bodies, to decode them to text and parse them as JSON only once
+        Every validator and extractor for a response gets the same body, so they share these """
+    _text = None  # Cached decoded text
+    _text_encoding = None
+    _json = None  # Cached parsed JSON
+    _json_parsed = False
+
+    def get_text(self, encoding=DEFAULT_BODY_ENCODING):
+        """ Body decoded as text, decoding only once per response """
+        if self._text is None or self._text_encoding != encoding:
+            self._text = self.decode(encoding)
+            self._text_encoding = encoding
+        return self._text
+
+    def get_json(self):
+        """ Body parsed as JSON, parsing only once per response
+            Callers share the parsed objects, so must not modify them """
+        if not self._json_parsed:
+            self._json = json.loads(self.get_text())
+            self._json_parsed = True
+        return self._json
+
+
+class ParsedBody(CachedBody):
+    """ Cache of the decoded text and parsed JSON for a response body given as bytes
+        Bytes can't carry the cache themselves, so get_body_text() and get_body_json() keep one
+        of these for the last body used on each thread """
+
+    def __init__(self, body):
+        self.body = body
+
+    def decode(self, encoding=DEFAULT_BODY_ENCODING, errors='strict'):
+        return self.body.decode(encoding, errors)
+
+
+class SpilledBody(CachedBody, mmap.mmap):
+    """ Response body spilled to a temporary file, read through a memory map
+        Only the pages in use are held in memory, so large bodies don't bloat the process
+
+        Like a bytes body, it supports 'in', comparison to bytes, and decode(),
+        and it caches its own decoded text and JSON, but slicing returns copies as bytes """
+
+    def __contains__(self, item):
+        if isinstance(item, int):
+            return mmap.mmap.find(self, bytes(bytearray([item]))) != -1
+        return mmap.mmap.find(self, item) != -1
+
+    def __eq__(self, other):
+        try:
+            return memoryview(self) == memoryview(other)
+        except TypeError:
+            return False
+
+    def __ne__(self, other):
+        return not self.__eq__(other)
+
+    __hash__ = None
+
+    def decode(self, encoding=DEFAULT_BODY_ENCODING, errors='strict'):
+        return self[:].decode(encoding, errors)
+
+
+class ResponseBody(object):
+    """ Response body, captured straight from curl's write callback into one buffer
+
+        Once the call is done, finish() returns the body as bytes, sharing the buffer
+        (BytesIO.getvalue()) rather than copying it. Validators and extractors get those bytes,
+        and get_body_text() and get_body_json() decode and parse them at most once per response.
+
+        If spill_threshold is set, bodies larger than that many bytes are written to a
+        temporary file instead, and finish() returns a SpilledBody mapping the file.
+        Bodies are spilled as soon as a Content-Length header says they'll be over the threshold,
+        unless no_body is set, for HEAD requests.
+    """
+    length = 0  # Bytes written so far
+    no_body = False  # If set, the response has no body (HEAD request), whatever the Content-Length says
+    spill_threshold = None  # Size in bytes above which the body is written to a file
+    spill_file = None  # Temporary file the body is written to, once spilled
+    spilled = None  # SpilledBody for the file, once finished
+    finished = None  # Bytes of the body, once finished in memory
+
+    def __init__(self):
+        self.buffer = io.BytesIO()
+
+    def write(self, chunk):
+        """ Append a chunk of the response, use as a curl WRITEFUNCTION """
+        self.length = self.length + len(chunk)
+        if self.spill_file is None and self.spill_threshold is not None and self.length > self.spill_threshold:
+            self.spill()
+        if self.spill_file is not None:
+            self.spill_file.write(chunk)
+        else:
+            self.buffer.write(chunk)
+
+    def spill(self):
+        """ Move the body to a temporary file, and write the rest of it there """
+        self.spill_file = tempfile.TemporaryFile()
+        self.spill_file.write(self.buffer.getvalue())
+        self.buffer = io.BytesIO()
+
+    def write_header(self, header_line):
+        """ Spill the body to a file up front if the Content-Length header is over the threshold,
+            use with a curl HEADERFUNCTION """
+        if self.no_body or self.spill_threshold is None or self.spill_file is not None:
+            return
+        name, sep, value = header_line.partition(b':')
+        if sep and name.strip().lower() == b'content-length':
+            try:
+                size = int(value.strip())
+            except ValueError:
+                return  # Invalid header, let curl deal with it
+            if size > self.spill_threshold:
+                self.spill()
+
+    def finish(self):
+        """ Complete the body once the response is done, and return it
+            This returns what was written as bytes, without copying it,
+            or if the body was spilled returns a SpilledBody mapping the file """
+        if self.spill_file is not None:
+            spill_file = self.spill_file
+            self.spill_file = None
+            if self.length > 0:  # Empty files can't be mapped, so empty bodies stay in memory
+                spill_file.flush()
+                self.spilled = SpilledBody(spill_file.fileno(), 0, access=mmap.ACCESS_READ)
+            spill_file.close()  # The map keeps the data until it is closed
+        if self.spilled is not None:
+            return self.spilled
+        if self.finished is None:
+            self.finished = self.buffer.getvalue()  # Shares the buffer, rather than copying it
+        return self.finished
+
+    def get_text(self, encoding=DEFAULT_BODY_ENCODING):
+        """ Body decoded as text, decoding only once per response """
+        return get_body_text(self.finish(), encoding)
+
+    def get_json(self):
+        """ Body parsed as JSON, parsing only once per response """
+        return get_body_json(self.finish())
+
+
+_parsed_bodies = threading.local()  # ParsedBody for the last bytes body used, on each thread
+
+
+def get_parsed_body(body):
+    """ Get the ParsedBody caching text & JSON for a bytes body, reusing the last one if it is for the same body """
+    parsed = getattr(_parsed_bodies, 'parsed', None)
+    if parsed is None or parsed.body is not body:
+        parsed = ParsedBody(body)
+        _parsed_bodies.parsed = parsed
+    return parsed
+
+
+def get_body_text(body, encoding=DEFAULT_BODY_ENCODING):
+    """ Get a response body as text, for parsing
+        Bytes bodies are decoded once, and the text reused for following calls with the same body """
+    if isinstance(body, ResponseBody):
+        body = body.finish()
+    if isinstance(body, CachedBody):
+        return body.get_text(encoding)
+    if isinstance(body, binary_type):
+        return get_parsed_body(body).get_text(encoding)
+    if isinstance(body, bytearray):
+        return body.decode(encoding)
+    return body
+
+
+def get_body_json(body):
+    """ Get a response body parsed as JSON, parsing a bytes body only once for following calls with the same body
+        Callers share the parsed objects, so must not modify them
+        Raises a ValueError if the body is not legal JSON """
+    if isinstance(body, ResponseBody):
+        body = body.finish()
+    if isinstance(body, CachedBody):
+        return body.get_json()
+    if isinstance(body, binary_type):
+        return get_parsed_body(body).get_json()
+    return json.loads(get_body_text(body))
+
+HEADER_ENCODING = 'ISO-8859-1'  # Per RFC 2616
+
+
+class ResponseHeaders(object):
+    """ Response headers, parsed only when first used
+
+        Created from the header lines curl passed to its HEADERFUNCTION, or one string of them.
+        Acts as a sequence of (name, value) tuples with lowercased names, like a list,
+        in the order received, including duplicates.
+
+        When curl saw several responses (redirects, 100 Continue), only the headers of the final one
+        are used, along with any trailers after it. Folded (continuation) lines are joined.
+        Names & values are unicode strings, decoded as ISO-8859-1.
+
+        get() and get_all() look up headers by name case-insensitively without searching them.
+    """
+    __slots__ = ('_lines', '_items', '_index')
+
+    def __init__(self, lines):
+        self._lines = lines
+        self._items = None
+        self._index = None
+
+    def _parse(self):
+        lines = self._lines
+        if isinstance(lines, (binary_type, bytearray)):
+            lines = lines.decode(HEADER_ENCODING)
+        if isinstance(lines, text_type):
+            lines = lines.split(u'\n')
+
+        items = list()
+        for line in lines:
+            if isinstance(line, (binary_type, bytearray)):
+                line = line.decode(HEADER_ENCODING)
+            line = line.rstrip(u'\r\n')
+            if line.startswith(u'HTTP/'):  # Status line starts the headers of the next response
+                items = list()
+            elif line[0:1] in (u' ', u'\t'):
+                if items:  # Folded continuation of the last header
+                    name, value = items[-1]
+                    items[-1] = (name, (value + u' ' + line.strip()).strip())
+            else:
+                name, sep, value = line.partition(u':')
+                if sep:
+                    items.append((name.strip().lower(), value.strip()))
+
+        index = dict()
+        for name, value in items:
+            index.setdefault(name, list()).append(value)
+        self._items = items
+        self._index = index
+        self._lines = None
+
+    def get_items(self):
+        """ List of (name, value) tuples """
+        if self._items is None:
+            self._parse()
+        return self._items
+
+    def get_all(self, name):
+        """ All values for a header name (case-insensitive), as a list which is empty if it isn't present """
+        if self._index is None:
+            self._parse()
+        return list(self._index.get(name.lower(), ()))
+
+    def get(self, name, default=None):
+        """ Value for a header name (case-insensitive), the last one if duplicated, or default if not present """
+        if self._index is None:
+            self._parse()
+        values = self._index.get(name.lower())
+        if not values:
+            return default
+        return values[-1]
+
+    def __iter__(self):
+        return iter(self.get_items())
+
+    def __len__(self):
+        return len(self.get_items())
+
+    def __getitem__(self, index):
+        return self.get_items()[index]
+
+    def __eq__(self, other):
+        if isinstance(other, ResponseHeaders):
+            other = other.get_items()
+        return self.get_items() == other
+
+    def __ne__(self, other):
+        return not self.__eq__(other)
+
+    __hash__ = None
+
+    def __str__(self):
+        return str(self.get_items())
+
+    def __repr__(self):
+        return repr(self.get_items())
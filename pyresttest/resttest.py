@@ -6,20 +6,15 @@ import traceback
 import yaml
 import pycurl
 import json
+import heapq
 import csv
 import logging
 import threading
+import multiprocessing
+import socket
 from optparse import OptionParser
-from email import message_from_string  # For headers handling
 import time
-
-try:
-    from cStringIO import StringIO as MyIO
-except:
-    try:
-        from StringIO import StringIO as MyIO
-    except ImportError:
-        from io import BytesIO as MyIO
+import math
 
 ESCAPE_DECODING = 'string-escape'
 # Python 3 compatibility
@@ -32,7 +27,6 @@ if sys.version_info[0] > 2:
 if __name__ == '__main__':
     sys.path.append(os.path.dirname(os.path.dirname(
     os.path.realpath(__file__))))
-    from pyresttest.six import text_type
     from pyresttest.binding import Context
     from pyresttest import generators
     from pyresttest import validators
@@ -42,10 +36,11 @@ if __name__ == '__main__':
 
     from pyresttest.validators import Failure
     from pyresttest.tests import Test, DEFAULT_TIMEOUT
-    from pyresttest.benchmarks import Benchmark, AGGREGATES, METRICS, parse_benchmark
+    from pyresttest.benchmarks import Benchmark, BenchmarkStage, METRICS, SCHEDULED_TIME_METRICS, get_aggregate, parse_benchmark
+    from pyresttest.responsehandling import ResponseBody, ResponseHeaders
+    from pyresttest.histogram import MetricHistogram
 else:  # Normal imports
     from . import six
-    from .six import text_type
 
     # Pyresttest internals
     from . import binding
@@ -59,7 +54,9 @@ else:  # Normal imports
     from . import tests
     from .tests import Test, DEFAULT_TIMEOUT
     from . import benchmarks
-    from .benchmarks import Benchmark, AGGREGATES, METRICS, parse_benchmark
+    from .benchmarks import Benchmark, BenchmarkStage, METRICS, SCHEDULED_TIME_METRICS, get_aggregate, parse_benchmark
+    from .responsehandling import ResponseBody, ResponseHeaders
+    from .histogram import MetricHistogram
 
 """
 Executable class, ties everything together into the framework.
@@ -70,7 +67,9 @@ Module responsibilities:
 - Collect and report on test/benchmark results
 - Perform analysis on benchmark results
 """
-HEADER_ENCODING ='ISO-8859-1' # Per RFC 2616
+WORKER_CONNECT_TIMEOUT = 10  # Seconds to wait when connecting to a distributed benchmark worker
+# Interface distributed benchmark workers listen on unless told otherwise, since they run any job sent to them
+DEFAULT_WORKER_HOST = '127.0.0.1'
 LOGGING_LEVELS = {'debug': logging.DEBUG,
                   'info': logging.INFO,
                   'warning': logging.WARNING,
@@ -107,6 +106,10 @@ class TestConfig:
     print_headers = False  # Print response bodies in all cases
     retries = 0  # Retries on failures
     test_parallel = False  # Allow parallel execution of tests in a test set, for speed?
+    max_parallel = 10  # Maximum number of tests in flight at once when running in parallel
+    keep_alive = False  # Reuse connections between calls, instead of closing them after each
+    http_version = None  # HTTP version to use, from tests.HTTP_VERSIONS, if None curl decides
+    body_spill_threshold = None  # Response bodies over this size in bytes are written to temp files, not memory
     interactive = False
     verbose = False
     ssl_insecure = False
@@ -115,6 +118,10 @@ class TestConfig:
     # Binding and creation of generators
     variable_binds = None
     generators = None  # Map of generator name to generator function
+    generator_configs = None  # Map of generator name to its configuration, to recreate generators
+
+    # Addresses (host:port) of distributed benchmark workers to run benchmarks on
+    benchmark_workers = None
 
     def __str__(self):
         return json.dumps(self, default=safe_to_json)
@@ -141,12 +148,19 @@ class BenchmarkResult:
     name = u'unnamed'
 
     results = dict()  # Benchmark output, map the metric to the result array for that metric
+    histograms = dict()  # Maps metric to the MetricHistogram of its values, for metrics that need one
     aggregates = list()  # List of aggregates, as tuples of (metricname, aggregate, result)
     failures = 0  # Track call count that failed
+    run_time = None  # Wall-clock time for the benchmark runs, in seconds
+    throughput = None  # Successful calls per second over the benchmark runs
+    stage = None  # BenchmarkStage, if this is the result for one stage of a load profile
+    stages = list()  # Results for each stage of a load profile, as BenchmarkResults
 
     def __init__(self):
         self.aggregates = list()
-        self.results = list()
+        self.results = dict()
+        self.histograms = dict()
+        self.stages = list()
 
     def __str__(self):
         return json.dumps(self, default=safe_to_json)
@@ -156,6 +170,7 @@ class TestResponse:
     """ Encapsulates everything about a test response """
     test = None  # Test run
     response_code = None
+    num_connects = None  # New connections opened for the call, 0 if it reused one
 
     body = None  # Response body, if tracked
 
@@ -180,27 +195,12 @@ def read_test_file(path):
 
 def parse_headers(header_string):
     """ Parse a header-string into individual headers
-        Implementation based on: http://stackoverflow.com/a/5955949/95122
         Note that headers are a list of (key, value) since duplicate headers are allowed
+        If the string holds headers for several responses (redirects, 100 Continue), the last is used
 
         NEW NOTE: keys & values are unicode strings, but can only contain ISO-8859-1 characters
     """
-    # First line is request line, strip it out
-    if not header_string:
-        return list()
-    request, headers = header_string.split('\r\n', 1)
-    if not headers:
-        return list()
-
-    # Python 2.6 message header parsing fails for Unicode strings, 2.7 is fine. Go figure.
-    if sys.version_info < (2,7):
-        header_msg = message_from_string(headers.encode(HEADER_ENCODING))
-        return [(text_type(k.lower(), HEADER_ENCODING), text_type(v, HEADER_ENCODING))
-            for k, v in header_msg.items()]
-    else:
-        header_msg = message_from_string(headers)
-        # Note: HTTP headers are *case-insensitive* per RFC 2616
-        return [(k.lower(), v) for k, v in header_msg.items()]
+    return list(ResponseHeaders(header_string))
 
 
 def parse_testsets(base_url, test_structure, test_files=set(), working_directory=None, vars=None):
@@ -283,6 +283,31 @@ def parse_configuration(node, base_config=None):
             test_config.print_bodies = safe_to_bool(value)
         elif key == u'retries':
             test_config.retries = int(value)
+        elif key == u'test_parallel' or key == u'parallel':
+            test_config.test_parallel = safe_to_bool(value)
+        elif key == u'max_parallel':
+            test_config.max_parallel = int(value)
+            if test_config.max_parallel < 1:
+                raise ValueError(
+                    "Invalid max_parallel value, must be at least 1: {0}".format(value))
+        elif key == u'keep_alive':
+            test_config.keep_alive = safe_to_bool(value)
+        elif key == u'http_version':
+            http_version = str(value).lower()
+            if http_version == '2.0':
+                http_version = '2'
+            if http_version not in tests.ALL_HTTP_VERSIONS:
+                raise ValueError("Invalid http_version, must be one of {0}: {1}".format(
+                    sorted(tests.ALL_HTTP_VERSIONS.keys()), value))
+            if http_version not in tests.HTTP_VERSIONS:
+                raise ValueError("Unsupported http_version, this version of pycurl only supports {0}: {1}".format(
+                    sorted(tests.HTTP_VERSIONS.keys()), value))
+            test_config.http_version = http_version
+        elif key == u'body_spill_threshold':
+            test_config.body_spill_threshold = int(value)
+            if test_config.body_spill_threshold < 0:
+                raise ValueError(
+                    "Invalid body_spill_threshold value, must be at least 0: {0}".format(value))
         elif key == u'variable_binds':
             if not test_config.variable_binds:
                 test_config.variable_binds = dict()
@@ -294,6 +319,9 @@ def parse_configuration(node, base_config=None):
                 gen = parse_generator(generator_config)
                 gen_map[str(generator_name)] = gen
             test_config.generators = gen_map
+            test_config.generator_configs = flat
+        elif key == u'benchmark_workers':
+            test_config.benchmark_workers = parse_worker_addresses(value)
 
     return test_config
 
@@ -306,75 +334,109 @@ def read_file(path):
     return string
 
 
-def run_test(mytest, test_config=TestConfig(), context=None, curl_handle=None, *args, **kwargs):
-    """ Put together test pieces: configure & run actual test, return results """
-
-    # Initialize a context if not supplied
-    my_context = context
-    if my_context is None:
-        my_context = Context()
+class PreparedTest:
+    """ A test that has been templated and had curl configured, ready to execute
+        Holds the buffers that the response is written to until the call completes """
+    test = None  # Test as defined in the test set
+    templated_test = None  # Realized version of the test, used to configure curl
+    curl = None
+    result = None  # TestResponse to populate once the call completes
+    body = None  # Response body buffer, a ResponseBody, or None if the body is streamed
+    headers = None  # Response header lines, as passed by curl
+    streams = None  # If the body is streamed, maps each validator to the stream it is fed to
 
-    mytest.update_context_before(my_context)
-    templated_test = mytest.realize(my_context)
-    curl = templated_test.configure_curl(
-        timeout=test_config.timeout, context=my_context, curl_handle=curl_handle)
-    result = TestResponse()
-    result.test = templated_test
 
-    # reset the body, it holds values from previous runs otherwise
-    headers = MyIO()
-    body = MyIO()
-    curl.setopt(pycurl.WRITEFUNCTION, body.write)
-    curl.setopt(pycurl.HEADERFUNCTION, headers.write)
-    if test_config.verbose:
-        curl.setopt(pycurl.VERBOSE, True)
+def configure_curl_config(curl, test_config):
+    """ Set the curl options that come from the test config: verbose output and SSL verification
+        Always set, since a reused handle may keep them from another test set """
+    curl.setopt(pycurl.VERBOSE, bool(test_config.verbose))
     if test_config.ssl_insecure:
         curl.setopt(pycurl.SSL_VERIFYPEER, 0)
         curl.setopt(pycurl.SSL_VERIFYHOST, 0)
+    else:
+        curl.setopt(pycurl.SSL_VERIFYPEER, 1)
+        curl.setopt(pycurl.SSL_VERIFYHOST, 2)
 
-    result.passed = None
 
-    if test_config.interactive:
-        print("===================================")
-        print("%s" % mytest.name)
-        print("-----------------------------------")
-        print("REQUEST:")
-        print("%s %s" % (templated_test.method, templated_test.url))
-        print("HEADERS:")
-        print("%s" % (templated_test.headers))
-        if mytest.body is not None:
-            print("\n%s" % templated_test.body)
-        
+def prepare_test(mytest, test_config=TestConfig(), context=None, curl_handle=None, curl_share=None):
+    """ Set up a test to run: apply pre-test context updates, template it, and configure curl
+        Returns a PreparedTest, the curl call is not performed """
+    mytest.update_context_before(context)
+    templated_test = mytest.realize(context)
+    curl = templated_test.configure_curl(
+        timeout=test_config.timeout, context=context, curl_handle=curl_handle,
+        keep_alive=test_config.keep_alive, curl_share=curl_share,
+        http_version=test_config.http_version)
+    result = TestResponse()
+    result.test = templated_test
 
-        if sys.version_info >= (3,0):
-            input("Press ENTER when ready (%d): " % (mytest.delay))
-        else:
-            raw_input("Press ENTER when ready (%d): " % (mytest.delay))
+    # reset the body, it holds values from previous runs otherwise
+    headers = list()
+    body = None
+    streams = None
+    if templated_test.stream_body:
+        # Validate the body as it downloads, without storing it
+        streams = dict([(validator, validator.start(context=context))
+                        for validator in templated_test.validators or list()])
+        stream_list = list(streams.values())
+
+        def write_body(chunk):
+            for stream in stream_list:
+                stream.write(chunk)
+        curl.setopt(pycurl.WRITEFUNCTION, write_body)
+        curl.setopt(pycurl.HEADERFUNCTION, headers.append)
+    else:
+        body = ResponseBody()
+        body.spill_threshold = test_config.body_spill_threshold
+        # No body comes back to spill, whatever the Content-Length says
+        body.no_body = templated_test.method == u'HEAD' or bool(
+            templated_test.curl_options and templated_test.curl_options.get('NOBODY'))
+
+        def write_header(header_line):
+            body.write_header(header_line)  # Spills large bodies up front from Content-Length
+            headers.append(header_line)
+        curl.setopt(pycurl.WRITEFUNCTION, body.write)
+        curl.setopt(pycurl.HEADERFUNCTION, write_header)
+    configure_curl_config(curl, test_config)
 
-    if mytest.delay > 0:
-        print("Delaying for %ds" % mytest.delay)
-        time.sleep(mytest.delay)
+    result.passed = None
 
-    try:
-        curl.perform()  # Run the actual call
-    except Exception as e:
+    prepared = PreparedTest()
+    prepared.test = mytest
+    prepared.templated_test = templated_test
+    prepared.curl = curl
+    prepared.result = result
+    prepared.body = body
+    prepared.headers = headers
+    prepared.streams = streams
+    return prepared
+
+
+def complete_test(prepared, test_config=TestConfig(), context=None, curl_error=None, error_details=None):
+    """ Process the response for a PreparedTest once its curl call is done:
+        check response code, parse headers, run validators & extractors, and print output
+        If the call failed, curl_error is the exception and error_details describes it """
+    mytest = prepared.test
+    curl = prepared.curl
+    result = prepared.result
+
+    if curl_error is not None:
         # Curl exception occurred (network error), do not pass go, do not
         # collect $200
-        trace = traceback.format_exc()
         result.failures.append(Failure(message="Curl Exception: {0}".format(
-            e), details=trace, failure_type=validators.FAILURE_CURL_EXCEPTION))
+            curl_error), details=error_details, failure_type=validators.FAILURE_CURL_EXCEPTION))
         result.passed = False
         curl.close()
         return result
 
     # Retrieve values
-    result.body = body.getvalue()
-    body.close()
-    result.response_headers = text_type(headers.getvalue(), HEADER_ENCODING)  # Per RFC 2616
-    headers.close()
+    if prepared.body is not None:
+        result.body = prepared.body.finish()  # Bytes sharing the capture buffer, not copied
+    result.response_headers = ResponseHeaders(prepared.headers)  # Parsed only if used
 
     response_code = curl.getinfo(pycurl.RESPONSE_CODE)
     result.response_code = response_code
+    result.num_connects = curl.getinfo(pycurl.NUM_CONNECTS)
 
     logger.debug("Initial Test Result, based on expected response code: " +
                  str(response_code in mytest.expected_status))
@@ -389,17 +451,6 @@ def run_test(mytest, test_config=TestConfig(), context=None, curl_handle=None, *
         result.failures.append(Failure(
             message=failure_message, details=None, failure_type=validators.FAILURE_INVALID_RESPONSE))
 
-    # Parse HTTP headers
-    try:
-        result.response_headers = parse_headers(result.response_headers)
-    except Exception as e:
-        trace = traceback.format_exc()
-        result.failures.append(Failure(message="Header parsing exception: {0}".format(
-            e), details=trace, failure_type=validators.FAILURE_TEST_EXCEPTION))
-        result.passed = False
-        curl.close()
-        return result
-
     # print str(test_config.print_bodies) + ',' + str(not result.passed) + ' ,
     # ' + str(test_config.print_bodies or not result.passed)
 
@@ -413,8 +464,11 @@ def run_test(mytest, test_config=TestConfig(), context=None, curl_handle=None, *
                          str(len(mytest.validators)))
             failures = result.failures
             for validator in mytest.validators:
-                validate_result = validator.validate(
-                    body=body, headers=head, context=my_context)
+                if prepared.streams is not None:  # Body was already fed to the validator
+                    validate_result = prepared.streams[validator].finish(headers=head, context=context)
+                else:
+                    validate_result = validator.validate(
+                        body=body, headers=head, context=context)
                 if not validate_result:
                     result.passed = False
                 # Proxy for checking if it is a Failure object, because of
@@ -426,14 +480,17 @@ def run_test(mytest, test_config=TestConfig(), context=None, curl_handle=None, *
             logger.debug("no validators found")
 
         # Only do context updates if test was successful
-        mytest.update_context_after(result.body, head, my_context)
+        mytest.update_context_after(result.body, head, context)
 
     # Print response body if override is set to print all *OR* if test failed
     # (to capture maybe a stack trace)
     if test_config.print_bodies or not result.passed:
         if test_config.interactive:
             print("RESPONSE:")
-        print(result.body.decode(ESCAPE_DECODING))
+        if result.body is not None:
+            print(result.body.decode(ESCAPE_DECODING))
+        else:
+            print("(Body not stored, stream_body is set)")
 
     if test_config.print_headers or not result.passed:
         if test_config.interactive:
@@ -446,7 +503,373 @@ def run_test(mytest, test_config=TestConfig(), context=None, curl_handle=None, *
     return result
 
 
-def run_benchmark(benchmark, test_config=TestConfig(), context=None, *args, **kwargs):
+def run_test(mytest, test_config=TestConfig(), context=None, curl_handle=None, curl_share=None, *args, **kwargs):
+    """ Put together test pieces: configure & run actual test, return results """
+
+    # Initialize a context if not supplied
+    my_context = context
+    if my_context is None:
+        my_context = Context()
+
+    prepared = prepare_test(mytest, test_config=test_config,
+                            context=my_context, curl_handle=curl_handle, curl_share=curl_share)
+    templated_test = prepared.templated_test
+
+    if test_config.interactive:
+        print("===================================")
+        print("%s" % mytest.name)
+        print("-----------------------------------")
+        print("REQUEST:")
+        print("%s %s" % (templated_test.method, templated_test.url))
+        print("HEADERS:")
+        print("%s" % (templated_test.headers))
+        if mytest.body is not None:
+            print("\n%s" % templated_test.body)
+
+
+        if sys.version_info >= (3,0):
+            input("Press ENTER when ready (%d): " % (mytest.delay))
+        else:
+            raw_input("Press ENTER when ready (%d): " % (mytest.delay))
+
+    if mytest.delay > 0:
+        print("Delaying for %ds" % mytest.delay)
+        time.sleep(mytest.delay)
+
+    try:
+        prepared.curl.perform()  # Run the actual call
+    except Exception as e:
+        trace = traceback.format_exc()
+        return complete_test(prepared, test_config=test_config, context=my_context,
+                             curl_error=e, error_details=trace)
+    return complete_test(prepared, test_config=test_config, context=my_context)
+
+
+def create_curl_multi(test_config=TestConfig()):
+    """ Create a CurlMulti to run calls concurrently
+        With HTTP/2, calls to the same host are multiplexed over one connection """
+    multi = pycurl.CurlMulti()
+    if test_config.http_version in tests.HTTP2_VERSIONS:
+        multi.setopt(pycurl.M_PIPELINING, pycurl.PIPE_MULTIPLEX)
+    return multi
+
+
+def wait_for_multi(multi, max_wait=1.0):
+    """ Block until a CurlMulti has activity, or libcurl's requested timeout passes """
+    timeout = multi.timeout()  # Milliseconds, or -1 if curl has no timeout set
+    if timeout < 0:
+        timeout = max_wait
+    else:
+        timeout = min(timeout / 1000.0, max_wait)
+    if timeout > 0:
+        multi.select(timeout)
+
+
+def variables_conflict(reads, writes, other_reads, other_writes):
+    """ True if two tests touch the same context variables, where at least one writes them
+        Reads of None mean any variable may be read """
+    if writes and (other_reads is None or writes & other_reads):
+        return True
+    if other_writes and (reads is None or other_writes & reads):
+        return True
+    return bool(writes & other_writes)
+
+
+def build_test_dependencies(mytests):
+    """ Build a dependency graph for tests, based on the context variables they read & write
+        Returns a list with the set of indices of earlier tests that each test must wait for
+
+        A test depends on an earlier test if one writes a variable the other reads or writes
+        (via variable, generator or extract binds) or if the earlier test has stop_on_failure set
+    """
+    reads = [test.get_variables_read() for test in mytests]
+    writes = [test.get_variables_written() for test in mytests]
+    dependencies = [set() for test in mytests]
+
+    for later in xrange(0, len(mytests)):
+        for earlier in xrange(0, later):
+            if mytests[earlier].stop_on_failure:
+                dependencies[later].add(earlier)
+            elif (writes[earlier] or writes[later]) and variables_conflict(
+                    reads[earlier], writes[earlier], reads[later], writes[later]):
+                dependencies[later].add(earlier)
+    return dependencies
+
+
+def run_tests_parallel(mytests, test_config=TestConfig(), context=None, curl_share=None):
+    """ Execute a list of tests concurrently, using a pycurl CurlMulti to run up to
+        test_config.max_parallel calls at once
+
+        Tests are scheduled from a dependency graph (see build_test_dependencies):
+        each starts once every test it depends on has completed, so tests that
+        share context variables see the same values they would running in order.
+        Context updates and templating run on the calling thread.
+        Tests with a delay are held until it passes while other calls keep running,
+        and count towards max_parallel meanwhile.
+
+        Returns a list of (test, TestResponse) tuples, in test order
+        Tests after a failed test with stop_on_failure set are not run
+    """
+    my_context = context
+    if my_context is None:
+        my_context = Context()
+
+    max_parallel = max(1, test_config.max_parallel)
+    dependencies = build_test_dependencies(mytests)
+    multi = create_curl_multi(test_config)
+    free_handles = list()  # Reused, to keep their connection pools & DNS caches
+    in_flight = dict()  # Maps curl handle to (test index, PreparedTest)
+    results = dict()  # Maps test index to TestResponse
+    waiting = list(xrange(0, len(mytests)))  # Indices of tests not yet started, in order
+    delayed = list()  # Heap of (time to start, test index, PreparedTest) for tests waiting out their delay
+    stop_index = len(mytests)  # Tests from this index on are not run
+
+    def finish(curl, curl_error=None, error_details=None):
+        """ Complete the test for a finished curl handle, returning the handle for reuse """
+        multi.remove_handle(curl)
+        index, prepared = in_flight.pop(curl)
+        result = complete_test(prepared, test_config=test_config, context=my_context,
+                               curl_error=curl_error, error_details=error_details)
+        results[index] = result
+        free_handles.append(curl)  # Closed handles get replaced when reconfigured
+        return index, result
+
+    try:
+        while in_flight or waiting or delayed:
+            # Start tests whose dependencies are done, in order, as many as we are allowed to
+            for index in list(waiting):
+                if len(in_flight) + len(delayed) >= max_parallel:
+                    break
+                if index >= stop_index:
+                    waiting.remove(index)
+                    continue
+                if not all(dep in results for dep in dependencies[index]):
+                    continue
+                mytest = mytests[index]
+                curl_handle = free_handles.pop() if free_handles else None
+                prepared = prepare_test(mytest, test_config=test_config,
+                                        context=my_context, curl_handle=curl_handle,
+                                        curl_share=curl_share)
+                waiting.remove(index)
+                if mytest.delay > 0:
+                    print("Delaying for %ds" % mytest.delay)
+                    heapq.heappush(delayed, (time.time() + mytest.delay, index, prepared))
+                else:
+                    multi.add_handle(prepared.curl)
+                    in_flight[prepared.curl] = (index, prepared)
+
+            # Start delayed tests once their delay is up
+            while delayed and delayed[0][0] <= time.time():
+                ready_time, index, prepared = heapq.heappop(delayed)
+                multi.add_handle(prepared.curl)
+                in_flight[prepared.curl] = (index, prepared)
+
+            if not in_flight:
+                if delayed:  # Nothing running to hold up
+                    time.sleep(max(0, delayed[0][0] - time.time()))
+                continue
+
+            # Drive the transfers
+            while True:
+                ret, num_handles = multi.perform()
+                if ret != pycurl.E_CALL_MULTI_PERFORM:
+                    break
+
+            # Process completed calls
+            completed = False
+            while True:
+                num_queued, ok_list, err_list = multi.info_read()
+                finished = [finish(curl) for curl in ok_list]
+                finished.extend(finish(curl, curl_error=pycurl.error(errno, errmsg), error_details=errmsg)
+                                for curl, errno, errmsg in err_list)
+                for index, result in finished:
+                    completed = True
+                    if not result.passed and mytests[index].stop_on_failure:
+                        stop_index = min(stop_index, index + 1)
+                if num_queued == 0:
+                    break
+
+            if in_flight and not completed:
+                # Wake up for the next delayed test, if it's due before curl has anything for us
+                max_wait = 1.0
+                if delayed:
+                    max_wait = min(max_wait, max(0, delayed[0][0] - time.time()))
+                wait_for_multi(multi, max_wait=max_wait)
+    finally:
+        for curl in list(in_flight.keys()):
+            multi.remove_handle(curl)
+            curl.close()
+        for ready_time, index, prepared in delayed:
+            prepared.curl.close()
+        for curl in free_handles:
+            curl.close()
+        multi.close()
+
+    return [(mytests[index], results[index]) for index in sorted(results.keys())]
+
+
+def get_level(level, elapsed, duration):
+    """ Get a load level (concurrency or rate) at elapsed seconds into a run
+        Level is either a single value, or a (start, end) tuple ramped linearly over duration """
+    if not isinstance(level, tuple):
+        return level
+    start, end = level
+    if not duration or elapsed >= duration:
+        return end
+    return start + (end - start) * (elapsed / float(duration))
+
+
+def get_scheduled_start(call_number, rate, duration=None):
+    """ Seconds after the start of a run at which a call should start, when calls are
+        started at the given rate per second, or a (start, end) rate ramped linearly over duration """
+    if not isinstance(rate, tuple):
+        return call_number / float(rate)
+    start, end = rate
+    # Calls started by time t is start*t + (end - start)*t^2/(2*duration), solve for t
+    accel = (end - start) / (2.0 * duration)
+    if accel == 0:
+        return call_number / float(start)
+    discriminant = start * start + 4 * accel * call_number
+    if discriminant < 0:  # Rate ramps down to zero before this many calls start
+        return float('inf')
+    return (math.sqrt(discriminant) - start) / (2 * accel)
+
+
+def run_benchmark_concurrent(benchmark, runs=None, test_config=TestConfig(), context=None, metricnames=None, results=None,
+                             concurrency=1, rate=None, duration=None, curl_share=None):
+    """ Execute benchmark calls with up to concurrency calls in flight at once,
+        using a pycurl CurlMulti to drive them. A concurrency of None means no limit.
+
+        Calls are started until runs calls have started, or, if duration is given,
+        until that many seconds have passed. Calls in flight at the end are completed.
+
+        If rate is set, calls start on a fixed schedule of rate calls per second,
+        independent of how quickly responses come back (an open workload model).
+        A call that starts late, because the client or concurrency limit held it up,
+        has the delay added to timing metrics measured from the start of the call
+        (see SCHEDULED_TIME_METRICS), correcting for coordinated omission.
+
+        With a duration, concurrency and rate may be (start, end) tuples to ramp linearly
+        from the start to the end value over the duration.
+
+        Context updates and templating run on the calling thread as each call starts
+        If metricnames and results are supplied, the value of each metric in metricnames
+        is recorded by the matching MetricRecorder in results for every successful call
+
+        Returns a tuple of (calls that succeeded, calls that failed)
+    """
+    if metricnames is None:
+        metricnames = list()
+    metricvalues = [METRICS[name] for name in metricnames]
+    # Indices of metrics to correct by the delay in starting a scheduled call
+    corrected_metrics = [i for i in xrange(0, len(metricnames))
+                         if rate and metricnames[i] in SCHEDULED_TIME_METRICS]
+
+    multi = create_curl_multi(test_config)
+    free_handles = list()
+    in_flight = dict()  # Maps curl handle to the delay in starting it, in seconds
+    started = 0
+    succeeded = 0
+    failures = 0
+    start_time = time.time()
+
+    def next_start():
+        """ Scheduled start time of the next call, relative to start_time, or None if no more calls """
+        if runs is not None and started >= runs:
+            return None
+        scheduled = 0
+        if rate:
+            scheduled = get_scheduled_start(started, rate, duration)
+        if duration is not None and max(scheduled, time.time() - start_time) >= duration:
+            return None
+        return scheduled
+
+    try:
+        scheduled = next_start()
+        while in_flight or scheduled is not None:
+            while scheduled is not None:
+                if concurrency is not None:
+                    limit = get_level(concurrency, time.time() - start_time, duration)
+                    if len(in_flight) >= max(1, int(limit)):
+                        break
+                start_delay = time.time() - start_time - scheduled
+                if start_delay < 0:
+                    break  # Not yet time to start the next call
+                benchmark.update_context_before(context)
+                templated = benchmark.realize(context)
+                curl_handle = free_handles.pop() if free_handles else None
+                curl = templated.configure_curl(
+                    timeout=test_config.timeout, context=context, curl_handle=curl_handle,
+                    keep_alive=test_config.keep_alive, curl_share=curl_share,
+                    http_version=test_config.http_version)
+                configure_curl_config(curl, test_config)
+                # Do not store actual response body at all.
+                curl.setopt(pycurl.WRITEFUNCTION, lambda x: None)
+                multi.add_handle(curl)
+                in_flight[curl] = start_delay
+                started = started + 1
+                scheduled = next_start()
+
+            while True:
+                ret, num_handles = multi.perform()
+                if ret != pycurl.E_CALL_MULTI_PERFORM:
+                    break
+
+            completed = False
+            while True:
+                num_queued, ok_list, err_list = multi.info_read()
+                for curl in ok_list:
+                    multi.remove_handle(curl)
+                    start_delay = in_flight.pop(curl)
+                    if results is not None:
+                        # Get all metrics values for this run, and store to metric lists
+                        values = [curl.getinfo(metric) for metric in metricvalues]
+                        for i in corrected_metrics:
+                            values[i] = values[i] + start_delay
+                        for i in xrange(0, len(values)):
+                            results[i].record(values[i])
+                    free_handles.append(curl)
+                    succeeded = succeeded + 1
+                    completed = True
+                for curl, errno, errmsg in err_list:
+                    multi.remove_handle(curl)
+                    in_flight.pop(curl)
+                    failures = failures + 1
+                    curl.close()  # Replaced with a fresh handle when reconfigured
+                    free_handles.append(curl)
+                    completed = True
+                if num_queued == 0:
+                    break
+
+            if scheduled is not None:
+                scheduled = next_start()  # Duration may have run out
+            if completed:
+                continue
+            max_wait = 1.0
+            if scheduled is not None:  # Wake up in time to start the next call
+                until_scheduled = start_time + scheduled - time.time()
+                if until_scheduled > 0:
+                    max_wait = until_scheduled
+                if isinstance(concurrency, tuple):
+                    max_wait = min(max_wait, 0.1)  # Concurrency limit may ramp up meanwhile
+                if duration is not None:
+                    max_wait = min(max_wait, max(0, start_time + duration - time.time()))
+            if in_flight:
+                wait_for_multi(multi, max_wait=max_wait)
+            elif max_wait > 0:
+                time.sleep(max_wait)
+    finally:
+        for curl in in_flight.keys():
+            multi.remove_handle(curl)
+            curl.close()
+        for curl in free_handles:
+            curl.close()
+        multi.close()
+
+    return succeeded, failures
+
+
+def run_benchmark(benchmark, test_config=TestConfig(), context=None, curl_share=None, *args, **kwargs):
     """ Perform a benchmark, (re)using a given, configured CURL call to do so
         The actual analysis of metrics is performed separately, to allow for testing
     """
@@ -466,13 +889,8 @@ def run_benchmark(benchmark, test_config=TestConfig(), context=None, *args, **kw
 
     result = TestResponse()
 
-    # TODO create and use a curl-returning configuration function
-    # TODO create and use a post-benchmark cleanup function
-    # They should use is_dynamic/is_context_modifier to determine if they need to
-    #  worry about context and re-reading/retemplating and only do it if needed
-    #    - Also, they will need to be smart enough to handle extraction functions
-    #  For performance reasons, we don't want to re-run templating/extraction if
-    #   we do not need to, and do not want to save request bodies.
+    # Template out what doesn't change between runs, and read files, just once
+    benchmark = benchmark.realize_partial(my_context)
 
     # Initialize variables to store output
     output = BenchmarkResult()
@@ -481,8 +899,66 @@ def run_benchmark(benchmark, test_config=TestConfig(), context=None, *args, **kw
     metricnames = list(benchmark.metrics)
     # Metric variable for curl, to avoid hash lookup for every metric name
     metricvalues = [METRICS[name] for name in metricnames]
-    # Initialize arrays to store results for each metric
-    results = [list() for x in xrange(0, len(metricnames))]
+    # Initialize storage for results for each metric, raw arrays only where needed
+    results = [benchmark.create_metric_recorder(name) for name in metricnames]
+
+    if benchmark.concurrency > 1 or benchmark.rate or benchmark.duration or benchmark.profile:
+        concurrency = benchmark.concurrency
+        if benchmark.rate and concurrency == 1:
+            concurrency = None  # Open model: calls start on schedule, however many are in flight
+        logger.info('Warmup: ' + message + ' started')
+        run_benchmark_concurrent(benchmark, warmup_runs, test_config=test_config, context=my_context,
+                                 concurrency=concurrency, rate=benchmark.rate, curl_share=curl_share)
+        logger.info('Warmup: ' + message + ' finished')
+
+        logger.info('Benchmark: ' + message + ' starting')
+        if benchmark.profile:
+            stages = benchmark.profile
+        else:
+            stage = BenchmarkStage()
+            stage.duration = benchmark.duration
+            stage.concurrency = concurrency
+            stage.rate = benchmark.rate
+            stages = [stage]
+
+        succeeded = 0
+        start_time = time.time()
+        for stage in stages:
+            stage_output = BenchmarkResult()
+            stage_output.name = output.name
+            stage_output.group = output.group
+            stage_output.stage = stage
+            stage_results = [benchmark.create_metric_recorder(name) for name in metricnames]
+            runs = None
+            if stage.duration is None:
+                runs = benchmark_runs
+
+            stage_concurrency = stage.concurrency
+            if stage_concurrency is None and not stage.rate:
+                stage_concurrency = benchmark.concurrency
+
+            stage_start = time.time()
+            stage_succeeded, stage_output.failures = run_benchmark_concurrent(
+                benchmark, runs, test_config=test_config, context=my_context,
+                metricnames=metricnames, results=stage_results,
+                concurrency=stage_concurrency, rate=stage.rate, duration=stage.duration,
+                curl_share=curl_share)
+            stage_output.run_time = time.time() - stage_start
+            if stage_output.run_time:
+                stage_output.throughput = stage_succeeded / stage_output.run_time
+            store_metric_results(stage_output, metricnames, stage_results)
+
+            succeeded = succeeded + stage_succeeded
+            output.failures = output.failures + stage_output.failures
+            for i in xrange(0, len(metricnames)):
+                results[i].merge(stage_results[i])
+            if benchmark.profile:
+                output.stages.append(stage_output)
+
+        output.run_time = time.time() - start_time
+        logger.info('Benchmark: ' + message + ' ending')
+        return finish_benchmark(output, benchmark, metricnames, results, succeeded)
+
     curl = pycurl.Curl()
 
     # Benchmark warm-up to allow for caching, JIT compiling, on client
@@ -491,7 +967,10 @@ def run_benchmark(benchmark, test_config=TestConfig(), context=None, *args, **kw
         benchmark.update_context_before(my_context)
         templated = benchmark.realize(my_context)
         curl = templated.configure_curl(
-            timeout=test_config.timeout, context=my_context, curl_handle=curl)
+            timeout=test_config.timeout, context=my_context, curl_handle=curl,
+            keep_alive=test_config.keep_alive, curl_share=curl_share,
+            http_version=test_config.http_version)
+        configure_curl_config(curl, test_config)
         # Do not store actual response body at all.
         curl.setopt(pycurl.WRITEFUNCTION, lambda x: None)
         curl.perform()
@@ -500,12 +979,16 @@ def run_benchmark(benchmark, test_config=TestConfig(), context=None, *args, **kw
 
     logger.info('Benchmark: ' + message + ' starting')
 
+    start_time = time.time()
     for x in xrange(0, benchmark_runs):  # Run the actual benchmarks
         # Setup benchmark
         benchmark.update_context_before(my_context)
         templated = benchmark.realize(my_context)
         curl = templated.configure_curl(
-            timeout=test_config.timeout, context=my_context, curl_handle=curl)
+            timeout=test_config.timeout, context=my_context, curl_handle=curl,
+            keep_alive=test_config.keep_alive, curl_share=curl_share,
+            http_version=test_config.http_version)
+        configure_curl_config(curl, test_config)
         # Do not store actual response body at all.
         curl.setopt(pycurl.WRITEFUNCTION, lambda x: None)
 
@@ -519,20 +1002,37 @@ def run_benchmark(benchmark, test_config=TestConfig(), context=None, *args, **kw
 
         # Get all metrics values for this run, and store to metric lists
         for i in xrange(0, len(metricnames)):
-            results[i].append(curl.getinfo(metricvalues[i]))
+            results[i].record(curl.getinfo(metricvalues[i]))
 
+    output.run_time = time.time() - start_time
     logger.info('Benchmark: ' + message + ' ending')
+    return finish_benchmark(output, benchmark, metricnames, results, benchmark_runs - output.failures)
 
-    temp_results = dict()
+
+def store_metric_results(output, metricnames, results):
+    """ Store the raw arrays and histograms from the MetricRecorder for each metric in the BenchmarkResult """
+    output.results = dict()
+    output.histograms = dict()
     for i in xrange(0, len(metricnames)):
-        temp_results[metricnames[i]] = results[i]
-    output.results = temp_results
+        if results[i].values is not None:
+            output.results[metricnames[i]] = results[i].values
+        if results[i].histogram is not None:
+            output.histograms[metricnames[i]] = results[i].histogram
+
+
+def finish_benchmark(output, benchmark, metricnames, results, completed):
+    """ Store collected metric arrays, histograms and throughput in the BenchmarkResult, then analyze it
+        Completed is the number of calls that succeeded """
+    if output.run_time:
+        output.throughput = completed / output.run_time
+
+    store_metric_results(output, metricnames, results)
     return analyze_benchmark_results(output, benchmark)
 
 
 def analyze_benchmark_results(benchmark_result, benchmark):
     """ Take a benchmark result containing raw benchmark results, and do aggregation by
-    applying functions
+    applying functions, to the metric's histogram if it has one or otherwise its raw array
 
     Aggregates come out in format of metricname, aggregate_name, result """
 
@@ -540,6 +1040,11 @@ def analyze_benchmark_results(benchmark_result, benchmark):
     output.name = benchmark_result.name
     output.group = benchmark_result.group
     output.failures = benchmark_result.failures
+    output.run_time = benchmark_result.run_time
+    output.throughput = benchmark_result.throughput
+    output.stage = benchmark_result.stage
+    output.stages = [analyze_benchmark_results(stage, benchmark)
+                     for stage in benchmark_result.stages]
 
     # Copy raw metric arrays over where necessary
     raw_results = benchmark_result.results
@@ -548,13 +1053,24 @@ def analyze_benchmark_results(benchmark_result, benchmark):
         temp[metric] = raw_results[metric]
     output.results = temp
 
+    histograms = benchmark_result.histograms
+    output.histograms = dict()
+    for metric in benchmark.histogram_metrics:
+        if metric in histograms:
+            output.histograms[metric] = histograms[metric]
+
     # Compute aggregates for each metric, and add tuples to aggregate results
     aggregate_results = list()
     for metricname, aggregate_list in benchmark.aggregated_metrics.items():
-        numbers = raw_results[metricname]
+        histogram = histograms.get(metricname)
+        numbers = raw_results.get(metricname)
         for aggregate_name in aggregate_list:
-            if numbers:  # Only compute aggregates if numbers exist
-                aggregate_function = AGGREGATES[aggregate_name]
+            if histogram is not None and histogram.count:
+                aggregate_function = get_aggregate(aggregate_name, histogram=True)
+                aggregate_results.append(
+                    (metricname, aggregate_name, aggregate_function(histogram)))
+            elif histogram is None and numbers:  # Only compute aggregates if numbers exist
+                aggregate_function = get_aggregate(aggregate_name)
                 aggregate_results.append(
                     (metricname, aggregate_name, aggregate_function(numbers)))
             else:
@@ -602,6 +1118,9 @@ def write_benchmark_csv(file_out, benchmark_result, benchmark, test_config=TestC
     writer.writerow(('Benchmark', benchmark_result.name))
     writer.writerow(('Benchmark Group', benchmark_result.group))
     writer.writerow(('Failures', benchmark_result.failures))
+    if benchmark_result.throughput is not None:
+        writer.writerow(('Run Time', benchmark_result.run_time))
+        writer.writerow(('Throughput', benchmark_result.throughput))
 
     # Write result arrays
     if benchmark_result.results:
@@ -610,6 +1129,18 @@ def write_benchmark_csv(file_out, benchmark_result, benchmark, test_config=TestC
     if benchmark_result.aggregates:
         writer.writerow(('Aggregates', ''))
         writer.writerows(benchmark_result.aggregates)
+    if benchmark_result.histograms:
+        # Rows of (metricname, bucket value, count) for each metric's histogram
+        writer.writerow(('Histograms', ''))
+        for metricname in sorted(benchmark_result.histograms.keys()):
+            for value, count in benchmark_result.histograms[metricname].get_buckets():
+                writer.writerow((metricname, value, count))
+
+    # Write the same information for each stage of a load profile
+    for index, stage_result in enumerate(benchmark_result.stages):
+        writer.writerow(('Stage', index + 1))
+        writer.writerow(('Stage Settings', str(stage_result.stage)))
+        write_benchmark_csv(file_out, stage_result, benchmark, test_config=test_config)
 
 # Method to call when writing benchmark file
 OUTPUT_METHODS = {u'csv': write_benchmark_csv, u'json': write_benchmark_json}
@@ -623,114 +1154,234 @@ def log_failure(failure, context=None, test_config=TestConfig()):
         logger.error("Validator/Error details:" + str(failure.details))
 
 
-def run_testsets(testsets):
-    """ Execute a set of tests, using given TestSet list input """
-    group_results = dict()  # results, by group
+def write_benchmark_output(benchmark, benchmark_result, test_config=TestConfig()):
+    """ Print a benchmark result and write it to the benchmark's output file, if set """
+    print(benchmark_result)
+    if benchmark.output_file:  # Write file
+        logger.debug(
+            'Writing benchmark to file in format: ' + benchmark.output_format)
+        write_method = OUTPUT_METHODS[benchmark.output_format]
+        my_file = open(benchmark.output_file, 'w')  # Overwrites file
+        logger.debug("Benchmark writing to file: " +
+                     benchmark.output_file)
+        write_method(my_file, benchmark_result,
+                     benchmark, test_config=test_config)
+        my_file.close()
+
+
+def create_curl_share():
+    """ Create a pycurl CurlShare for the curl handles in a run to share their DNS cache,
+        TLS sessions, and connection cache, so new handles don't start with cold caches
+        Cookies are not shared, each test starts with none """
+    curl_share = pycurl.CurlShare()
+    curl_share.setopt(pycurl.SH_SHARE, pycurl.LOCK_DATA_DNS)
+    curl_share.setopt(pycurl.SH_SHARE, pycurl.LOCK_DATA_SSL_SESSION)
+    if hasattr(pycurl, 'LOCK_DATA_CONNECT'):  # Needs libcurl 7.57+ & pycurl 7.43.0.2+
+        curl_share.setopt(pycurl.SH_SHARE, pycurl.LOCK_DATA_CONNECT)
+    return curl_share
+
+
+def run_testset(testset, curl_handle=None, write_benchmarks=True, curl_share=None):
+    """ Execute the tests and benchmarks in a single TestSet, with its own Context
+
+        Returns a tuple of (group_test_counts, group_failure_counts, benchmark_results):
+        the first two map test group to number of tests run and failed,
+        benchmark_results is a list of (benchmark index, BenchmarkResult)
+
+        If write_benchmarks is set, benchmark results are printed and written out as they complete
+        Curl handles use curl_share, if given, to share DNS, TLS session & connection caches
+    """
+    group_test_counts = dict()
+    group_failure_counts = dict()
+    benchmark_results = list()
+    mytests = testset.tests
+    myconfig = testset.config
+    mybenchmarks = testset.benchmarks
+    context = Context()
+
+    if curl_handle is None:
+        curl_handle = pycurl.Curl()
+
+    # Bind variables & add generators if pertinent
+    if myconfig.variable_binds:
+        context.bind_variables(myconfig.variable_binds)
+    if myconfig.generators:
+        for key, value in myconfig.generators.items():
+            context.add_generator(key, value)
+
+    if myconfig.test_parallel and not myconfig.interactive:
+        test_results = run_tests_parallel(mytests, test_config=myconfig, context=context, curl_share=curl_share)
+    else:
+        test_results = ((test, run_test(test, test_config=myconfig, context=context,
+                                        curl_handle=curl_handle, curl_share=curl_share))
+                        for test in mytests)
+
+    # Run tests, collecting statistics as needed
+    for test, result in test_results:
+        # Initialize the dictionaries to store test fail counts and results
+        if test.group not in group_test_counts:
+            group_test_counts[test.group] = 0
+            group_failure_counts[test.group] = 0
+
+        result.body = None  # Remove the body, save some memory!
+
+        if not result.passed:  # Print failure, increase failure counts for that test group
+            # Use result test URL to allow for templating
+            logger.error('Test Failed: ' + test.name + " URL=" + result.test.url +
+                         " Group=" + test.group + " HTTP Status Code: " + str(result.response_code) +
+                         " New Connections: " + str(result.num_connects))
+
+            # Print test failure reasons
+            if result.failures:
+                for failure in result.failures:
+                    log_failure(failure, context=context,
+                                test_config=myconfig)
+
+            # Increment test failure counts for that group (adding an entry
+            # if not present)
+            failures = group_failure_counts[test.group]
+            failures = failures + 1
+            group_failure_counts[test.group] = failures
+
+        else:  # Test passed, print results
+            logger.info('Test Succeeded: ' + test.name +
+                        " URL=" + test.url + " Group=" + test.group +
+                        " New Connections: " + str(result.num_connects))
+
+        # Count this test for its test group
+        group_test_counts[test.group] = group_test_counts[test.group] + 1
+
+        # handle stop_on_failure flag
+        if not result.passed and test.stop_on_failure is not None and test.stop_on_failure:
+            print(
+                'STOP ON FAILURE! stopping test set execution, continuing with other test sets')
+            break
+
+    for index, benchmark in enumerate(mybenchmarks):  # Run benchmarks, analyze, write
+        if not benchmark.metrics:
+            logger.debug('Skipping benchmark, no metrics to collect')
+            continue
+
+        logger.info("Benchmark Starting: " + benchmark.name +
+                    " Group: " + benchmark.group)
+        if myconfig.benchmark_workers:
+            benchmark_result = run_benchmark_distributed(
+                benchmark, myconfig.benchmark_workers, test_config=myconfig, context=context)
+        else:
+            benchmark_result = run_benchmark(
+                benchmark, myconfig, context=context, curl_share=curl_share)
+        logger.info("Benchmark Done: " + benchmark.name +
+                    " Group: " + benchmark.group)
+        benchmark_results.append((index, benchmark_result))
+
+        if write_benchmarks:
+            write_benchmark_output(benchmark, benchmark_result, test_config=myconfig)
+
+    return group_test_counts, group_failure_counts, benchmark_results
+
+
+# Test sets for worker processes to run, inherited when the process pool forks
+WORKER_TESTSETS = None
+WORKER_CURL = None  # Curl handle reused by all test sets run in one worker process
+WORKER_CURL_SHARE = None  # Caches shared by all curl handles in one worker process
+
+
+def run_testset_worker(index):
+    """ Run the test set at index in WORKER_TESTSETS, inside a worker process
+        Returns summary results that can be sent back to the parent process """
+    global WORKER_CURL, WORKER_CURL_SHARE
+    if WORKER_CURL is None:
+        WORKER_CURL = pycurl.Curl()
+        WORKER_CURL_SHARE = create_curl_share()
+    return run_testset(WORKER_TESTSETS[index], curl_handle=WORKER_CURL, write_benchmarks=False,
+                       curl_share=WORKER_CURL_SHARE)
+
+
+def run_testsets_workers(testsets, workers):
+    """ Run test sets in a pool of worker processes, yielding each test set's results
+        from run_testset, in test set order
+
+        Workers are forked so they inherit the parsed test sets, which cannot be pickled
+        Returns None if forking processes is not supported on this platform
+    """
+    global WORKER_TESTSETS
+    try:
+        mp_context = multiprocessing.get_context('fork')
+    except AttributeError:  # Python 2 always forks on platforms that support it
+        mp_context = multiprocessing
+    except ValueError:
+        return None
+    if not hasattr(os, 'fork'):
+        return None
+
+    WORKER_TESTSETS = testsets
+    pool = mp_context.Pool(processes=min(workers, len(testsets)))
+    try:
+        results = pool.map(run_testset_worker, range(0, len(testsets)), chunksize=1)
+    finally:
+        pool.close()
+        pool.join()
+        WORKER_TESTSETS = None
+    return results
+
+
+def run_testsets(testsets, workers=1):
+    """ Execute a set of tests, using given TestSet list input
+        With workers > 1, test sets are distributed across that many processes """
+    group_test_counts = dict()  # tests run, by group
     group_failure_counts = dict()
     total_failures = 0
     myinteractive = False
     curl_handle = pycurl.Curl()
+    curl_share = create_curl_share()
 
+    # Only test sets before the first empty one are run
+    to_run = list()
     for testset in testsets:
-        mytests = testset.tests
         myconfig = testset.config
-        mybenchmarks = testset.benchmarks
-        context = Context()
-
-        # Bind variables & add generators if pertinent
-        if myconfig.variable_binds:
-            context.bind_variables(myconfig.variable_binds)
-        if myconfig.generators:
-            for key, value in myconfig.generators.items():
-                context.add_generator(key, value)
-
         # Make sure we actually have tests to execute
-        if not mytests and not mybenchmarks:
+        if not testset.tests and not testset.benchmarks:
             # no tests in this test set, probably just imports.. skip to next
             # test set
             break
-
         myinteractive = True if myinteractive or myconfig.interactive else False
+        to_run.append(testset)
 
-        # Run tests, collecting statistics as needed
-        for test in mytests:
-            # Initialize the dictionaries to store test fail counts and results
-            if test.group not in group_results:
-                group_results[test.group] = list()
-                group_failure_counts[test.group] = 0
-
-            result = run_test(test, test_config=myconfig, context=context, curl_handle=curl_handle)
-            result.body = None  # Remove the body, save some memory!
-
-            if not result.passed:  # Print failure, increase failure counts for that test group
-                # Use result test URL to allow for templating
-                logger.error('Test Failed: ' + test.name + " URL=" + result.test.url +
-                             " Group=" + test.group + " HTTP Status Code: " + str(result.response_code))
-
-                # Print test failure reasons
-                if result.failures:
-                    for failure in result.failures:
-                        log_failure(failure, context=context,
-                                    test_config=myconfig)
-
-                # Increment test failure counts for that group (adding an entry
-                # if not present)
-                failures = group_failure_counts[test.group]
-                failures = failures + 1
-                group_failure_counts[test.group] = failures
-
-            else:  # Test passed, print results
-                logger.info('Test Succeeded: ' + test.name +
-                            " URL=" + test.url + " Group=" + test.group)
-
-            # Add results for this test group to the resultset
-            group_results[test.group].append(result)
-
-            # handle stop_on_failure flag
-            if not result.passed and test.stop_on_failure is not None and test.stop_on_failure:
-                print(
-                    'STOP ON FAILURE! stopping test set execution, continuing with other test sets')
-                break
-
-        for benchmark in mybenchmarks:  # Run benchmarks, analyze, write
-            if not benchmark.metrics:
-                logger.debug('Skipping benchmark, no metrics to collect')
-                continue
-
-            logger.info("Benchmark Starting: " + benchmark.name +
-                        " Group: " + benchmark.group)
-            benchmark_result = run_benchmark(
-                benchmark, myconfig, context=context)
-            print(benchmark_result)
-            logger.info("Benchmark Done: " + benchmark.name +
-                        " Group: " + benchmark.group)
-
-            if benchmark.output_file:  # Write file
-                logger.debug(
-                    'Writing benchmark to file in format: ' + benchmark.output_format)
-                write_method = OUTPUT_METHODS[benchmark.output_format]
-                my_file = open(benchmark.output_file, 'w')  # Overwrites file
-                logger.debug("Benchmark writing to file: " +
-                             benchmark.output_file)
-                write_method(my_file, benchmark_result,
-                             benchmark, test_config=myconfig)
-                my_file.close()
+    testset_results = None
+    if workers > 1 and len(to_run) > 1 and not myinteractive:
+        testset_results = run_testsets_workers(to_run, workers)
+        if testset_results is None:
+            logger.warning('Worker processes are not supported on this platform, running test sets serially')
+        else:
+            for testset, (test_counts, failure_counts, benchmark_results) in zip(to_run, testset_results):
+                for index, benchmark_result in benchmark_results:
+                    write_benchmark_output(testset.benchmarks[index], benchmark_result,
+                                           test_config=testset.config)
+    if testset_results is None:
+        testset_results = (run_testset(testset, curl_handle=curl_handle, curl_share=curl_share)
+                           for testset in to_run)
+
+    # Merge results for each test set
+    for test_counts, failure_counts, benchmark_results in testset_results:
+        for group, count in test_counts.items():
+            group_test_counts[group] = group_test_counts.get(group, 0) + count
+            group_failure_counts[group] = group_failure_counts.get(group, 0) + failure_counts[group]
 
     if myinteractive:
         # a break for when interactive bits are complete, before summary data
         print("===================================")
 
     # Print summary results
-    for group in sorted(group_results.keys()):
-        test_count = len(group_results[group])
+    for group in sorted(group_test_counts.keys()):
+        test_count = group_test_counts[group]
         failures = group_failure_counts[group]
         total_failures = total_failures + failures
 
         passfail = {True: u'SUCCEEDED: ', False: u'FAILED: '}
-        output_string = "Test Group {0} {1}: {2}/{3} Tests Passed!".format(group, passfail[failures == 0], str(test_count - failures), str(test_count)) 
-        
+        output_string = "Test Group {0} {1}: {2}/{3} Tests Passed!".format(group, passfail[failures == 0], str(test_count - failures), str(test_count))
+
         if myconfig.skip_term_colors:
-            print(output_string)    
+            print(output_string)
         else:
             if failures > 0:
                 print('\033[91m' + output_string + '\033[0m')
@@ -791,6 +1442,254 @@ except ImportError as ie:
     logging.debug(
         "Failed to load jmespath extractor, make sure the jmespath module is installed if you wish to use jmespath extractor.")
 
+def parse_worker_addresses(value):
+    """ Parse distributed benchmark worker addresses, given as a list or comma-separated
+        string of host:port values, into a list of (host, port) tuples """
+    if isinstance(value, basestring):
+        value = [x for x in value.split(',') if x.strip()]
+    if not isinstance(value, list):
+        raise TypeError("Invalid benchmark workers, must be a list of host:port addresses: " + str(value))
+    addresses = list()
+    for address in value:
+        host, sep, port = str(address).strip().rpartition(':')
+        if not sep or not host or not port.isdigit():
+            raise ValueError("Invalid benchmark worker address, must be host:port: " + str(address))
+        addresses.append((host, int(port)))
+    return addresses
+
+
+def send_message(connection, message):
+    """ Send a message to a distributed benchmark peer, as one line of JSON """
+    line = json.dumps(message, default=safe_to_json) + '\n'
+    connection.sendall(line.encode('utf-8'))
+
+
+def read_message(reader):
+    """ Read one message from a distributed benchmark peer, or None if the connection closed """
+    line = reader.readline()
+    if not line:
+        return None
+    return json.loads(line.decode('utf-8'))
+
+
+def benchmark_result_from_dict(input):
+    """ Rebuild a BenchmarkResult sent by a distributed worker """
+    output = BenchmarkResult()
+    output.name = input.get('name')
+    output.group = input.get('group')
+    output.failures = input.get('failures', 0)
+    output.run_time = input.get('run_time')
+    output.throughput = input.get('throughput')
+    output.results = input.get('results', dict())
+    output.histograms = dict((metricname, MetricHistogram.from_dict(histogram))
+                             for metricname, histogram in input.get('histograms', dict()).items())
+    if input.get('stage') is not None:
+        output.stage = BenchmarkStage()
+        output.stage.__dict__.update(input['stage'])
+    output.stages = [benchmark_result_from_dict(x) for x in input.get('stages', list())]
+    return output
+
+
+def merge_benchmark_results(benchmark_results):
+    """ Merge raw results of the same benchmark run at once by several workers into one BenchmarkResult
+        Metric arrays, histograms and failures are combined, run time is the longest run,
+        and throughput is the total of all workers """
+    first = benchmark_results[0]
+    output = BenchmarkResult()
+    output.name = first.name
+    output.group = first.group
+    output.stage = first.stage
+    output.failures = sum([x.failures for x in benchmark_results])
+
+    run_times = [x.run_time for x in benchmark_results if x.run_time is not None]
+    if run_times:
+        output.run_time = max(run_times)
+    throughputs = [x.throughput for x in benchmark_results if x.throughput is not None]
+    if throughputs:
+        output.throughput = sum(throughputs)
+
+    merged = dict()
+    for benchmark_result in benchmark_results:
+        for metricname, values in benchmark_result.results.items():
+            merged.setdefault(metricname, list()).extend(values)
+    output.results = merged
+
+    merged = dict()
+    for benchmark_result in benchmark_results:
+        for metricname, histogram in benchmark_result.histograms.items():
+            merged.setdefault(metricname, MetricHistogram(histogram.precision)).merge(histogram)
+    output.histograms = merged
+
+    output.stages = [merge_benchmark_results([x.stages[i] for x in benchmark_results])
+                     for i in xrange(0, len(first.stages))]
+    return output
+
+
+def create_benchmark_job(benchmark, test_config=TestConfig(), context=None):
+    """ Create the job for a benchmark to send to distributed workers, to set up with prepare_benchmark_job """
+    variables = dict()
+    if context is not None:
+        variables = context.get_values()
+    return {
+        'type': 'job',
+        'benchmark': benchmark.definition,
+        'config': {
+            'timeout': test_config.timeout,
+            'keep_alive': test_config.keep_alive,
+            'http_version': test_config.http_version,
+            'ssl_insecure': test_config.ssl_insecure,
+            'verbose': test_config.verbose,
+            'variable_binds': test_config.variable_binds,
+            'generators': test_config.generator_configs
+        },
+        'variables': variables
+    }
+
+
+def prepare_benchmark_job(job):
+    """ Set up a benchmark job sent by a distributed coordinator
+        Returns a tuple of (benchmark, test config, context) to run it with """
+    base_url, node = job['benchmark']
+    test_config = TestConfig()
+    job_config = job.get('config', dict())
+    if job_config.get('timeout') is not None:
+        test_config.timeout = job_config['timeout']
+    test_config.keep_alive = bool(job_config.get('keep_alive'))
+    test_config.http_version = job_config.get('http_version')
+    test_config.ssl_insecure = bool(job_config.get('ssl_insecure'))
+    test_config.verbose = bool(job_config.get('verbose'))
+    if job_config.get('generators'):
+        parse_configuration({'generators': job_config['generators']}, base_config=test_config)
+    test_config.variable_binds = job_config.get('variable_binds')
+
+    benchmark = parse_benchmark(base_url, node)
+    # Send back histograms of aggregated metrics, so the coordinator can aggregate over all workers
+    benchmark.histogram_metrics = benchmark.histogram_metrics | set(benchmark.aggregated_metrics.keys())
+    benchmark.aggregated_metrics = dict()
+
+    context = Context()
+    if test_config.variable_binds:
+        context.bind_variables(test_config.variable_binds)
+    if test_config.generators:
+        for key, value in test_config.generators.items():
+            context.add_generator(key, value)
+    if job.get('variables'):
+        context.bind_variables(job['variables'])
+    return benchmark, test_config, context
+
+
+def handle_benchmark_job(connection):
+    """ Run one benchmark job for a distributed coordinator, over an open connection
+
+        The coordinator sends the job, and the worker replies 'ready' once it is set up.
+        Once every worker is ready, the coordinator sends 'start' and the worker
+        runs the benchmark and replies with its raw results.
+    """
+    reader = connection.makefile('rb')
+    try:
+        job = read_message(reader)
+        if job is None or job.get('type') != 'job':
+            return
+        try:
+            benchmark, test_config, context = prepare_benchmark_job(job)
+        except Exception as e:
+            logger.error('Invalid benchmark job: ' + str(e))
+            send_message(connection, {'type': 'error', 'message': str(e)})
+            return
+        send_message(connection, {'type': 'ready'})
+
+        start = read_message(reader)
+        if start is None or start.get('type') != 'start':
+            logger.warning('Benchmark cancelled by coordinator: ' + benchmark.name)
+            return
+
+        logger.info('Benchmark job starting: ' + benchmark.name)
+        try:
+            benchmark_result = run_benchmark(benchmark, test_config, context=context,
+                                             curl_share=create_curl_share())
+        except Exception as e:
+            logger.error('Benchmark job failed: ' + str(e))
+            send_message(connection, {'type': 'error', 'message': str(e)})
+            return
+        logger.info('Benchmark job done: ' + benchmark.name)
+        send_message(connection, {'type': 'result', 'result': benchmark_result})
+    finally:
+        reader.close()
+        connection.close()
+
+
+def serve_benchmark_worker(listener, max_jobs=None):
+    """ Run as a distributed benchmark worker, handling jobs one at a time from
+        coordinators connecting to the listening socket.  Runs forever unless max_jobs is set """
+    jobs = 0
+    while max_jobs is None or jobs < max_jobs:
+        connection, address = listener.accept()
+        logger.info('Benchmark coordinator connected from {0}'.format(address))
+        try:
+            handle_benchmark_job(connection)
+        except socket.error as e:
+            logger.error('Lost connection to benchmark coordinator: ' + str(e))
+        jobs = jobs + 1
+
+
+def expect_message(reader, message_type, address):
+    """ Read a message of message_type from the worker at address, raising an exception on errors """
+    message = read_message(reader)
+    if message is None:
+        raise Exception("Benchmark worker {0}:{1} closed the connection".format(*address))
+    if message.get('type') == 'error':
+        raise Exception("Benchmark worker {0}:{1} failed: {2}".format(
+            address[0], address[1], message.get('message')))
+    if message.get('type') != message_type:
+        raise Exception("Benchmark worker {0}:{1} sent unexpected message: {2}".format(
+            address[0], address[1], message.get('type')))
+    return message
+
+
+def run_benchmark_distributed(benchmark, workers, test_config=TestConfig(), context=None):
+    """ Run a benchmark on several distributed workers at once, each given as a (host, port) tuple
+
+        Each worker is sent the benchmark configuration, the test set's connection settings
+        (including SSL verification and verbose output), variables & generators,
+        and the current context variables.  Once all workers are ready they are started together,
+        and their raw results are merged and analyzed into one BenchmarkResult.
+        Each worker runs the full benchmark, so benchmark_runs and rate are per-worker.
+    """
+    if benchmark.definition is None:
+        raise ValueError("Benchmark must be parsed from configuration to run on distributed workers")
+
+    job = create_benchmark_job(benchmark, test_config, context)
+
+    connections = list()
+    try:
+        for address in workers:
+            try:
+                connection = socket.create_connection(address, WORKER_CONNECT_TIMEOUT)
+            except socket.error as e:
+                raise Exception("Could not connect to benchmark worker {0}:{1}: {2}".format(
+                    address[0], address[1], e))
+            connection.settimeout(None)  # Benchmarks may run for a long time
+            connections.append((address, connection, connection.makefile('rb')))
+            send_message(connection, job)
+
+        # Start all workers together, once each is ready
+        for address, connection, reader in connections:
+            expect_message(reader, 'ready', address)
+        for address, connection, reader in connections:
+            send_message(connection, {'type': 'start'})
+
+        worker_results = list()
+        for address, connection, reader in connections:
+            message = expect_message(reader, 'result', address)
+            worker_results.append(benchmark_result_from_dict(message['result']))
+    finally:
+        for address, connection, reader in connections:
+            reader.close()
+            connection.close()
+
+    return analyze_benchmark_results(merge_benchmark_results(worker_results), benchmark)
+
+
 def main(args):
     """
     Execute a test against the given base url.
@@ -804,6 +1703,10 @@ def main(args):
         interactive   - OPTIONAL - mode that prints info before and after test exectuion and pauses for user input for each test
         absolute_urls - OPTIONAL - mode that treats URLs in tests as absolute/full URLs instead of relative URLs
         skip_term_colors - OPTIONAL - mode that turn off the output term colors
+        workers       - OPTIONAL - number of worker processes to distribute test sets across (default=1)
+        benchmark_workers - OPTIONAL - comma-separated host:port addresses of distributed workers to run benchmarks on
+        benchmark_worker - OPTIONAL - port to listen on as a distributed benchmark worker, instead of running tests
+        benchmark_worker_host - OPTIONAL - interface for a benchmark worker to listen on (default 127.0.0.1, local only)
     """
 
     if 'log' in args and args['log'] is not None:
@@ -819,6 +1722,21 @@ def main(args):
             sys.path.insert(0, working_folder)
         register_extensions(extensions)
 
+    if 'benchmark_worker' in args and args['benchmark_worker']:
+        port = str(args['benchmark_worker']).strip()
+        if not port.isdigit():
+            raise ValueError("Invalid benchmark worker port, set the interface with --benchmark-worker-host: " + port)
+        host = args.get('benchmark_worker_host') or DEFAULT_WORKER_HOST
+        listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        listener.bind((host, int(port)))
+        listener.listen(5)
+        print("Benchmark worker listening on {0}:{1}".format(host, port))
+        if host != DEFAULT_WORKER_HOST:
+            logger.warning("Benchmark worker accepts jobs from anyone who can connect to {0}:{1}".format(host, port))
+        serve_benchmark_worker(listener)
+        return
+
     test_file = args['test']
     test_structure = read_test_file(test_file)
 
@@ -857,8 +1775,15 @@ def main(args):
         if 'skip_term_colors' in args and args['skip_term_colors'] is not None:
             t.config.skip_term_colors = safe_to_bool(args['skip_term_colors'])
 
+        if 'benchmark_workers' in args and args['benchmark_workers']:
+            t.config.benchmark_workers = parse_worker_addresses(args['benchmark_workers'])
+
+    workers = 1
+    if 'workers' in args and args['workers'] is not None:
+        workers = int(args['workers'])
+
     # Execute all testsets
-    failures = run_testsets(tests)
+    failures = run_testsets(tests, workers=workers)
 
     sys.exit(failures)
 
@@ -889,14 +1814,24 @@ def parse_command_line_args(args_in):
                       action='store_true', default=False, dest="ssl_insecure")
     parser.add_option(u'--absolute-urls', help='Enable absolute URLs in tests instead of relative paths',
                       action="store_true", dest="absolute_urls")
+    parser.add_option(u'--workers', help='Number of worker processes to run test sets in (default 1)',
+                      action="store", type="int", dest="workers")
     parser.add_option(u'--skip_term_colors', help='Turn off the output term colors',
                       action='store_true', default=False, dest="skip_term_colors")
+    parser.add_option(u'--benchmark-workers', help='Run benchmarks on distributed workers, as comma-separated host:port addresses',
+                      action="store", type="string", dest="benchmark_workers")
+    parser.add_option(u'--benchmark-worker', help='Run as a distributed benchmark worker, listening on the given port',
+                      action="store", type="string", dest="benchmark_worker")
+    parser.add_option(u'--benchmark-worker-host',
+                      help='Interface for a benchmark worker to listen on, default 127.0.0.1 (only local connections)',
+                      action="store", type="string", dest="benchmark_worker_host")
 
     (args, unparsed_args) = parser.parse_args(args_in)
     args = vars(args)
 
     # Handle url/test as named, or, failing that, positional arguments
-    if not args['url'] or not args['test']:
+    # Distributed benchmark workers get their tests from the coordinator instead
+    if (not args['url'] or not args['test']) and not args['benchmark_worker']:
         if len(unparsed_args) == 2:
             args[u'url'] = unparsed_args[0]
             args[u'test'] = unparsed_args[1]
@@ -1,3 +1,4 @@
+import random
 import unittest
 from . import benchmarks
 from .benchmarks import *
@@ -34,6 +35,47 @@ class BenchmarkTest(unittest.TestCase):
         self.assertEqual(2, len(cfg.aggregated_metrics['total_time']))
         self.assertEqual(1, len(cfg.aggregated_metrics['pretransfer_time']))
 
+    def test_benchmark_concurrency(self):
+        """ Test parsing of concurrent benchmark configuration """
+        cfg = parse_benchmark('what', [{'concurrency': '8'}])
+        self.assertEqual(8, cfg.concurrency)
+        cfg = parse_benchmark('what', [{'benchmark_runs': 10}])
+        self.assertEqual(1, cfg.concurrency)
+        self.assertRaises(ValueError, parse_benchmark, 'what', [{'concurrency': 0}])
+
+    def test_benchmark_rate(self):
+        """ Test parsing of rate-based benchmark configuration """
+        cfg = parse_benchmark('what', [{'rate': '12.5'}])
+        self.assertEqual(12.5, cfg.rate)
+        self.assertEqual(None, parse_benchmark('what', []).rate)
+        self.assertRaises(ValueError, parse_benchmark, 'what', [{'rate': 0}])
+
+    def test_benchmark_duration_profile(self):
+        """ Test parsing of benchmark duration and staged load profiles """
+        cfg = parse_benchmark('what', [{'duration': '30'}])
+        self.assertEqual(30.0, cfg.duration)
+        self.assertEqual(None, cfg.profile)
+        self.assertRaises(ValueError, parse_benchmark, 'what', [{'duration': -1}])
+
+        cfg = parse_benchmark('what', [{'profile': [
+            {'duration': 10, 'rate': [5, 50]},
+            [{'duration': 20}, {'concurrency': 8}]
+        ]}])
+        self.assertEqual(2, len(cfg.profile))
+        self.assertEqual(10.0, cfg.profile[0].duration)
+        self.assertEqual((5.0, 50.0), cfg.profile[0].rate)
+        self.assertEqual(None, cfg.profile[0].concurrency)
+        self.assertEqual(20.0, cfg.profile[1].duration)
+        self.assertEqual(8.0, cfg.profile[1].concurrency)
+        self.assertEqual(None, cfg.profile[1].rate)
+
+        # Stages need a duration, and valid levels
+        self.assertRaises(ValueError, parse_benchmark, 'what', [{'profile': [{'rate': 5}]}])
+        self.assertRaises(ValueError, parse_benchmark, 'what', [{'profile': [{'duration': 1, 'rate': [1, 2, 3]}]}])
+        self.assertRaises(ValueError, parse_benchmark, 'what', [{'profile': [{'duration': 1, 'concurrency': 0}]}])
+        self.assertRaises(ValueError, parse_benchmark, 'what', [{'profile': [{'duration': 1, 'bogus': 0}]}])
+        self.assertRaises(TypeError, parse_benchmark, 'what', [{'profile': []}])
+
     def test_median(self):
         """ Test median computation, using a few samples """
         result = median([0.1])
@@ -74,6 +116,38 @@ class BenchmarkTest(unittest.TestCase):
         result = function([1, 100])
         self.assertTrue(math.fabs(float(result) - float(1.98019802)) < 0.001)
 
+    def test_percentiles(self):
+        """ Test selection and percentiles match sorting, and percentile aggregate names """
+        generator = random.Random(11)
+        array = [generator.randint(0, 50) for x in range(0, 501)]
+        ordered = sorted(array)
+        for index in (0, 1, 250, 499, 500):
+            self.assertEqual(ordered[index], select(array, index))
+        self.assertEqual(ordered[250], median(array))
+        self.assertEqual(ordered[0], percentile(array, 0))
+        self.assertEqual(ordered[-1], percentile(array, 100))
+        self.assertEqual(ordered[495], percentile(array, 99))
+        self.assertEqual(ordered[4], percentile(array, 0.9))
+        self.assertEqual(1, percentile([1], 99.9))
+
+        self.assertEqual(99.9, parse_percentile('percentile_99.9'))
+        self.assertEqual(None, parse_percentile('percentile_101'))
+        self.assertEqual(None, parse_percentile('percentile_'))
+        self.assertEqual(None, parse_percentile('median'))
+        self.assertEqual(ordered[495], get_aggregate('percentile_99')(array))
+        self.assertEqual(None, get_aggregate('percentile_fish'))
+        self.assertTrue(get_aggregate('median', histogram=True) is HISTOGRAM_AGGREGATES['median'])
+
+        cfg = parse_benchmark('what', [{'metrics': [{'total_time': {'percentiles': [50, 99, '99.9']}},
+                                                    {'connect_time': 'percentile_90'}]}])
+        self.assertEqual(['percentile_50', 'percentile_99', 'percentile_99.9'],
+                         cfg.aggregated_metrics['total_time'])
+        self.assertEqual(['percentile_90'], cfg.aggregated_metrics['connect_time'])
+        self.assertRaises(ValueError, parse_benchmark, 'what',
+                          [{'metrics': {'total_time': {'percentiles': [101]}}}])
+        self.assertRaises(TypeError, parse_benchmark, 'what',
+                          [{'metrics': {'total_time': {'percentiles': 99}}}])
+
     def test_aggregate_computations(self):
         """ Test running all the aggregates, just to see if they error """
         array = [-1, 5, 2.245, 7]
@@ -112,6 +186,61 @@ class BenchmarkTest(unittest.TestCase):
         self.assertEqual(2, len(benchmark_config.raw_metrics))
         self.assertEqual(2, len(benchmark_config.aggregated_metrics.keys()))
 
+    def test_benchmark_histograms(self):
+        """ Test parsing of histogram options, and recording metrics without raw arrays """
+        cfg = parse_benchmark('what', [{'histogram_precision': '2'},
+                                       {'metrics': [{'total_time': 'histogram'}, {'total_time': 'mean'}, 'size_download']}])
+        self.assertEqual(2, cfg.histogram_precision)
+        self.assertEqual(set(['total_time']), cfg.histogram_metrics)
+        self.assertEqual(set(['size_download']), cfg.raw_metrics)
+        self.assertRaises(ValueError, parse_benchmark, 'what', [{'histogram_precision': 0}])
+
+        recorder = cfg.create_metric_recorder('total_time')
+        self.assertEqual(None, recorder.values)
+        self.assertEqual(2, recorder.histogram.precision)
+        recorder.record(0.5)
+        other = cfg.create_metric_recorder('total_time')
+        other.record(1.5)
+        recorder.merge(other)
+        self.assertEqual(2, recorder.histogram.count)
+
+        recorder = cfg.create_metric_recorder('size_download')
+        self.assertEqual(None, recorder.histogram)
+        recorder.record(10)
+        self.assertEqual([10], recorder.values)
+
+    def test_realize_partial(self):
+        """ Test benchmarks template out what doesn't change between runs """
+        benchmark = parse_benchmark('http://localhost', [
+            {'url': {'template': '/api/$id'}},
+            {'headers': {'template': {'X-Static': '$token'}}},
+            {'body': {'template': '{"name": "$name"}'}},
+            {'variable_binds': {'name': 'bob'}},
+            {'generator_binds': {'id': 'ids'}}
+        ])
+        context = Context()
+        context.bind_variable('token', 'abc')
+
+        partial = benchmark.realize_partial(context)
+        self.assertFalse(partial is benchmark)
+        self.assertEqual(['url'], list(partial.templates.keys()))
+        self.assertEqual({'X-Static': 'abc'}, partial.headers)
+        self.assertEqual('{"name": "bob"}', partial.body)
+        self.assertEqual(None, context.get_value('name'))  # Context is not modified
+        self.assertTrue(benchmark.is_dynamic())
+
+        context.bind_variable('id', 5)
+        self.assertEqual('http://localhost/api/5', partial.realize(context).url)
+
+        # Nothing changes between runs, so nothing is left templated
+        benchmark = parse_benchmark('http://localhost', [{'url': {'template': '/api/$id'}}])
+        partial = benchmark.realize_partial(context)
+        self.assertFalse(partial.is_dynamic())
+        self.assertEqual('http://localhost/api/5', partial.url)
+
+        benchmark = parse_benchmark('http://localhost', [{'url': '/api'}])
+        self.assertTrue(benchmark is benchmark.realize_partial(context))
+
 
 if __name__ == '__main__':
     unittest.main()
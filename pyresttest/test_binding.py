@@ -30,6 +30,14 @@ class BindingTest(unittest.TestCase):
         self.assertEqual('bar2', context.get_value('foo'))
         self.assertEqual(2, context.mod_count)
 
+        # Equal values count as changes if their types differ
+        context.bind_variable('foo', 1)
+        context.bind_variable('foo', 1)
+        self.assertEqual(3, context.mod_count)
+        context.bind_variable('foo', True)
+        self.assertTrue(context.get_value('foo') is True)
+        self.assertEqual(4, context.mod_count)
+
     def test_generator(self):
         """ Test adding a generator """
         context = Context()
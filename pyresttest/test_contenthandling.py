@@ -195,6 +195,27 @@ class ContentHandlerTest(unittest.TestCase):
         self.assertTrue(handler.is_template_path)
         self.assertTrue(handler.is_template_content)
 
+    def test_content_template_variables(self):
+        """ Test finding the variables content templating reads """
+        handler = ContentHandler()
+        handler.setup(u'{"id": "$id"}')
+        self.assertEqual(set(), handler.get_template_variables())
+
+        handler.setup(u'{"id": "$id", "name": "${name}"}', is_template_content=True)
+        self.assertEqual(set(['id', 'name']), handler.get_template_variables())
+
+        # Path is templated, file content is not
+        handler.setup(u'$path', is_file=True, is_template_path=True)
+        self.assertEqual(set(['path']), handler.get_template_variables())
+
+        # Content of a templated path is unknown until templating
+        handler.setup(u'$path', is_file=True, is_template_path=True, is_template_content=True)
+        self.assertEqual(None, handler.get_template_variables())
+
+        # Missing files are treated as reading anything, and fail when the test runs
+        handler.setup(u'/does/not/exist.json', is_file=True, is_template_content=True)
+        self.assertEqual(None, handler.get_template_variables())
+
     def test_parse_content_breaks(self):
         """ Test for handling parsing of some bad input cases """
         failing_configs = list()
@@ -0,0 +1,103 @@
+import json
+import math
+import random
+import unittest
+
+from .histogram import MetricHistogram
+from . import benchmarks
+
+
+class MetricHistogramTest(unittest.TestCase):
+    """ Tests for HDR-style metric histograms """
+
+    def test_record(self):
+        """ Test exact count, sum, min and max, and values within precision """
+        histogram = MetricHistogram()
+        self.assertEqual(2048, histogram.sub_buckets)
+        self.assertEqual(None, histogram.get_mean())
+        self.assertEqual(None, histogram.get_percentile(50))
+        for value in (0.5, 0.7, 0.9, 0, 1234.5):
+            histogram.record(value)
+        self.assertEqual(5, histogram.count)
+        self.assertEqual(0, histogram.min)
+        self.assertEqual(1234.5, histogram.max)
+        self.assertEqual(0.5 + 0.7 + 0.9 + 1234.5, histogram.sum)
+        self.assertEqual((0.5 + 0.7 + 0.9 + 1234.5) / 5, histogram.get_mean())
+
+        buckets = histogram.get_buckets()
+        self.assertEqual(5, len(buckets))
+        self.assertEqual((0, 1), buckets[0])
+        for (value, count), expected in zip(buckets[1:], (0.5, 0.7, 0.9, 1234.5)):
+            self.assertTrue(abs(value - expected) <= expected * 0.001)
+            self.assertEqual(1, count)
+        self.assertRaises(ValueError, histogram.record, -1)
+        self.assertRaises(ValueError, MetricHistogram, 0)
+        self.assertRaises(ValueError, MetricHistogram, 6)
+
+    def test_percentiles(self):
+        """ Test percentiles and other statistics match exact ones within precision """
+        generator = random.Random(7)
+        values = [generator.lognormvariate(-4, 1) for x in range(0, 10000)]
+        histogram = MetricHistogram(3)
+        for value in values:
+            histogram.record(value)
+        ordered = sorted(values)
+        for percentile in (1, 25, 50, 90, 99, 99.9):
+            exact = ordered[int(math.ceil(percentile / 100.0 * len(values))) - 1]
+            self.assertTrue(abs(histogram.get_percentile(percentile) - exact) <= exact * 0.001)
+        self.assertEqual(ordered[0], histogram.get_percentile(0))
+        self.assertEqual(ordered[-1], histogram.get_percentile(100))
+
+        # Standard deviation and harmonic mean are tracked exactly
+        std_deviation = benchmarks.std_deviation(values)
+        self.assertAlmostEqual(std_deviation, histogram.get_std_deviation(), places=12)
+        harmonic = benchmarks.AGGREGATES['mean_harmonic'](values)
+        self.assertAlmostEqual(harmonic, histogram.get_harmonic_mean(), places=12)
+        self.assertTrue(len(histogram.counts) < len(values))
+
+        # Without running stats, such as from older exports, they are estimated from buckets
+        histogram.squares = None
+        histogram.reciprocals = None
+        self.assertTrue(abs(histogram.get_std_deviation() - std_deviation) <= std_deviation * 0.001)
+        self.assertTrue(abs(histogram.get_harmonic_mean() - harmonic) <= harmonic * 0.001)
+
+    def test_merge_export(self):
+        """ Test merging histograms, and round-tripping them through JSON """
+        first = MetricHistogram(2)
+        second = MetricHistogram(2)
+        for value in (1, 2, 3):
+            first.record(value)
+        for value in (0, 3, 100):
+            second.record(value)
+        first.merge(second)
+        self.assertEqual(6, first.count)
+        self.assertEqual(0, first.min)
+        self.assertEqual(100, first.max)
+        self.assertEqual(109, first.sum)
+        self.assertAlmostEqual(benchmarks.std_deviation([1, 2, 3, 0, 3, 100]), first.get_std_deviation())
+        self.assertEqual(0.0, first.get_harmonic_mean())
+        self.assertRaises(ValueError, first.merge, MetricHistogram(3))
+
+        exported = json.loads(json.dumps(first.to_dict()))
+        self.assertEqual(2, exported['precision'])
+        loaded = MetricHistogram.from_dict(exported)
+        self.assertEqual(first.counts, loaded.counts)
+        self.assertEqual(first.get_buckets(), loaded.get_buckets())
+        self.assertEqual(first.to_dict(), loaded.to_dict())
+        self.assertAlmostEqual(first.get_std_deviation(), loaded.get_std_deviation())
+        del exported['squares']
+        self.assertEqual(None, MetricHistogram.from_dict(exported).squares)
+
+        # Recording a value several times at once is the same as recording it repeatedly
+        repeated = MetricHistogram()
+        once = MetricHistogram()
+        repeated.record(2.5, 3)
+        repeated.record(7)
+        for value in (2.5, 2.5, 2.5, 7):
+            once.record(value)
+        self.assertAlmostEqual(once.get_std_deviation(), repeated.get_std_deviation())
+        self.assertAlmostEqual(once.get_harmonic_mean(), repeated.get_harmonic_mean())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -20,6 +20,11 @@ class TestParsing(unittest.TestCase):
         self.assertEqual(byteform, encode_unicode_bytes(byteform))
         self.assertEqual(b'156', encode_unicode_bytes(num))
 
+    def test_get_template_variables(self):
+        self.assertEqual(set(), get_template_variables(u'no variables here $$'))
+        self.assertEqual(set(['id', 'name']), get_template_variables(u'/api/$id/${name}?id=$id'))
+        self.assertEqual(set(['var']), get_template_variables(u'指 $var'))
+
     def test_unicode_templating(self):
         # Unicode template and unicode substitution
         unicode_template_string = u'my name is 指 and my value is $var'
@@ -37,6 +42,23 @@ class TestParsing(unittest.TestCase):
         substituted = safe_substitute_unicode_template(unicode_template_string, normal_variables)
         self.assertEqual(u'my name is 指 and my value is bob', substituted)
 
+    def test_compiled_template(self):
+        """ Test compiled templates render the same as string.Template.safe_substitute """
+        variables = {'id': 5, 'name': u'bob', 'empty': '', 'float': 1.5}
+        templates = [u'', u'no variables', u'/api/$id/${name}?id=$id', u'$$id costs $$$id',
+                     u'$missing ${missing} and $ invalid ${not valid} $', u'$id$name${empty}$float',
+                     u'${id}5 $name_suffix $name.suffix']
+        for template in templates:
+            compiled = CompiledTemplate(template)
+            self.assertEqual(string.Template(template).safe_substitute(variables), compiled.render(variables))
+        self.assertEqual(u'/api/5/bob?id=5', CompiledTemplate(u'/api/$id/${name}?id=$id').render(variables))
+        self.assertEqual(frozenset(['id', 'name']), CompiledTemplate(u'/api/$id/${name}?id=$id').names)
+
+        # Only recompiled if the template changes
+        compiled = compile_template(u'$id')
+        self.assertTrue(compiled is compile_template(u'$id', compiled))
+        self.assertEqual(u'bob', compile_template(u'$name', compiled).render(variables))
+
 
     def test_flatten(self):
         """ Test flattening of lists of dictionaries to single dictionaries """
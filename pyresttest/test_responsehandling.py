@@ -0,0 +1,180 @@
+# -*- coding: utf-8 -*-
+import unittest
+from . import responsehandling
+from .responsehandling import ResponseBody, SpilledBody, ResponseHeaders, get_body_text, get_body_json
+from .six import binary_type
+from . import validators
+
+
+class ResponseBodyTest(unittest.TestCase):
+    """ Testing for response body capture """
+
+    def test_write(self):
+        """ Test writing chunks, and finishing the body as bytes """
+        body = ResponseBody()
+        body.write_header(b'HTTP/1.1 200 OK\r\n')
+        body.write_header(b'Content-Length: 16\r\n')
+        body.write(b'{"key": ')
+        body.write(b'"value"}')
+        self.assertEqual(b'{"key": "value"}', body.finish())
+        self.assertEqual(16, body.length)
+        self.assertTrue(isinstance(body.finish(), binary_type))
+        self.assertTrue(b'value' in body.finish())
+        self.assertTrue(body.finish() is body.finish())
+
+        # Huge lengths don't allocate anything up front
+        body = ResponseBody()
+        body.write_header(b'Content-Length: 800000000\r\n')
+        body.write(b'abc')
+        self.assertEqual(b'abc', body.finish())
+
+    def test_get_text(self):
+        """ Test text is decoded once and cached """
+        body = ResponseBody()
+        body.write(u'{"key": "välue"}'.encode('utf-8'))
+        text = body.get_text()
+        self.assertEqual(u'{"key": "välue"}', text)
+        self.assertTrue(text is body.get_text())
+        self.assertTrue(text is get_body_text(body.finish()))
+        self.assertEqual(u'{"key": "välue"}'.encode('utf-8'), body.finish())
+
+    def test_get_json(self):
+        """ Test JSON is parsed once per response, and shared by extractors """
+        body = ResponseBody()
+        body.write(b'{"key": {"nested": [1, 2]}, "empty": null}')
+        parsed = body.get_json()
+        self.assertEqual({'key': {'nested': [1, 2]}, 'empty': None}, parsed)
+        self.assertTrue(parsed is get_body_json(body.finish()))
+
+        extractor = validators.MiniJsonExtractor.parse('key')
+        self.assertTrue(parsed['key'] is extractor.extract(body=body.finish()))
+
+        # Another body with the same content is parsed again
+        other = ResponseBody()
+        other.write(b'{"key": {"nested": [1, 2]}, "empty": null}')
+        self.assertFalse(parsed is get_body_json(other.finish()))
+
+        # A null body is cached too
+        body = ResponseBody()
+        body.write(b'null')
+        self.assertEqual(None, body.get_json())
+        self.assertTrue(responsehandling.get_parsed_body(body.finish())._json_parsed)
+
+        body = ResponseBody()
+        body.write(b'{"bad json')
+        self.assertRaises(ValueError, body.get_json)
+        self.assertEqual({'a': 1}, get_body_json(b'{"a": 1}'))
+
+    def test_spill(self):
+        """ Test bodies over the threshold are spilled to a file and mapped """
+        body = ResponseBody()
+        body.spill_threshold = 5
+        body.write(b'abc')
+        self.assertEqual(None, body.spill_file)
+        body.write(b'def')
+        body.write(u'välue'.encode('utf-8'))
+        spilled = body.finish()
+        self.assertTrue(isinstance(spilled, SpilledBody))
+        self.assertTrue(spilled is body.finish())
+        self.assertEqual(u'abcdefvälue'.encode('utf-8'), spilled)
+        self.assertFalse(spilled != u'abcdefvälue'.encode('utf-8'))
+        self.assertNotEqual(b'abcdef', spilled)
+        self.assertTrue(b'cde' in spilled)
+        self.assertFalse(b'xyz' in spilled)
+        self.assertEqual(b'abc', spilled[0:3])
+        text = get_body_text(spilled)
+        self.assertEqual(u'abcdefvälue', text)
+        self.assertTrue(text is spilled.get_text())
+        spilled.close()
+
+        body = ResponseBody()
+        body.spill_threshold = 5
+        body.write(b'{"key": "value"}')
+        spilled = body.finish()
+        self.assertEqual({'key': 'value'}, spilled.get_json())
+        self.assertTrue(spilled.get_json() is get_body_json(spilled))
+        spilled.close()
+
+        # Spilled up front from Content-Length
+        body = ResponseBody()
+        body.spill_threshold = 5
+        body.write_header(b'Content-Length: 10\r\n')
+        self.assertFalse(body.spill_file is None)
+        body.write(b'abcdefghij')
+        self.assertEqual(b'abcdefghij', body.finish())
+
+        # Empty bodies can't be mapped, and stay in memory
+        body = ResponseBody()
+        body.spill_threshold = 5
+        body.write_header(b'Content-Length: 10\r\n')
+        self.assertEqual(b'', body.finish())
+        self.assertTrue(isinstance(body.finish(), binary_type))
+
+        # Nothing comes back to spill if there's no body, as for HEAD requests
+        body = ResponseBody()
+        body.spill_threshold = 5
+        body.no_body = True
+        body.write_header(b'Content-Length: 10\r\n')
+        self.assertEqual(None, body.spill_file)
+
+        # Small bodies stay in memory
+        body = ResponseBody()
+        body.spill_threshold = 5
+        body.write(b'abcde')
+        self.assertTrue(isinstance(body.finish(), binary_type))
+
+    def test_extension_validator(self):
+        """ Test extensions that check for bytes bodies get them from a real response body """
+        import sample_extension
+        body = ResponseBody()
+        body.write_header(b'Content-Length: 20\r\n')
+        body.write(b'{"login": "svanoort"}')
+        validator = sample_extension.ContainsValidator.parse(u'svanoort')
+        self.assertTrue(validator.validate(body=body.finish()))
+        validator = sample_extension.ContainsValidator.parse(u'missing')
+        self.assertFalse(validator.validate(body=body.finish()))
+
+    def test_get_body_text(self):
+        """ Test getting text from other bodies """
+        self.assertEqual(u'välue', get_body_text(u'välue'))
+        self.assertEqual(None, get_body_text(None))
+        if responsehandling.PYTHON_MAJOR_VERSION > 2:
+            self.assertEqual(u'välue', get_body_text(u'välue'.encode('utf-8')))
+            self.assertEqual(u'välue', get_body_text(bytearray(u'välue'.encode('utf-8'))))
+
+
+class ResponseHeadersTest(unittest.TestCase):
+    """ Testing for lazy response header parsing """
+
+    def test_parse_lines(self):
+        """ Test parsing header lines as passed by curl, with duplicates and folded lines """
+        lines = [b'HTTP/1.1 200 OK\r\n', b'Content-Type: application/json\r\n', b'X-Thing: a\r\n',
+                 b'x-thing:b\r\n', b'X-Folded: first\r\n', b'  second\r\n', b'Bad header line\r\n',
+                 b'X-Latin: caf\xe9\r\n', b'\r\n']
+        headers = ResponseHeaders(lines)
+        self.assertEqual([(u'content-type', u'application/json'), (u'x-thing', u'a'), (u'x-thing', u'b'),
+                          (u'x-folded', u'first second'), (u'x-latin', u'caf\xe9')], list(headers))
+        self.assertEqual(5, len(headers))
+        self.assertEqual((u'x-thing', u'a'), headers[1])
+        self.assertEqual(u'application/json', headers.get('Content-TYPE'))
+        self.assertEqual([u'a', u'b'], headers.get_all('X-Thing'))
+        self.assertEqual(u'b', headers.get('x-thing'))
+        self.assertEqual([], headers.get_all('x-missing'))
+        self.assertEqual('default', headers.get('x-missing', 'default'))
+        self.assertEqual(list(headers), headers)
+
+    def test_parse_multiple_responses(self):
+        """ Test only the final response's headers are used, after redirects and 100 Continue """
+        headers = ResponseHeaders(u'HTTP/1.1 100 Continue\r\n\r\n'
+                                  u'HTTP/1.1 302 Found\r\nLocation: /next\r\nSet-Cookie: a=1\r\n\r\n'
+                                  u'HTTP/2 200\r\ncontent-length: 2\r\n\r\n')
+        self.assertEqual([(u'content-length', u'2')], list(headers))
+        self.assertEqual(None, headers.get('location'))
+
+        self.assertEqual(0, len(ResponseHeaders([])))
+        self.assertFalse(ResponseHeaders(b''))
+        self.assertEqual(0, len(ResponseHeaders(b'HTTP/1.1 200 OK\r\n\r\n')))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -38,6 +38,200 @@ class TestRestTest(unittest.TestCase):
         self.assertEqual(3, len(distinct_aggregates))
         self.assertEqual(3, len(analyzed.aggregates))
 
+    def test_analyze_benchmark_throughput(self):
+        """ Test that run time and throughput carry through to analyzed output """
+        benchmark_result = BenchmarkResult()
+        benchmark_config = Benchmark()
+        benchmark_config.add_metric('total_time', 'mean')
+        benchmark_result.results = {'total_time': [0.5, 0.7, 0.9]}
+        benchmark_result.run_time = 2.0
+        benchmark_result.throughput = 1.5
+
+        analyzed = analyze_benchmark_results(
+            benchmark_result, benchmark_config)
+        self.assertEqual(2.0, analyzed.run_time)
+        self.assertEqual(1.5, analyzed.throughput)
+
+        from io import StringIO
+        output = StringIO()
+        write_benchmark_csv(output, analyzed, benchmark_config)
+        self.assertTrue('Throughput,1.5' in output.getvalue())
+
+    def test_analyze_benchmark_stages(self):
+        """ Test that each stage of a load profile gets analyzed and written """
+        benchmark_config = Benchmark()
+        benchmark_config.add_metric('total_time', 'mean')
+        benchmark_result = BenchmarkResult()
+        benchmark_result.results = {'total_time': [0.5, 0.7, 0.9]}
+        stage_result = BenchmarkResult()
+        stage_result.stage = BenchmarkStage()
+        stage_result.stage.duration = 5.0
+        stage_result.results = {'total_time': [0.5, 0.7]}
+        stage_result.run_time = 5.0
+        stage_result.throughput = 0.4
+        benchmark_result.stages.append(stage_result)
+
+        analyzed = analyze_benchmark_results(
+            benchmark_result, benchmark_config)
+        self.assertEqual(1, len(analyzed.stages))
+        self.assertEqual([('total_time', 'mean', 0.6)], analyzed.stages[0].aggregates)
+        self.assertEqual(0.4, analyzed.stages[0].throughput)
+
+        from io import StringIO
+        output = StringIO()
+        write_benchmark_csv(output, analyzed, benchmark_config)
+        self.assertTrue('Stage,1' in output.getvalue())
+        self.assertTrue('Throughput,0.4' in output.getvalue())
+
+    def test_analyze_benchmark_histograms(self):
+        """ Test aggregates are computed from histograms, which are output if asked for """
+        benchmark_config = Benchmark()
+        benchmark_config.add_metric('total_time', 'mean').add_metric('total_time', 'median')
+        benchmark_config.add_metric('total_time', 'percentile_99.9')
+        benchmark_config.add_metric('size_download', 'histogram')
+        benchmark_config.add_metric('size_download')
+        benchmark_result = BenchmarkResult()
+        recorders = [benchmark_config.create_metric_recorder(name) for name in ('total_time', 'size_download')]
+        self.assertEqual(None, recorders[0].values)
+        for total_time, size in ((0.5, 10), (0.7, 10), (0.9, 20)):
+            recorders[0].record(total_time)
+            recorders[1].record(size)
+        store_metric_results(benchmark_result, ['total_time', 'size_download'], recorders)
+        self.assertEqual({'size_download': [10, 10, 20]}, benchmark_result.results)
+
+        analyzed = analyze_benchmark_results(benchmark_result, benchmark_config)
+        aggregates = dict(((x[0], x[1]), x[2]) for x in analyzed.aggregates)
+        self.assertAlmostEqual(0.7, aggregates[('total_time', 'mean')])
+        self.assertTrue(abs(aggregates[('total_time', 'median')] - 0.7) < 0.001)
+        self.assertEqual(0.9, aggregates[('total_time', 'percentile_99.9')])
+        self.assertEqual(['size_download'], list(analyzed.histograms.keys()))
+
+        from io import StringIO
+        output = StringIO()
+        write_benchmark_csv(output, analyzed, benchmark_config)
+        self.assertTrue('Histograms' in output.getvalue())
+        self.assertTrue('size_download,0.0,0' not in output.getvalue())
+        exported = json.loads(json.dumps(analyzed, default=safe_to_json))
+        self.assertEqual(3, exported['histograms']['size_download']['count'])
+
+    def test_load_levels(self):
+        """ Test ramping of concurrency & rate levels, and call scheduling """
+        self.assertEqual(5, get_level(5, 3.0, 10))
+        self.assertEqual(2.0, get_level((1, 11), 1.0, 10))
+        self.assertEqual(11, get_level((1, 11), 12.0, 10))
+
+        self.assertEqual(2.0, get_scheduled_start(10, 5))
+        self.assertEqual(2.0, get_scheduled_start(10, (5, 5), 10))
+        # Ramping 0 to 10 calls/second over 10 seconds starts 50 calls total, 5 in the first 3.16 seconds
+        self.assertAlmostEqual(10.0, get_scheduled_start(50, (0, 10), 10))
+        self.assertAlmostEqual(math.sqrt(10), get_scheduled_start(5, (0, 10), 10))
+        # Ramping down schedules the last call at the end
+        self.assertAlmostEqual(10.0, get_scheduled_start(50, (10, 0), 10))
+
+    def test_create_curl_share(self):
+        """ Shared caches attach to curl handles used for tests """
+        curl_share = create_curl_share()
+        self.assertTrue(isinstance(curl_share, pycurl.CurlShare))
+        test = Test.parse_test('http://localhost', {'url': '/ping'})
+        prepared = prepare_test(test, context=Context(), curl_share=curl_share)
+        prepared.curl.close()
+
+    def test_parse_worker_addresses(self):
+        """ Test parsing distributed benchmark worker addresses """
+        self.assertEqual([('localhost', 9001), ('10.0.0.2', 9002)],
+                         parse_worker_addresses('localhost:9001, 10.0.0.2:9002'))
+        self.assertEqual([('localhost', 9001)], parse_worker_addresses(['localhost:9001']))
+        self.assertRaises(ValueError, parse_worker_addresses, 'localhost')
+        self.assertRaises(ValueError, parse_worker_addresses, 'localhost:port')
+        self.assertRaises(TypeError, parse_worker_addresses, 9001)
+
+        config = parse_configuration([{'benchmark_workers': ['localhost:9001']}])
+        self.assertEqual([('localhost', 9001)], config.benchmark_workers)
+
+    def test_merge_benchmark_results(self):
+        """ Test merging raw results from distributed benchmark workers """
+        worker_results = list()
+        for values in ([0.5, 0.7], [0.9]):
+            benchmark_result = BenchmarkResult()
+            benchmark_result.failures = 1
+            benchmark_result.run_time = len(values)
+            benchmark_result.throughput = 1.0
+            benchmark_result.results = {'total_time': values}
+            stage_result = BenchmarkResult()
+            stage_result.results = {'total_time': values}
+            benchmark_result.stages.append(stage_result)
+
+            # Round-trip through the wire format
+            worker_results.append(benchmark_result_from_dict(
+                json.loads(json.dumps(benchmark_result, default=safe_to_json))))
+
+        merged = merge_benchmark_results(worker_results)
+        self.assertEqual(2, merged.failures)
+        self.assertEqual(2, merged.run_time)
+        self.assertEqual(2.0, merged.throughput)
+        self.assertEqual([0.5, 0.7, 0.9], merged.results['total_time'])
+        self.assertEqual(1, len(merged.stages))
+        self.assertEqual([0.5, 0.7, 0.9], merged.stages[0].results['total_time'])
+
+        # Histograms from workers are merged
+        worker_results = list()
+        for values in ([0.5, 0.7], [0.9]):
+            benchmark_result = BenchmarkResult()
+            histogram = MetricHistogram()
+            for value in values:
+                histogram.record(value)
+            benchmark_result.histograms = {'total_time': histogram}
+            worker_results.append(benchmark_result_from_dict(
+                json.loads(json.dumps(benchmark_result, default=safe_to_json))))
+        merged = merge_benchmark_results(worker_results)
+        self.assertEqual(3, merged.histograms['total_time'].count)
+        self.assertEqual(0.9, merged.histograms['total_time'].max)
+
+    def test_benchmark_job(self):
+        """ Test benchmark jobs carry the test set's settings to workers """
+        benchmark = parse_benchmark('https://localhost', [{'url': '/'}, {'metrics': [{'total_time': 'mean'}]}])
+        test_config = TestConfig()
+        test_config.ssl_insecure = True
+        test_config.verbose = True
+        test_config.timeout = 5
+        context = Context()
+        context.bind_variable('id', 7)
+        job = json.loads(json.dumps(create_benchmark_job(benchmark, test_config, context)))
+
+        benchmark, worker_config, worker_context = prepare_benchmark_job(job)
+        self.assertTrue(worker_config.ssl_insecure)
+        self.assertTrue(worker_config.verbose)
+        self.assertEqual(5, worker_config.timeout)
+        self.assertEqual(7, worker_context.get_value('id'))
+        self.assertEqual(set(['total_time']), benchmark.histogram_metrics)
+
+        benchmark, worker_config, worker_context = prepare_benchmark_job(create_benchmark_job(benchmark))
+        self.assertFalse(worker_config.ssl_insecure)
+        self.assertFalse(worker_config.verbose)
+
+    def test_run_benchmark_distributed(self):
+        """ Test running a benchmark on several workers on localhost, against a closed port """
+        import socket
+        import threading
+        workers = list()
+        for x in xrange(0, 3):
+            listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            listener.bind(('127.0.0.1', 0))
+            listener.listen(1)
+            thread = threading.Thread(target=serve_benchmark_worker, args=(listener,), kwargs={'max_jobs': 1})
+            thread.daemon = True
+            thread.start()
+            workers.append(listener.getsockname())
+
+        benchmark = parse_benchmark('http://127.0.0.1:1', [{'url': '/'}, {'warmup_runs': 0},
+            {'benchmark_runs': 2}, {'metrics': [{'total_time': 'mean'}]}])
+        benchmark_result = run_benchmark_distributed(benchmark, workers)
+        self.assertEqual(6, benchmark_result.failures)
+        self.assertEqual([('total_time', 'mean', None)], benchmark_result.aggregates)
+
+        # Only benchmarks parsed from configuration can be sent to workers
+        self.assertRaises(ValueError, run_benchmark_distributed, Benchmark(), workers)
+
     def test_metrics_to_tuples(self):
         """ Test method to build list(tuples) from raw metrics """
         array1 = [-1, 5.6, 0]
@@ -94,6 +288,89 @@ class TestRestTest(unittest.TestCase):
         self.assertEqual(('accept', 'text/html'), headers[1])
         self.assertEqual(('accept', 'application/json'), headers[2])
 
+    def test_parse_headers_redirects(self):
+        """ Test headers for a followed redirect, where only the final response's headers are used """
+        headerstring = u'HTTP/1.1 301 Moved Permanently\r\nLocation: /new\r\n\r\nHTTP/1.1 200 OK\r\nContent-Type: text/html\r\n\r\n'
+        headers = resttest.parse_headers(headerstring)
+        self.assertEqual([('content-type', 'text/html')], headers)
+
+    def test_parse_configuration_parallel(self):
+        """ Test parsing of parallel execution options in test set config """
+        config = parse_configuration([{'test_parallel': 'true'}, {'max_parallel': 4}])
+        self.assertTrue(config.test_parallel)
+        self.assertEqual(4, config.max_parallel)
+
+        config = parse_configuration({'parallel': False})
+        self.assertFalse(config.test_parallel)
+        self.assertEqual(TestConfig.max_parallel, config.max_parallel)
+
+        self.assertRaises(ValueError, parse_configuration, {'max_parallel': 0})
+
+    def test_parse_configuration_http_version(self):
+        """ Test parsing of HTTP version in test set config """
+        self.assertEqual(None, parse_configuration({}).http_version)
+        self.assertEqual('1.1', parse_configuration({'http_version': 1.1}).http_version)
+        self.assertEqual('2', parse_configuration({'http_version': '2.0'}).http_version)
+        self.assertEqual('2-prior-knowledge', parse_configuration(
+            {'http_version': '2-Prior-Knowledge'}).http_version)
+        self.assertRaises(ValueError, parse_configuration, {'http_version': '3.5'})
+
+        config = parse_configuration({'http_version': '2'})
+        create_curl_multi(config).close()
+
+        # Versions the installed pycurl doesn't support give a clear error
+        from . import tests
+        supported = tests.HTTP_VERSIONS.pop('2-prior-knowledge', None)
+        try:
+            self.assertRaises(ValueError, parse_configuration, {'http_version': '2-prior-knowledge'})
+        finally:
+            if supported is not None:
+                tests.HTTP_VERSIONS['2-prior-knowledge'] = supported
+
+    def test_parse_configuration_body_spill_threshold(self):
+        """ Test parsing of the body size to spill to temp files in test set config """
+        self.assertEqual(None, parse_configuration({}).body_spill_threshold)
+        self.assertEqual(1048576, parse_configuration(
+            {'body_spill_threshold': '1048576'}).body_spill_threshold)
+        self.assertRaises(ValueError, parse_configuration, {'body_spill_threshold': -1})
+
+    def test_parse_configuration_keep_alive(self):
+        """ Test parsing of connection keep-alive in test set config """
+        self.assertFalse(parse_configuration({}).keep_alive)
+        self.assertTrue(parse_configuration({'keep_alive': 'true'}).keep_alive)
+
+    def test_build_test_dependencies(self):
+        """ Tests wait only for earlier tests sharing context variables they use """
+        mytests = [
+            Test.parse_test('', {'url': '/api/1'}),
+            Test.parse_test('', {'url': '/api/create', 'extract_binds': {'id': {'jsonpath_mini': 'id'}}}),
+            Test.parse_test('', {'url': '/api/2'}),
+            Test.parse_test('', {'url': {'template': '/api/$id'}}),
+            Test.parse_test('', {'url': '/api/3', 'variable_binds': {'id': 5}}),
+            Test.parse_test('', {'url': '/api/4', 'stop_on_failure': True}),
+            Test.parse_test('', {'url': '/api/5'})
+        ]
+        dependencies = build_test_dependencies(mytests)
+        self.assertEqual(set(), dependencies[0])
+        self.assertEqual(set(), dependencies[1])
+        self.assertEqual(set(), dependencies[2])
+        self.assertEqual(set([1]), dependencies[3])  # Reads what 1 extracts
+        self.assertEqual(set([1, 3]), dependencies[4])  # Overwrites what 1 and 3 use
+        self.assertEqual(set(), dependencies[5])
+        self.assertEqual(set([5]), dependencies[6])  # Stop on failure blocks later tests
+
+        # Validators with unknown variable use depend on any earlier binding
+        mytests[2].validators = [validators.AbstractValidator()]
+        dependencies = build_test_dependencies(mytests)
+        self.assertEqual(set([1]), dependencies[2])
+
+        # Templated body files that can't be read are scheduled as reading anything, not errors
+        mytests[2].validators = None
+        mytests[2] = Test.parse_test('', {'url': '/api/2', 'method': 'POST',
+                                          'body': {'template': {'file': '/does/not/exist.json'}}})
+        dependencies = build_test_dependencies(mytests)
+        self.assertEqual(set([1]), dependencies[2])
+
     def test_jmespath_import(self):
         """ Verify that JMESPath extractor loads if class present """
 
@@ -145,5 +422,47 @@ class TestRestTest(unittest.TestCase):
         self.assertEqual('my_url', args['url'])
         self.assertEqual('my_test_filename', args['test'])
 
+    def test_cmdline_args_parsing_workers(self):
+        """ Worker process count is parsed as an integer, defaulting to unset """
+        args = parse_command_line_args(['my_url', 'my_test_filename'])
+        self.assertEqual(None, args['workers'])
+
+        args = parse_command_line_args(['my_url', 'my_test_filename', '--workers', '4'])
+        self.assertEqual(4, args['workers'])
+
+    def test_cmdline_args_parsing_benchmark_workers(self):
+        """ Distributed benchmark workers need no url or test file """
+        args = parse_command_line_args(['my_url', 'my_test_filename', '--benchmark-workers', 'host1:9001,host2:9001'])
+        self.assertEqual('host1:9001,host2:9001', args['benchmark_workers'])
+
+        args = parse_command_line_args(['--benchmark-worker', '9001'])
+        self.assertEqual('9001', args['benchmark_worker'])
+        self.assertEqual(None, args['benchmark_worker_host'])  # Listens on 127.0.0.1
+        self.assertEqual(None, args['test'])
+
+        args = parse_command_line_args(['--benchmark-worker', '9001', '--benchmark-worker-host', '0.0.0.0'])
+        self.assertEqual('0.0.0.0', args['benchmark_worker_host'])
+        self.assertRaises(ValueError, main, {'benchmark_worker': '0.0.0.0:9001'})
+
+    def test_run_tests_parallel_delay(self):
+        """ Test delayed tests wait without holding up the rest, against a closed port """
+        import time
+        from .tests import Test
+        mytests = [Test.parse_test('http://127.0.0.1:1', {'url': '/' + str(x), 'delay': delay})
+                   for x, delay in enumerate([1, 0, 1])]
+        test_config = TestConfig()
+        test_config.max_parallel = 3
+        start = time.time()
+        results = run_tests_parallel(mytests, test_config)
+        self.assertTrue(time.time() - start < 1.8)  # Delays overlap, rather than adding up
+        self.assertEqual(mytests, [mytest for mytest, result in results])
+        self.assertEqual([False, False, False], [result.passed for mytest, result in results])
+
+    def test_run_testsets_empty(self):
+        """ Test sets with nothing to run report no failures, with or without workers """
+        testsets = [TestSet(), TestSet()]
+        self.assertEqual(0, run_testsets(testsets))
+        self.assertEqual(0, run_testsets(testsets, workers=4))
+
 if __name__ == '__main__':
     unittest.main()
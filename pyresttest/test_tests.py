@@ -222,6 +222,119 @@ class TestsTest(unittest.TestCase):
         mock_handle.setopt.assert_any_call(mock_handle.USERPWD, b'bobbyg:password')
         mock_handle.close()
 
+    def test_parse_keep_alive(self):
+        """ Test parsing of per-test connection keep-alive """
+        test = Test.parse_test('', {'url': '/ping'})
+        self.assertEqual(None, test.keep_alive)
+        test = Test.parse_test('', {'url': '/ping', 'keep_alive': 'false'})
+        self.assertEqual(False, test.keep_alive)
+        test = Test.parse_test('', {'url': '/ping', 'keep_alive': True})
+        self.assertEqual(True, test.keep_alive)
+
+    def test_parse_stream_body(self):
+        """ Test parsing of stream_body, which only allows streaming validators """
+        test = Test.parse_test('', {'url': '/ping'})
+        self.assertEqual(False, test.stream_body)
+        test = Test.parse_test('', {'url': '/ping', 'stream_body': True,
+                                    'validators': [{'body_size': {'max': 10}}, {'json_syntax': {}}],
+                                    'extract_binds': [{'type': {'header': 'content-type'}}]})
+        self.assertEqual(True, test.stream_body)
+        self.assertEqual(2, len(test.validators))
+
+        self.assertRaises(ValueError, Test.parse_test, '', {
+            'url': '/ping', 'stream_body': True,
+            'validators': [{'compare': {'jsonpath_mini': 'id', 'expected': 1}}]})
+        self.assertRaises(ValueError, Test.parse_test, '', {
+            'url': '/ping', 'stream_body': True,
+            'extract_binds': [{'id': {'jsonpath_mini': 'id'}}]})
+
+    def test_configure_curl_share(self):
+        """ Test that reused curl handles can be configured with a share every time """
+        share = pycurl.CurlShare()
+        share.setopt(pycurl.SH_SHARE, pycurl.LOCK_DATA_DNS)
+        test = Test.parse_test('', {'url': 'http://localhost/ping'})
+        curl = test.configure_curl(curl_share=share)
+        curl = test.configure_curl(curl_handle=curl, curl_share=share)
+        curl = test.configure_curl(curl_handle=curl, curl_share=pycurl.CurlShare())
+        curl.close()
+        # Closed handles get replaced
+        curl = test.configure_curl(curl_handle=curl, curl_share=share)
+        curl.close()
+
+    def test_configure_curl_reuse(self):
+        """ Test that reused handles only get fully reconfigured when static options change """
+        test = Test.parse_test('http://localhost', {'url': '/ping', 'method': 'POST', 'body': 'stuff'})
+        curl = test.configure_curl()
+        options = curl.pyresttest_options
+        self.assertTrue(curl.pyresttest_request[0] is test)
+
+        curl = test.configure_curl(curl_handle=curl)
+        self.assertTrue(curl.pyresttest_options is options)  # Not reconfigured
+
+        other = Test.parse_test('http://localhost', {'url': '/pong', 'method': 'POST', 'body': 'things'})
+        curl = other.configure_curl(curl_handle=curl)
+        self.assertTrue(curl.pyresttest_options is options)
+        self.assertTrue(curl.pyresttest_request[0] is other)
+
+        curl = other.configure_curl(curl_handle=curl, timeout=1)
+        self.assertFalse(curl.pyresttest_options is options)
+        options = curl.pyresttest_options
+
+        other.method = u'PUT'
+        curl = other.configure_curl(curl_handle=curl, timeout=1)
+        self.assertFalse(curl.pyresttest_options is options)
+        self.assertEqual(u'PUT', curl.pyresttest_options[0])
+        curl.close()
+
+    def test_configure_curl_reuse_changed(self):
+        """ Test a static test changed between runs on one handle sends the new URL and headers """
+        import socket
+        import threading
+        listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        listener.bind(('127.0.0.1', 0))
+        listener.listen(2)
+        requests = list()
+
+        def serve():
+            for x in range(0, 2):
+                connection = listener.accept()[0]
+                request = b''
+                while b'\r\n\r\n' not in request:
+                    request = request + connection.recv(4096)
+                requests.append(request)
+                connection.sendall(b'HTTP/1.1 200 OK\r\nContent-Length: 0\r\nConnection: close\r\n\r\n')
+                connection.close()
+        thread = threading.Thread(target=serve)
+        thread.daemon = True
+        thread.start()
+        try:
+            base_url = 'http://127.0.0.1:{0}'.format(listener.getsockname()[1])
+            test = Test.parse_test(base_url, {'url': '/first', 'headers': {'X-Run': 'first'}})
+            curl = test.configure_curl()
+            curl.setopt(pycurl.WRITEFUNCTION, lambda x: None)
+            curl.perform()
+            test.url = base_url + '/second'
+            test.headers = {'X-Run': 'second'}
+            curl = test.configure_curl(curl_handle=curl)
+            curl.perform()
+            curl.close()
+            thread.join(5)
+        finally:
+            listener.close()
+        self.assertTrue(requests[0].startswith(b'GET /first '))
+        self.assertTrue(b'X-Run:first' in requests[0])
+        self.assertTrue(requests[1].startswith(b'GET /second '))
+        self.assertTrue(b'X-Run:second' in requests[1])
+
+    def test_configure_curl_http_version(self):
+        """ Test configuring curl for each supported HTTP version """
+        test = Test.parse_test('', {'url': 'http://localhost/ping'})
+        curl = None
+        for http_version in HTTP_VERSIONS.keys():
+            curl = test.configure_curl(curl_handle=curl, http_version=http_version)
+        curl.close()
+        self.assertRaises(KeyError, test.configure_curl, http_version='0.9')
+
     def test_parse_test_templated_headers(self):
         """ Test parsing with templated headers """
 
@@ -409,6 +522,39 @@ class TestsTest(unittest.TestCase):
         realized = test.realize(context)
         self.assertEqual('stilton', realized.url)
 
+    def test_realize_memoized(self):
+        """ Test realized tests are reused until the context changes """
+        test = Test()
+        test.set_url('/$cheese', isTemplate=True)
+        context = Context()
+        context.bind_variable('cheese', 'stilton')
+
+        realized = test.realize(context)
+        self.assertTrue(realized is test.realize(context))
+        context.bind_variable('cheese', 'stilton')  # Same value, context unchanged
+        self.assertTrue(realized is test.realize(context))
+
+        context.bind_variable('cheese', 'brie')
+        realized2 = test.realize(context)
+        self.assertFalse(realized is realized2)
+        self.assertEqual('/brie', realized2.url)
+        self.assertEqual('/stilton', realized.url)
+
+        # A different context, or changing the test, realizes it again
+        context2 = Context()
+        context2.bind_variable('cheese', 'cheddar')
+        self.assertEqual('/cheddar', test.realize(context2).url)
+        test.set_url('/$cheese/1', isTemplate=True)
+        self.assertEqual('/cheddar/1', test.realize(context2).url)
+
+        # Equal values of a different type template differently, so aren't served stale
+        context2.bind_variable('cheese', 1)
+        self.assertEqual('/1/1', test.realize(context2).url)
+        context2.bind_variable('cheese', True)
+        self.assertEqual('/True/1', test.realize(context2).url)
+        context2.bind_variable('cheese', 1.0)
+        self.assertEqual('/1.0/1', test.realize(context2).url)
+
     def test_test_content_templating(self):
         test = Test()
         handler = ContentHandler()
@@ -448,6 +594,30 @@ class TestsTest(unittest.TestCase):
         self.assertEqual(1, len(head))
         self.assertEqual('gouda', head['cheese'])
 
+    def test_test_variables_read_written(self):
+        """ Test finding context variables a test reads and binds """
+        test = Test.parse_test('', {
+            'url': {'template': '/api/$id'},
+            'headers': {'template': {'$headername': 'value'}},
+            'body': {'template': '{"login": "$login"}'},
+            'validators': [{'compare': {'jsonpath_mini': 'id', 'expected': {'template': '$expected'}}}],
+            'variable_binds': {'login': 'bob'},
+            'generator_binds': {'id': 'gen'},
+            'extract_binds': {'newid': {'jsonpath_mini': {'template': '$path'}}}
+        })
+        self.assertEqual(set(['id', 'headername', 'login', 'expected', 'path']),
+                         test.get_variables_read())
+        self.assertEqual(set(['login', 'id', 'generator:gen', 'newid']),
+                         test.get_variables_written())
+
+        test = Test.parse_test('', {'url': '/api/1'})
+        self.assertEqual(set(), test.get_variables_read())
+        self.assertEqual(set(), test.get_variables_written())
+
+        test.body = ContentHandler.parse_content(
+            {'template': {'file': {'template': '$path'}}})
+        self.assertEqual(None, test.get_variables_read())
+
     def test_update_context_variables(self):
         test = Test()
         context = Context()
@@ -1,11 +1,19 @@
 # -*- coding: utf-8 -*-
 import unittest
+import os
+import tempfile
 
 from . import validators
 from .validators import register_extractor
+from .responsehandling import ResponseHeaders
 from . import binding
 from .binding import Context
 
+try:  # Needs the jmespath module
+    from .ext import extractor_jmespath
+except ImportError:
+    extractor_jmespath = None
+
 class ValidatorsTest(unittest.TestCase):
     """ Testing for validators and extract functions """
 
@@ -176,6 +184,24 @@ class ValidatorsTest(unittest.TestCase):
         val = validators.MiniJsonExtractor.query_dictionary(query, mydict)
         self.assertEqual('val', val)
 
+    def test_jsonpathmini_compiled(self):
+        """ Test queries are compiled at parse time, or cached per templated query """
+        self.assertEqual(('key', 1, 'val'), validators.MiniJsonExtractor.compile_query('key.1.val'))
+        self.assertEqual(tuple(), validators.MiniJsonExtractor.compile_query('..'))
+        self.assertEqual(None, validators.MiniJsonExtractor.compile_query(None))
+
+        extractor = validators.MiniJsonExtractor.parse('key.1')
+        self.assertEqual(('key', 1), extractor.compiled_query)
+        self.assertEqual('b', extractor.extract(body='{"key": ["a", "b"]}'))
+
+        extractor = validators.MiniJsonExtractor.parse({'template': 'key.$index'})
+        self.assertEqual(None, extractor.compiled_query)
+        context = Context()
+        for index, expected in ((1, 'b'), (0, 'a'), (1, 'b')):
+            context.bind_variable('index', index)
+            self.assertEqual(expected, extractor.extract(body='{"key": ["a", "b"]}', context=context))
+        self.assertEqual(('key', 1), validators.COMPILED_MINI_JSON_QUERIES['key.1'])
+
     def test_jsonpathmini_unicode(self):
         myjson = u'{"myVals": [0, 1.0, "😽"], "my😽":"value"}'
 
@@ -261,6 +287,17 @@ class ValidatorsTest(unittest.TestCase):
         self.assertEqual(headers[0][1], extracted[0])
         self.assertEqual(headers[1][1], extracted[1])
 
+    def test_header_extractor_response_headers(self):
+        """ Test header extraction from lazily parsed response headers """
+        headers = ResponseHeaders([b'HTTP/1.1 200 OK\r\n', b'Content-Type: application/json\r\n',
+                                   b'X-Thing: a\r\n', b'X-Thing: b\r\n', b'\r\n'])
+        extractor = validators.HeaderExtractor.parse('content-Type')
+        self.assertEqual('application/json', extractor.extract(body='blahblah', headers=headers))
+        extractor = validators.HeaderExtractor.parse('x-thing')
+        self.assertEqual(['a', 'b'], extractor.extract(body='blahblah', headers=headers))
+        extractor = validators.HeaderExtractor.parse('x-missing')
+        self.assertRaises(ValueError, extractor.extract, body='blahblah', headers=headers)
+
     def test_parse_header_extractor(self):
         query = 'content-type'
         extractor = validators.parse_extractor('header', query)
@@ -492,6 +529,27 @@ class ValidatorsTest(unittest.TestCase):
         self.assertTrue(comp.validate(body=myjson_pass, context=context))
         self.assertFalse(comp.validate(body=myjson_fail, context=context))
 
+    def test_validator_template_variables(self):
+        """ Test finding context variables that validators read """
+        comp = validators.ComparatorValidator.parse({
+            'jsonpath_mini': {'template': 'key.$node'},
+            'expected': {'template': '$id'}
+        })
+        self.assertEqual(set(['node', 'id']), comp.get_template_variables())
+
+        comp = validators.ComparatorValidator.parse({
+            'jsonpath_mini': 'key.val',
+            'expected': {'jsonpath_mini': {'template': '$other'}}
+        })
+        self.assertEqual(set(['other']), comp.get_template_variables())
+
+        test_validator = validators.ExtractTestValidator.parse(
+            {'jsonpath_mini': 'key.val', 'test': 'exists'})
+        self.assertEqual(set(), test_validator.get_template_variables())
+
+        # Unknown validators may read anything
+        self.assertEqual(None, validators.AbstractValidator().get_template_variables())
+
     def test_validator_comparator_extract(self):
         """ Try comparing two extract expressions """
         config = {
@@ -558,6 +616,89 @@ class ValidatorsTest(unittest.TestCase):
         except ImportError:
            pass  # Doesn't run JMESPath test if can't import library
 
+    @unittest.skipIf(extractor_jmespath is None, "JMESPath module absent")
+    def test_jmespath_compiled(self):
+        """ Test JMESPath queries are compiled at parse time, or cached if templated """
+        body = '{"key": {"val": 3, "other": 4}}'
+
+        extractor = extractor_jmespath.JMESPathExtractor.parse('key.val')
+        self.assertTrue(extractor.compiled_query is not None)
+        self.assertEqual(3, extractor.extract(body=body))
+
+        extractor = extractor_jmespath.JMESPathExtractor.parse({'template': 'key.$field'})
+        self.assertEqual(None, extractor.compiled_query)
+        context = Context()
+        context.bind_variable('field', 'other')
+        self.assertEqual(4, extractor.extract(body=body, context=context))
+        expression = extractor_jmespath.COMPILED_EXPRESSIONS['key.other']
+        self.assertTrue(expression is extractor_jmespath.compile_expression('key.other'))
+
+        # Least recently used expressions are dropped
+        old_max = extractor_jmespath.MAX_COMPILED_EXPRESSIONS
+        try:
+            extractor_jmespath.MAX_COMPILED_EXPRESSIONS = 2
+            extractor_jmespath.COMPILED_EXPRESSIONS.clear()
+            extractor_jmespath.compile_expression('a')
+            extractor_jmespath.compile_expression('b')
+            extractor_jmespath.compile_expression('a')
+            extractor_jmespath.compile_expression('c')
+            self.assertEqual(['a', 'c'], list(extractor_jmespath.COMPILED_EXPRESSIONS.keys()))
+        finally:
+            extractor_jmespath.MAX_COMPILED_EXPRESSIONS = old_max
+
+        # Invalid queries still fail at extraction time
+        extractor = extractor_jmespath.JMESPathExtractor.parse('key.[')
+        self.assertRaises(ValueError, extractor.extract, body=body)
+
+    def test_jsonschema_compiled(self):
+        """ Test JSON schemas are compiled once, and recompiled if the file or rendered schema changes """
+        try:
+            import jsonschema
+            from .ext import validator_jsonschema
+        except ImportError:
+            raise unittest.SkipTest("jsonschema module absent")
+        schema_int = '{"type": "object", "properties": {"id": {"type": "integer"}}}'
+        schema_str = '{"type": "object", "properties": {"id": {"type": "string"}}}'
+
+        validator = validator_jsonschema.JsonSchemaValidator.parse({'schema': schema_int})
+        self.assertTrue(validator.validate(body='{"id": 1}'))
+        compiled = validator.compiled_schema
+        self.assertTrue(compiled is not None)
+        self.assertFalse(validator.validate(body='{"id": "one"}'))
+        self.assertTrue(compiled is validator.compiled_schema)
+
+        # Invalid schemas are still an error
+        validator = validator_jsonschema.JsonSchemaValidator.parse({'schema': '{"type": 5}'})
+        self.assertRaises(jsonschema.exceptions.SchemaError, validator.validate, body='{"id": 1}')
+
+        # File changes are picked up
+        handle, path = tempfile.mkstemp(suffix='.json')
+        try:
+            with os.fdopen(handle, 'w') as f:
+                f.write(schema_int)
+            validator = validator_jsonschema.JsonSchemaValidator.parse({'schema': {'file': path}})
+            self.assertTrue(validator.validate(body='{"id": 1}'))
+            with open(path, 'w') as f:
+                f.write(schema_str + ' ')
+            self.assertFalse(validator.validate(body='{"id": 1}'))
+            self.assertTrue(validator.validate(body='{"id": "one"}'))
+        finally:
+            os.remove(path)
+
+        # Templated schemas are cached per rendered schema
+        validator = validator_jsonschema.JsonSchemaValidator.parse(
+            {'schema': {'template': '{"properties": {"id": {"type": "$type"}}}'}})
+        context = Context()
+        context.bind_variable('type', 'integer')
+        self.assertTrue(validator.validate(body='{"id": 1}', context=context))
+        compiled = validator_jsonschema.COMPILED_SCHEMAS['{"properties": {"id": {"type": "integer"}}}']
+        context.bind_variable('type', 'string')
+        self.assertFalse(validator.validate(body='{"id": 1}', context=context))
+        context.bind_variable('type', 'integer')
+        self.assertTrue(validator.validate(body='{"id": 1}', context=context))
+        self.assertTrue(compiled is validator_jsonschema.COMPILED_SCHEMAS['{"properties": {"id": {"type": "integer"}}}'])
+        self.assertEqual(None, validator.compiled_schema)
+
 
     def test_parse_validator_jsonpath_mini_extracttest(self):
         """ Test parsing for jsonpath_mini extract test """
@@ -577,5 +718,80 @@ class ValidatorsTest(unittest.TestCase):
         self.assertEqual(validation_result.message,
                          "Extract and test validator failed on test: exists(None)")
 
+    def stream_chunks(self, validator, body, chunk_size, context=None):
+        """ Feed a body to a streaming validator in chunks, returning the result """
+        stream = validator.start(context=context)
+        for i in range(0, len(body), chunk_size):
+            stream.write(body[i:i + chunk_size])
+        return stream.finish(context=context)
+
+    def test_validator_body_size(self):
+        """ Test streaming body size validation """
+        validator = validators.parse_validator('body_size', {'min': 2, 'max': 4})
+        self.assertTrue(validator.is_streaming)
+        self.assertTrue(validator.validate(body=b'abc'))
+        self.assertTrue(self.stream_chunks(validator, b'abcd', 1))
+        result = validator.validate(body=u'abcde')
+        self.assertFalse(result)
+        self.assertEqual('Body size of 5 bytes is above maximum of 4 bytes', result.message)
+        self.assertFalse(validator.validate(body=b'a'))
+
+        validator = validators.parse_validator('body_size', {'expected': 3})
+        self.assertTrue(validator.validate(body=b'abc'))
+        self.assertFalse(validator.validate(body=b''))
+        self.assertRaises(ValueError, validators.parse_validator, 'body_size', {})
+
+    def test_validator_digest(self):
+        """ Test streaming digest validation, with templating """
+        body = b'The quick brown fox jumps over the lazy dog'
+        validator = validators.parse_validator('digest', {
+            'algorithm': 'md5', 'expected': '9E107D9D372BB6826BD81D3542A419D6'})
+        self.assertTrue(validator.validate(body=body))
+        self.assertTrue(self.stream_chunks(validator, body, 5))
+        self.assertFalse(validator.validate(body=body + b'.'))
+
+        validator = validators.parse_validator('digest', {'expected': {'template': '$sum'}})
+        self.assertEqual(set(['sum']), validator.get_template_variables())
+        context = Context()
+        context.bind_variable('sum', 'd7a8fbb307d7809469ca9abcb0082e4f8d5651e46d3cdb762d02d0bf37c9e592')
+        self.assertTrue(self.stream_chunks(validator, body, 7, context=context))
+        self.assertRaises(ValueError, validators.parse_validator, 'digest', {'algorithm': 'nope', 'expected': 'a'})
+        self.assertRaises(ValueError, validators.parse_validator, 'digest', {'algorithm': 'md5'})
+
+    def test_validator_body_contains(self):
+        """ Test streaming substring and regex search, including matches split between chunks """
+        body = b'x' * 50 + u'"name": "välue"'.encode('utf-8') + b'y' * 50
+        validator = validators.parse_validator('body_contains', {'substring': u'"name": "välue"'})
+        regex_validator = validators.parse_validator('body_contains', {'regex': '"name": "v.+ue"', 'window': 32})
+        for chunk_size in (1, 3, 7, 16, 200):
+            self.assertTrue(self.stream_chunks(validator, body, chunk_size))
+            self.assertTrue(self.stream_chunks(regex_validator, body, chunk_size))
+        self.assertTrue(validator.validate(body=u'{"name": "välue"}'))
+        result = validator.validate(body=b'"name": "value"')
+        self.assertFalse(result)
+        self.assertEqual(u'Body does not contain substring: "name": "välue"', result.message)
+        self.assertFalse(regex_validator.validate(body=b'"name": "vue"'))
+        self.assertRaises(ValueError, validators.parse_validator, 'body_contains', {})
+
+    def test_validator_json_syntax(self):
+        """ Test incremental JSON syntax checking, with tokens split between chunks """
+        validator = validators.parse_validator('json_syntax', {})
+        valid = [b'{}', b'[]', b'0', b'"text"', b' [[], {}] ',
+                 b'{"a": [1, -2.5e3, true, false, null, "\\u00e9\\n\\""], "b": {"c": {}}}']
+        invalid = [b'', b'{', b'"abc', b'{"a" 1}', b'[1,]', b'{"a": 1,}', b'01', b'[1 2]', b'{} {}',
+                   b'tru', b'{"a": 1]', b'[-]', b'"\\x"', b'"a\nb"', b'{1: 2}', b'[1.]']
+        for body in valid:
+            for chunk_size in range(1, len(body) + 1):
+                self.assertTrue(self.stream_chunks(validator, body, chunk_size), body)
+        for body in invalid:
+            for chunk_size in range(1, len(body) + 1):
+                self.assertFalse(self.stream_chunks(validator, body, chunk_size), body)
+            self.assertFalse(validator.validate(body=body))
+
+        result = validator.validate(body=b'{"a": 1]')
+        self.assertEqual("Invalid JSON body: Unexpected ']' at byte 7", result.message)
+        result = validator.validate(body=b'[1, 2')
+        self.assertEqual("Invalid JSON body: Incomplete JSON at end of body", result.message)
+
 if __name__ == '__main__':
     unittest.main()
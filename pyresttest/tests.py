@@ -1,4 +1,3 @@
-import string
 import os
 import copy
 import json
@@ -56,6 +55,16 @@ HTTP_METHODS = {u'GET': pycurl.HTTPGET,
                 u'POST': pycurl.POST,
                 u'DELETE': 'DELETE'}
 
+# Map HTTP version names to names of curl HTTP versions
+ALL_HTTP_VERSIONS = {u'1.0': 'CURL_HTTP_VERSION_1_0',
+                     u'1.1': 'CURL_HTTP_VERSION_1_1',
+                     u'2': 'CURL_HTTP_VERSION_2_0',  # Negotiated, falls back to HTTP/1.1
+                     u'2-prior-knowledge': 'CURL_HTTP_VERSION_2_PRIOR_KNOWLEDGE'}  # Needs pycurl 7.43.0.1+
+# Map HTTP version names to curl HTTP versions, for versions this pycurl supports
+HTTP_VERSIONS = dict((name, getattr(pycurl, option)) for name, option in ALL_HTTP_VERSIONS.items()
+                     if hasattr(pycurl, option))
+HTTP2_VERSIONS = set([u'2', u'2-prior-knowledge'])  # Versions that can multiplex calls on one connection
+
 # Parsing helper functions
 def coerce_to_string(val):
     if isinstance(val, text_type):
@@ -106,9 +115,12 @@ class Test(object):
     auth_password = None
     auth_type = pycurl.HTTPAUTH_BASIC
     delay = 0
+    keep_alive = None  # Reuse connections between calls, if None the test set setting is used
+    stream_body = False  # Feed the body to streaming validators as it downloads, instead of storing it
     curl_options = None
 
     templates = None  # Dictionary of template to compiled template
+    _realized = None  # (context, context mod_count, realized test) from the last realize() call
 
     # Bind variables, generators, and contexts
     variable_binds = None
@@ -133,12 +145,14 @@ class Test(object):
         """ Add a templating instance for variable given """
         if self.templates is None:
             self.templates = dict()
-        self.templates[variable_name] = string.Template(template_string)
+        self.templates[variable_name] = CompiledTemplate(template_string)
+        self._realized = None
 
     def del_template(self, variable_name):
         """ Remove template instance, so we no longer use one for this test """
         if self.templates is not None and variable_name in self.templates:
             del self.templates[variable_name]
+        self._realized = None
 
     def realize_template(self, variable_name, context):
         """ Realize a templated value, using variables from context
@@ -146,12 +160,13 @@ class Test(object):
         val = None
         if context is None or self.templates is None or variable_name not in self.templates:
             return None
-        return self.templates[variable_name].safe_substitute(context.get_values())
+        return self.templates[variable_name].render(context.get_values())
 
     # These are variables that can be templated
     def set_body(self, value):
         """ Set body, directly """
         self._body = value
+        self._realized = None
 
     def get_body(self, context=None):
         """ Read body from file, applying template if pertinent """
@@ -189,7 +204,12 @@ class Test(object):
     def set_headers(self, value, isTemplate=False):
         """ Set headers, passing flag if using a template """
         if isTemplate:
-            self.set_template(self.NAME_HEADERS, 'Dict_Templated')
+            # Keys and values are templated, each compiled once here
+            if self.templates is None:
+                self.templates = dict()
+            self._realized = None
+            self.templates[self.NAME_HEADERS] = tuple(
+                (CompiledTemplate(str(key)), CompiledTemplate(str(val))) for key, val in value.items())
         else:
             self.del_template(self.NAME_HEADERS)
         self._headers = value
@@ -201,10 +221,7 @@ class Test(object):
 
         # We need to apply templating to both keys and values
         vals = context.get_values()
-
-        def template_tuple(tuple_input):
-            return (string.Template(str(tuple_item)).safe_substitute(vals) for tuple_item in tuple_input)
-        return dict(map(template_tuple, self._headers.items()))
+        return dict((key.render(vals), val.render(vals)) for key, val in self.templates[self.NAME_HEADERS])
 
     headers = property(get_headers, set_headers, None,
                        'Headers dictionary for request')
@@ -230,6 +247,48 @@ class Test(object):
             (disallows caching of templated test bodies) """
         return self.variable_binds or self.generator_binds or self.extract_binds
 
+    def get_variables_read(self):
+        """ Return the set of context variable names this test reads, in templating,
+            validators, and extractors. Returns None if it may read any variable """
+        names = set()
+        if self.templates and self.NAME_URL in self.templates:
+            names.update(parsing.get_template_variables(self._url))
+        if self.templates and self.NAME_HEADERS in self.templates:
+            for key, value in self._headers.items():
+                names.update(parsing.get_template_variables(key))
+                names.update(parsing.get_template_variables(value))
+        if isinstance(self._body, ContentHandler):
+            body_names = self._body.get_template_variables()
+            if body_names is None:
+                return None
+            names.update(body_names)
+
+        checks = list()
+        if self.validators:
+            checks.extend(self.validators)
+        if self.extract_binds:
+            checks.extend(self.extract_binds.values())
+        for check in checks:
+            check_names = check.get_template_variables()
+            if check_names is None:
+                return None
+            names.update(check_names)
+        return names
+
+    def get_variables_written(self):
+        """ Return the set of context variable names this test binds
+            Generators used are included as 'generator:name' since each use advances them """
+        names = set()
+        if self.variable_binds:
+            names.update(str(key) for key in self.variable_binds.keys())
+        if self.generator_binds:
+            for key, value in self.generator_binds.items():
+                names.add(str(key))
+                names.add('generator:' + str(value))
+        if self.extract_binds:
+            names.update(str(key) for key in self.extract_binds.keys())
+        return names
+
     def is_dynamic(self):
         """ Returns true if this test does templating """
         if self.templates:
@@ -241,17 +300,26 @@ class Test(object):
     def realize(self, context=None):
         """ Return a fully-templated test object, for configuring curl
             Warning: this is a SHALLOW copy, mutation of fields will cause problems!
-            Can accept a None context """
+            Can accept a None context
+
+            Optimization: if the context hasn't been modified since the last call (by its mod_count),
+            the test realized then is returned again without copying or templating.
+            So templated body files are only re-read when the context changes. """
         if not self.is_dynamic() or context is None:
             return self
-        else:
-            selfcopy = self.ninja_copy()
-            selfcopy.templates = None
-            if isinstance(self._body, ContentHandler):
-                selfcopy._body = self._body.get_content(context)
-            selfcopy._url = self.get_url(context=context)
-            selfcopy._headers = self.get_headers(context=context)
-            return selfcopy
+        realized = self._realized
+        if realized is not None and realized[0] is context and realized[1] == context.mod_count:
+            return realized[2]
+
+        selfcopy = self.ninja_copy()
+        selfcopy.templates = None
+        selfcopy._realized = None
+        if isinstance(self._body, ContentHandler):
+            selfcopy._body = self._body.get_content(context)
+        selfcopy._url = self.get_url(context=context)
+        selfcopy._headers = self.get_headers(context=context)
+        self._realized = (context, context.mod_count, selfcopy)
+        return selfcopy
 
     def realize_partial(self, context=None):
         """ Attempt to template out what is static if possible, and load files.
@@ -286,27 +354,48 @@ class Test(object):
     def __str__(self):
         return json.dumps(self, default=safe_to_json)
 
-    def configure_curl(self, timeout=DEFAULT_TIMEOUT, context=None, curl_handle=None):
-        """ Create and mostly configure a curl object for test, reusing existing if possible """
-
+    def configure_curl(self, timeout=DEFAULT_TIMEOUT, context=None, curl_handle=None, keep_alive=False, curl_share=None,
+                       http_version=None):
+        """ Create and mostly configure a curl object for test, reusing existing if possible
+            Unless keep_alive is set (by argument, or overridden for the test), connections are closed after each call
+            If curl_share is given, the handle uses its shared caches (a pycurl.CurlShare)
+            If http_version is given (a key in HTTP_VERSIONS) that HTTP version is used
+
+            Optimization: a reused handle remembers the options it was configured with.
+            If they are unchanged, only the body is set again, and the URL and headers
+            only if the test is templated, or they differ from the last ones configured on the handle.
+            Other options set on a reused handle stay set, so callers should set them every call.
+        """
+        if self.keep_alive is not None:
+            keep_alive = self.keep_alive
+        # Whether there's a body decides if POSTFIELDS is set, which a reused handle can't unset
+        # Curl options are copied, so changes to them are seen
+        static_options = (self.method, self._body is None, self.auth_username, self.auth_password,
+                          self.auth_type, self.curl_options and dict(self.curl_options),
+                          timeout, keep_alive, curl_share, http_version)
+
+        curl = None
         if curl_handle:
-            curl = curl_handle
-
             try:  # Check the curl handle isn't closed, and reuse it if possible
-                curl.getinfo(curl.HTTP_CODE)                
+                curl_handle.getinfo(curl_handle.HTTP_CODE)
+                curl = curl_handle
+            except pycurl.error:
+                pass
+
+        if curl is None:
+            curl = pycurl.Curl()
+            self._configure_curl_static(curl, timeout, curl_share, http_version)
+            curl.pyresttest_options = static_options
+            curl.pyresttest_request = None
+        else:
+            if getattr(curl, 'pyresttest_options', None) != static_options:
                 # Below clears the cookies & curl options for clean run
                 # But retains the DNS cache and connection pool
                 curl.reset()
-                curl.setopt(curl.COOKIELIST, "ALL")
-            except pycurl.error:
-                curl = pycurl.Curl()
-            
-        else:
-            curl = pycurl.Curl()
-
-        # curl.setopt(pycurl.VERBOSE, 1)  # Debugging convenience
-        curl.setopt(curl.URL, str(self.url))
-        curl.setopt(curl.TIMEOUT, timeout)
+                self._configure_curl_static(curl, timeout, curl_share, http_version)
+                curl.pyresttest_options = static_options
+                curl.pyresttest_request = None
+            curl.setopt(curl.COOKIELIST, "ALL")
 
         is_unicoded = False
         bod = self.body
@@ -318,50 +407,37 @@ class Test(object):
         if bod and len(bod) > 0:
             curl.setopt(curl.READFUNCTION, MyIO(bod).read)
 
-        if self.auth_username and self.auth_password:
-            curl.setopt(pycurl.USERPWD, 
-                parsing.encode_unicode_bytes(self.auth_username) + b':' + 
-                parsing.encode_unicode_bytes(self.auth_password))
-            if self.auth_type:
-                curl.setopt(pycurl.HTTPAUTH, self.auth_type)
-
         if self.method == u'POST':
-            curl.setopt(HTTP_METHODS[u'POST'], 1)
             # Required for some servers
             if bod is not None:
                 curl.setopt(pycurl.POSTFIELDSIZE, len(bod))
             else:
                 curl.setopt(pycurl.POSTFIELDSIZE, 0)
-        elif self.method == u'PUT':
-            curl.setopt(HTTP_METHODS[u'PUT'], 1)
-            # Required for some servers
-            if bod is not None:
-                curl.setopt(pycurl.INFILESIZE, len(bod))
-            else:
-                curl.setopt(pycurl.INFILESIZE, 0)
-        elif self.method == u'PATCH':
-            curl.setopt(curl.POSTFIELDS, bod)
-            curl.setopt(curl.CUSTOMREQUEST, 'PATCH')
+        elif self.method == u'PUT' or self.method == u'PATCH':
+            if self.method == u'PATCH':
+                curl.setopt(curl.POSTFIELDS, bod)
             # Required for some servers
             # I wonder: how compatible will this be?  It worked with Django but feels iffy.
             if bod is not None:
                 curl.setopt(pycurl.INFILESIZE, len(bod))
             else:
                 curl.setopt(pycurl.INFILESIZE, 0)
-        elif self.method == u'DELETE':
-            curl.setopt(curl.CUSTOMREQUEST, 'DELETE')
-            if bod is not None:
-                curl.setopt(pycurl.POSTFIELDS, bod)
-                curl.setopt(pycurl.POSTFIELDSIZE, len(bod))
-        elif self.method == u'HEAD':
-            curl.setopt(curl.NOBODY, 1)
-            curl.setopt(curl.CUSTOMREQUEST, 'HEAD')
-        elif self.method and self.method.upper() != 'GET':  # Alternate HTTP methods
-            curl.setopt(curl.CUSTOMREQUEST, self.method.upper())
+        elif self.method == u'DELETE' or (self.method and self.method.upper() not in (u'GET', u'HEAD')):
             if bod is not None:
                 curl.setopt(pycurl.POSTFIELDS, bod)
                 curl.setopt(pycurl.POSTFIELDSIZE, len(bod))
 
+        # URL and headers only change if this is a different or templated test, or they were changed
+        # Headers are copied, so changes to them are seen
+        request = curl.pyresttest_request
+        if (request is not None and request[0] is self and not self.is_dynamic() and request[1] == self._url
+                and request[2] == self._headers and request[3] == is_unicoded):
+            return curl
+        curl.pyresttest_request = (self, self._url, copy.copy(self._headers), is_unicoded)
+
+        # curl.setopt(pycurl.VERBOSE, 1)  # Debugging convenience
+        curl.setopt(curl.URL, str(self.url))
+
         # Template headers as needed and convert headers dictionary to list of header entries
         head = self.get_headers(context=context)
         head = copy.copy(head)  # We're going to mutate it, need to copy
@@ -381,7 +457,9 @@ class Test(object):
         # Fix for expecting 100-continue from server, which not all servers
         # will send!
         headers.append("Expect:")
-        headers.append("Connection: close")
+        # Connection headers aren't allowed in HTTP/2, and connections are multiplexed
+        if not keep_alive and http_version not in HTTP2_VERSIONS:
+            headers.append("Connection: close")
         curl.setopt(curl.HTTPHEADER, headers)
 
         # Set custom curl options, which are KEY:VALUE pairs matching the pycurl option names
@@ -393,6 +471,41 @@ class Test(object):
                 curl.setopt(getattr(curl, key), value)
         return curl
 
+    def _configure_curl_static(self, curl, timeout, curl_share, http_version):
+        """ Set the curl options that don't depend on templated values, on a clean curl handle """
+        if curl_share is not None:
+            # Handles keep their share through a reset, and may only have one at a time
+            curl.unsetopt(pycurl.SHARE)
+            curl.setopt(pycurl.SHARE, curl_share)
+
+        curl.setopt(curl.TIMEOUT, timeout)
+        if http_version is not None:
+            curl.setopt(pycurl.HTTP_VERSION, HTTP_VERSIONS[http_version])
+            if http_version in HTTP2_VERSIONS:
+                # Wait to multiplex on an existing connection, rather than opening another
+                curl.setopt(pycurl.PIPEWAIT, 1)
+
+        if self.auth_username and self.auth_password:
+            curl.setopt(pycurl.USERPWD,
+                parsing.encode_unicode_bytes(self.auth_username) + b':' +
+                parsing.encode_unicode_bytes(self.auth_password))
+            if self.auth_type:
+                curl.setopt(pycurl.HTTPAUTH, self.auth_type)
+
+        if self.method == u'POST':
+            curl.setopt(HTTP_METHODS[u'POST'], 1)
+        elif self.method == u'PUT':
+            curl.setopt(HTTP_METHODS[u'PUT'], 1)
+        elif self.method == u'PATCH':
+            curl.setopt(curl.CUSTOMREQUEST, 'PATCH')
+        elif self.method == u'DELETE':
+            curl.setopt(curl.CUSTOMREQUEST, 'DELETE')
+        elif self.method == u'HEAD':
+            curl.setopt(curl.NOBODY, 1)
+            curl.setopt(curl.CUSTOMREQUEST, 'HEAD')
+        elif self.method and self.method.upper() != 'GET':  # Alternate HTTP methods
+            curl.setopt(curl.CUSTOMREQUEST, self.method.upper())
+
     @classmethod
     def parse_test(cls, base_url, node, input_test=None, test_path=None):
         """ Create or modify a test, input_test, using configuration in node, and base_url
@@ -428,6 +541,8 @@ class Test(object):
             u'expected_status': [coerce_list_of_ints],
             u'delay': [lambda x: int(x)],
             u'stop_on_failure': [safe_to_bool],
+            u'keep_alive': [safe_to_bool],
+            u'stream_body': [safe_to_bool],
 
             # Templated / special handling
             #u'url': [coerce_templatable, set_templated),  # TODO: special handling for templated content, sigh
@@ -548,6 +663,18 @@ class Test(object):
                     raise ValueError(
                         "Illegal curl option: {0}".format(curlopt))
 
+        if mytest.stream_body:
+            # Body isn't stored, so everything using it must be able to read it as it streams
+            for validator in mytest.validators or list():
+                if not getattr(validator, 'is_streaming', False):
+                    raise ValueError(
+                        "Tests with stream_body may only use streaming validators, not {0}".format(validator.name))
+            for extractor in (mytest.extract_binds or dict()).values():
+                if extractor.is_body_extractor:
+                    raise ValueError(
+                        "Tests with stream_body can't extract from the body, with extractor {0}".format(
+                            extractor.extractor_type))
+
         # For non-GET requests, accept additional response codes indicating success
         # (but only if not expected statuses are not explicitly specified)
         # this is per HTTP spec:
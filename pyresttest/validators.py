@@ -1,14 +1,14 @@
 import logging
-import json
+import hashlib
 import operator
 import traceback
-import string
 import os
 import re
 import sys
 
 # Local module imports
 from . import parsing
+from .responsehandling import get_body_json, SpilledBody
 
 # Python 3 compatibility shims
 from . import six
@@ -110,6 +110,10 @@ VALIDATOR_TESTS = {
 EXTRACTORS = dict()
 VALIDATORS = dict()
 
+# Compiled jsonpath_mini paths for templated queries, by templated query string
+COMPILED_MINI_JSON_QUERIES = dict()
+MAX_COMPILED_MINI_JSON_QUERIES = 1000
+
 
 def safe_length(var):
     """ Exception-safe length check, returns -1 if no length on type or error """
@@ -170,6 +174,7 @@ class AbstractExtractor(object):
     is_body_extractor = False  # Uses response body
     is_header_extractor = False  # Uses response headers
     args = None
+    query_template = None  # CompiledTemplate for a templated query
 
     def __str__(self):
         return "Extractor type: {0}, query: {1}, is_templated: {2}, args: {3}".format(self.extractor_type, self.query, self.is_templated, self.args)
@@ -187,10 +192,16 @@ class AbstractExtractor(object):
     def templated_query(self, context=None):
         query = self.query
         if context and self.is_templated:
-            query = string.Template(query).safe_substitute(
-                context.get_values())
+            self.query_template = parsing.compile_template(query, self.query_template)
+            query = self.query_template.render(context.get_values())
         return query
 
+    def get_template_variables(self):
+        """ Return the set of context variable names used in templating the query """
+        if self.is_templated:
+            return parsing.get_template_variables(self.query)
+        return set()
+
     def get_readable_config(self, context=None):
         """ Print a human-readable version of the configuration """
         query = self.templated_query(context=context)
@@ -227,43 +238,80 @@ class AbstractExtractor(object):
 class MiniJsonExtractor(AbstractExtractor):
     """ Extractor that uses jsonpath_mini syntax
         IE key.key or array_index.key extraction
+
+        Queries are compiled to a tuple of keys and array indexes once, at parse time,
+        or for templated queries, once per distinct templated query string
     """
     extractor_type = 'jsonpath_mini'
     is_body_extractor = True
+    compiled_query = None  # Compiled path for a query that isn't templated
 
     def extract_internal(self, query=None, args=None, body=None, headers=None):
-        if PYTHON_MAJOR_VERSION > 2 and isinstance(body, binary_type):
-            body = text_type(body, 'utf-8')  # Default JSON encoding
+        if self.compiled_query is not None and query == self.query:
+            path = self.compiled_query
+        else:
+            path = self.get_compiled_query(query)
 
         try:
-            body = json.loads(body)
-            return self.query_dictionary(query, body)
+            body = get_body_json(body)  # Parsed once per response
+            return self.query_path(path, body)
         except ValueError:
             raise ValueError("Not legal JSON!")
 
     @staticmethod
-    def query_dictionary(query, dictionary, delimiter='.'):
-        """ Do an xpath-like query with dictionary, using a template if relevant """
-        # Based on
-        # http://stackoverflow.com/questions/7320319/xpath-like-query-for-nested-python-dictionaries
-
+    def compile_query(query, delimiter='.'):
+        """ Compile a query to a path: a tuple of keys, and integer array indexes
+            Returns None for an invalid query, which extracts nothing """
         try:
             stripped_query = query.strip(delimiter)
-            if stripped_query:
-                for x in stripped_query.split(delimiter):
-                    try:
-                        x = int(x)
-                        dictionary = dictionary[x]
-                    except ValueError:
-                        dictionary = dictionary[x]
+        except AttributeError:
+            return None
+        if not stripped_query:
+            return tuple()
+        path = list()
+        for x in stripped_query.split(delimiter):
+            try:
+                path.append(int(x))
+            except ValueError:
+                path.append(x)
+        return tuple(path)
+
+    @staticmethod
+    def get_compiled_query(query):
+        """ Compile a query, with caching, for templated queries """
+        path = COMPILED_MINI_JSON_QUERIES.get(query, False)
+        if path is False:
+            path = MiniJsonExtractor.compile_query(query)
+            if len(COMPILED_MINI_JSON_QUERIES) >= MAX_COMPILED_MINI_JSON_QUERIES:
+                COMPILED_MINI_JSON_QUERIES.clear()  # Templating is generating lots of distinct queries
+            COMPILED_MINI_JSON_QUERIES[query] = path
+        return path
+
+    @staticmethod
+    def query_path(path, dictionary):
+        """ Look up a compiled query path in dictionary, returning None if not found """
+        if path is None:
+            return None
+        try:
+            for x in path:
+                dictionary = dictionary[x]
         except:
             return None
         return dictionary
 
+    @staticmethod
+    def query_dictionary(query, dictionary, delimiter='.'):
+        """ Do an xpath-like query with dictionary, using a template if relevant """
+        # Based on
+        # http://stackoverflow.com/questions/7320319/xpath-like-query-for-nested-python-dictionaries
+        return MiniJsonExtractor.query_path(MiniJsonExtractor.compile_query(query, delimiter), dictionary)
+
     @classmethod
     def parse(cls, config):
         base = MiniJsonExtractor()
-        return cls.configure_base(config, base)
+        base = cls.configure_base(config, base)
+        if not base.is_templated:
+            base.compiled_query = cls.compile_query(base.query)
         return base
 
 
@@ -275,7 +323,10 @@ class HeaderExtractor(AbstractExtractor):
     def extract_internal(self, query=None, args=None, body=None, headers=None):
         low = query.lower()
         # Value for all matching key names
-        extracted = [y[1] for y in filter(lambda x: x[0] == low, headers)]
+        if hasattr(headers, 'get_all'):  # ResponseHeaders, look up directly
+            extracted = headers.get_all(low)
+        else:
+            extracted = [y[1] for y in filter(lambda x: x[0] == low, headers)]
         if len(extracted) == 0:
             raise ValueError("Invalid header name {0}".format(query))
         elif len(extracted) == 1:
@@ -327,6 +378,11 @@ class AbstractValidator(object):
         """ Run the validation function, return true or a Failure """
         pass
 
+    def get_template_variables(self):
+        """ Return the set of context variable names this validator reads,
+            or None if unknown (any variable may be read) """
+        return None
+
 
 class ComparatorValidator(AbstractValidator):
     """ Does extract and compare from request body   """
@@ -338,6 +394,7 @@ class ComparatorValidator(AbstractValidator):
     comparator_name = ""
     expected = None
     isTemplateExpected = False
+    expected_template = None  # CompiledTemplate for a templated expected value
 
     def get_readable_config(self, context=None):
         """ Get a human-readable config string """
@@ -352,6 +409,14 @@ class ComparatorValidator(AbstractValidator):
                 'Expected is templated, raw value: {0}'.format(self.expected))
         return os.linesep.join(string_frags)
 
+    def get_template_variables(self):
+        names = self.extractor.get_template_variables()
+        if isinstance(self.expected, AbstractExtractor):
+            names = names | self.expected.get_template_variables()
+        elif self.isTemplateExpected:
+            names = names | parsing.get_template_variables(self.expected)
+        return names
+
     def validate(self, body=None, headers=None, context=None):
         try:
             extracted_val = self.extractor.extract(
@@ -370,13 +435,13 @@ class ComparatorValidator(AbstractValidator):
                 trace = traceback.format_exc()
                 return Failure(message="Expected value extractor threw exception", details=trace, validator=self, failure_type=FAILURE_EXTRACTOR_EXCEPTION)
         elif self.isTemplateExpected and context:
-            expected_val = string.Template(
-                self.expected).safe_substitute(context.get_values())
+            self.expected_template = parsing.compile_template(self.expected, self.expected_template)
+            expected_val = self.expected_template.render(context.get_values())
         else:
             expected_val = self.expected
 
         # Handle a bytes-based body and a unicode expected value seamlessly
-        if isinstance(extracted_val, binary_type) and isinstance(expected_val, text_type):
+        if isinstance(extracted_val, (binary_type, bytearray, SpilledBody)) and isinstance(expected_val, text_type):
             expected_val = expected_val.encode('utf-8')
         comparison = self.comparator(extracted_val, expected_val)
 
@@ -461,6 +526,9 @@ class ExtractTestValidator(AbstractValidator):
         """ Get a human-readable config string """
         return "Extractor: " + self.extractor.get_readable_config(context=context)
 
+    def get_template_variables(self):
+        return self.extractor.get_template_variables()
+
     @staticmethod
     def parse(config):
         output = ExtractTestValidator()
@@ -495,6 +563,386 @@ class ExtractTestValidator(AbstractValidator):
             return failure
 
 
+class AbstractStreamingValidator(AbstractValidator):
+    """ Validator that checks the response body a chunk at a time, as it downloads
+
+        For each response, start() creates a stream with write(chunk) to feed it body chunks,
+        and finish(headers, context) to return true or a Failure once the body is complete.
+        Streams hold the state for one response, so the validator itself can be shared.
+
+        Tests with stream_body set feed streaming validators from curl as the body arrives,
+        and never hold the whole body in memory. Otherwise they validate the buffered body.
+    """
+    is_streaming = True
+
+    def start(self, context=None):
+        """ Create a stream to validate one response body """
+        pass
+
+    def validate(self, body=None, headers=None, context=None):
+        stream = self.start(context=context)
+        if isinstance(body, text_type):
+            body = body.encode('utf-8')
+        if body:
+            stream.write(body)
+        return stream.finish(headers=headers, context=context)
+
+    def get_template_variables(self):
+        return set()
+
+
+class BodySizeStream(object):
+    """ Counts the bytes of a response body """
+
+    def __init__(self, validator):
+        self.validator = validator
+        self.size = 0
+
+    def write(self, chunk):
+        self.size = self.size + len(chunk)
+
+    def finish(self, headers=None, context=None):
+        validator = self.validator
+        if validator.expected is not None and self.size != validator.expected:
+            message = "Body size of {0} bytes does not match expected {1} bytes".format(
+                self.size, validator.expected)
+        elif validator.min_size is not None and self.size < validator.min_size:
+            message = "Body size of {0} bytes is below minimum of {1} bytes".format(
+                self.size, validator.min_size)
+        elif validator.max_size is not None and self.size > validator.max_size:
+            message = "Body size of {0} bytes is above maximum of {1} bytes".format(
+                self.size, validator.max_size)
+        else:
+            return True
+        return Failure(message=message, details=validator.get_readable_config(context=context),
+                       validator=validator, failure_type=FAILURE_VALIDATOR_FAILED)
+
+
+class BodySizeValidator(AbstractStreamingValidator):
+    """ Checks the size of the response body in bytes
+        Syntax sample: { body_size: {min: 1, max: 1048576} } or { body_size: {expected: 1024} }
+    """
+    name = 'BodySizeValidator'
+    expected = None
+    min_size = None
+    max_size = None
+
+    def get_readable_config(self, context=None):
+        return "Body size: expected={0}, min={1}, max={2}".format(self.expected, self.min_size, self.max_size)
+
+    def start(self, context=None):
+        return BodySizeStream(self)
+
+    @staticmethod
+    def parse(config):
+        output = BodySizeValidator()
+        config = parsing.lowercase_keys(parsing.flatten_dictionaries(config))
+        output.config = config
+        if 'expected' in config:
+            output.expected = int(config['expected'])
+        if 'min' in config:
+            output.min_size = int(config['min'])
+        if 'max' in config:
+            output.max_size = int(config['max'])
+        if output.expected is None and output.min_size is None and output.max_size is None:
+            raise ValueError("Body size validator must have an expected, min, or max size")
+        return output
+
+
+class DigestStream(object):
+    """ Computes a digest of a response body """
+
+    def __init__(self, validator, expected):
+        self.validator = validator
+        self.expected = expected
+        self.digest = hashlib.new(validator.algorithm)
+
+    def write(self, chunk):
+        self.digest.update(chunk)
+
+    def finish(self, headers=None, context=None):
+        actual = self.digest.hexdigest()
+        if actual == self.expected.strip().lower():
+            return True
+        return Failure(message="Body {0} digest {1} does not match expected {2}".format(
+                           self.validator.algorithm, actual, self.expected),
+                       details=self.validator.get_readable_config(context=context),
+                       validator=self.validator, failure_type=FAILURE_VALIDATOR_FAILED)
+
+
+class DigestValidator(AbstractStreamingValidator):
+    """ Checks a hex digest of the response body, using any hashlib algorithm (default sha256)
+        Syntax sample: { digest: {algorithm: 'md5', expected: '9e107d9d372bb6826bd81d3542a419d6'} }
+        The expected value may be a template: { digest: {expected: {template: '$checksum'}} }
+    """
+    name = 'DigestValidator'
+    algorithm = 'sha256'
+    expected = None
+    is_template_expected = False
+    expected_template = None  # CompiledTemplate for a templated expected value
+
+    def get_readable_config(self, context=None):
+        return "Digest: algorithm={0}, expected={1}".format(self.algorithm, self.get_expected(context))
+
+    def get_expected(self, context=None):
+        if self.is_template_expected and context:
+            self.expected_template = parsing.compile_template(self.expected, self.expected_template)
+            return self.expected_template.render(context.get_values())
+        return self.expected
+
+    def get_template_variables(self):
+        if self.is_template_expected:
+            return parsing.get_template_variables(self.expected)
+        return set()
+
+    def start(self, context=None):
+        return DigestStream(self, self.get_expected(context))
+
+    @staticmethod
+    def parse(config):
+        output = DigestValidator()
+        config = parsing.lowercase_keys(parsing.flatten_dictionaries(config))
+        output.config = config
+        if 'algorithm' in config:
+            output.algorithm = str(config['algorithm']).lower()
+        hashlib.new(output.algorithm)  # Raises a ValueError if unsupported
+
+        expected = config.get('expected')
+        if isinstance(expected, dict):
+            expected = parsing.lowercase_keys(expected).get('template')
+            output.is_template_expected = True
+        if not isinstance(expected, basestring):
+            raise ValueError("Digest validator must have an expected digest, as a string or template")
+        output.expected = expected
+        return output
+
+
+class BodyContainsStream(object):
+    """ Searches a response body for a substring or regex, keeping only the end of the last chunk """
+
+    def __init__(self, validator):
+        self.validator = validator
+        self.found = False
+        self.tail = b''
+
+    def write(self, chunk):
+        if self.found:
+            return
+        data = self.tail + chunk if self.tail else chunk
+        if self.validator.regex is not None:
+            self.found = self.validator.regex.search(data) is not None
+        else:
+            self.found = self.validator.substring in data
+        # Keep enough to find matches spanning this chunk and the next one
+        keep = self.validator.get_overlap()
+        self.tail = bytes(data[-keep:]) if keep and not self.found else b''
+
+    def finish(self, headers=None, context=None):
+        if self.found:
+            return True
+        return Failure(message="Body does not contain {0}".format(self.validator.get_readable_config()),
+                       details=self.validator.get_readable_config(context=context),
+                       validator=self.validator, failure_type=FAILURE_VALIDATOR_FAILED)
+
+
+class BodyContainsValidator(AbstractStreamingValidator):
+    """ Checks the response body contains a substring, or a match for a regex
+        Syntax sample: { body_contains: {substring: '"status": "complete"'} }
+        or { body_contains: {regex: '"count": [0-9]+', window: 1024} }
+
+        Regex matches are found across chunk boundaries if they are no longer than window bytes
+        (default 4096), since only that much of the previous chunk is kept.
+    """
+    name = 'BodyContainsValidator'
+    substring = None
+    regex = None
+    window = 4096
+
+    def get_overlap(self):
+        """ Bytes of the previous chunk to search along with the next one """
+        if self.regex is not None:
+            return self.window
+        return len(self.substring) - 1
+
+    def get_readable_config(self, context=None):
+        if self.regex is not None:
+            return "regex: {0}".format(self.regex.pattern.decode('utf-8'))
+        return "substring: {0}".format(self.substring.decode('utf-8'))
+
+    def start(self, context=None):
+        return BodyContainsStream(self)
+
+    @staticmethod
+    def parse(config):
+        output = BodyContainsValidator()
+        config = parsing.lowercase_keys(parsing.flatten_dictionaries(config))
+        output.config = config
+        if 'substring' in config:
+            output.substring = parsing.encode_unicode_bytes(config['substring'])
+            if not output.substring:
+                raise ValueError("Body contains validator substring must not be empty")
+        elif 'regex' in config:
+            output.regex = re.compile(parsing.encode_unicode_bytes(config['regex']))
+            if 'window' in config:
+                output.window = int(config['window'])
+        else:
+            raise ValueError("Body contains validator must have a substring or regex")
+        return output
+
+
+JSON_STRING = br'"[^"\\\x00-\x1f]*(?:\\(?:["\\/bfnrt]|u[0-9a-fA-F]{4})[^"\\\x00-\x1f]*)*"'
+JSON_TOKEN = re.compile(br'[ \t\r\n]*(?:(\{)|(\})|(\[)|(\])|(,)|(:)|(' + JSON_STRING + br')|'
+                        br'(-?(?:0|[1-9][0-9]*)(?:\.[0-9]+)?(?:[eE][+-]?[0-9]+)?|true|false|null)|("))')
+JSON_STRING_CONTENT = re.compile(JSON_STRING[1:-1])
+JSON_PARTIAL_ESCAPE = re.compile(br'\\(?:u[0-9a-fA-F]{0,3})?\Z')
+JSON_PARTIAL_NUMBER = re.compile(br'[0-9.eE+-]*\Z')
+JSON_WHITESPACE = re.compile(br'[ \t\r\n]*')
+JSON_LITERALS = (b'true', b'false', b'null')
+
+# JSON tokens, numbered by their group in JSON_TOKEN
+(JSON_OPEN_OBJECT, JSON_CLOSE_OBJECT, JSON_OPEN_ARRAY, JSON_CLOSE_ARRAY,
+ JSON_COMMA, JSON_COLON, JSON_STRING_TOKEN, JSON_SCALAR, JSON_STRING_START) = range(1, 10)
+# Parser states: what may come next
+(JSON_EXPECT_VALUE, JSON_EXPECT_ARRAY_START, JSON_EXPECT_OBJECT_START, JSON_EXPECT_KEY, JSON_EXPECT_COLON,
+ JSON_AFTER_OBJECT_VALUE, JSON_AFTER_ARRAY_VALUE, JSON_DONE) = range(0, 8)
+
+
+def _build_json_transitions():
+    """ Map state * 16 + token to the next state, or to an action:
+        'value' for a complete value, 'object' or 'array' to open a container, 'close' to close one """
+    transitions = dict()
+    for state in (JSON_EXPECT_VALUE, JSON_EXPECT_ARRAY_START):
+        transitions[state * 16 + JSON_STRING_TOKEN] = 'value'
+        transitions[state * 16 + JSON_SCALAR] = 'value'
+        transitions[state * 16 + JSON_OPEN_OBJECT] = 'object'
+        transitions[state * 16 + JSON_OPEN_ARRAY] = 'array'
+    for state in (JSON_EXPECT_OBJECT_START, JSON_EXPECT_KEY):
+        transitions[state * 16 + JSON_STRING_TOKEN] = JSON_EXPECT_COLON
+    transitions[JSON_EXPECT_COLON * 16 + JSON_COLON] = JSON_EXPECT_VALUE
+    transitions[JSON_AFTER_OBJECT_VALUE * 16 + JSON_COMMA] = JSON_EXPECT_KEY
+    transitions[JSON_AFTER_ARRAY_VALUE * 16 + JSON_COMMA] = JSON_EXPECT_VALUE
+    for state in (JSON_EXPECT_OBJECT_START, JSON_AFTER_OBJECT_VALUE):
+        transitions[state * 16 + JSON_CLOSE_OBJECT] = 'close'
+    for state in (JSON_EXPECT_ARRAY_START, JSON_AFTER_ARRAY_VALUE):
+        transitions[state * 16 + JSON_CLOSE_ARRAY] = 'close'
+    return transitions
+
+JSON_TRANSITIONS = _build_json_transitions()
+
+
+class JsonSyntaxStream(object):
+    """ Incrementally checks a response body is well-formed JSON, without parsing it into objects
+        Tokens split between chunks are held until the next chunk arrives """
+
+    def __init__(self, validator):
+        self.validator = validator
+        self.pending = b''  # Unprocessed end of the last chunk
+        self.offset = 0  # Body offset of the start of pending
+        self.stack = list()  # State to return to after each open object or array
+        self.state = JSON_EXPECT_VALUE
+        self.string_action = None  # Transition to make once a string split between chunks ends
+        self.error = None
+
+    def write(self, chunk):
+        if self.error is None:
+            self._scan(self.pending + chunk if self.pending else chunk, False)
+
+    def finish(self, headers=None, context=None):
+        if self.error is None:
+            self._scan(self.pending, True)
+        if self.error is None and (self.string_action is not None or self.state != JSON_DONE):
+            self.error = "Incomplete JSON at end of body"
+        if self.error is None:
+            return True
+        return Failure(message="Invalid JSON body: " + self.error, details=self.validator.get_readable_config(context),
+                       validator=self.validator, failure_type=FAILURE_VALIDATOR_FAILED)
+
+    def _fail(self, position, message):
+        self.error = "{0} at byte {1}".format(message, self.offset + position)
+
+    def _transition(self, action):
+        if action == 'value':
+            self.state = self.stack[-1] if self.stack else JSON_DONE
+        elif action == 'object':
+            self.stack.append(JSON_AFTER_OBJECT_VALUE)
+            self.state = JSON_EXPECT_OBJECT_START
+        elif action == 'array':
+            self.stack.append(JSON_AFTER_ARRAY_VALUE)
+            self.state = JSON_EXPECT_ARRAY_START
+        elif action == 'close':
+            self.stack.pop()
+            self.state = self.stack[-1] if self.stack else JSON_DONE
+        else:
+            self.state = action
+
+    def _scan(self, data, final):
+        """ Check all complete tokens in data, keeping any incomplete token at the end as pending """
+        position = 0
+        length = len(data)
+        if self.string_action is not None:  # Finish a string started in an earlier chunk
+            position = JSON_STRING_CONTENT.match(data).end()
+            if data[position:position + 1] == b'"':
+                position = position + 1
+                self._transition(self.string_action)
+                self.string_action = None
+            elif not (position == length or JSON_PARTIAL_ESCAPE.match(data, position)):
+                return self._fail(position, "Invalid string content")
+
+        match_token = JSON_TOKEN.match
+        transitions = JSON_TRANSITIONS
+        while self.string_action is None and position < length:
+            match = match_token(data, position)
+            if match is None:
+                start = JSON_WHITESPACE.match(data, position).end()
+                rest = bytes(data[start:start + 5])  # Enough to check for a partial token
+                if not rest or (not final and start + len(rest) == length and
+                                (rest == b'-' or any(x.startswith(rest) for x in JSON_LITERALS))):
+                    position = start  # Whitespace, or token may continue in the next chunk
+                    break
+                return self._fail(start, "Unexpected content")
+
+            token = match.lastindex
+            if token == JSON_SCALAR and not final and JSON_PARTIAL_NUMBER.match(data, match.end()):
+                break  # Number may continue in the next chunk
+            if token == JSON_STRING_START:  # Incomplete or invalid string
+                action = transitions.get(self.state * 16 + JSON_STRING_TOKEN)
+                end = JSON_STRING_CONTENT.match(data, match.end()).end()
+                if action is None or not (end == length or JSON_PARTIAL_ESCAPE.match(data, end)):
+                    return self._fail(match.start(token), "Invalid string")
+                self.string_action = action  # String continues in the next chunk
+                position = end
+                break
+
+            action = transitions.get(self.state * 16 + token)
+            if action is None:
+                return self._fail(match.start(token), "Unexpected '{0}'".format(
+                    match.group(token).decode('utf-8', 'replace')[0:20]))
+            self._transition(action)
+            position = match.end()
+
+        self.offset = self.offset + position
+        self.pending = bytes(data[position:])
+
+
+class JsonSyntaxValidator(AbstractStreamingValidator):
+    """ Checks the response body is well-formed JSON, incrementally as it downloads
+        Syntax sample: { json_syntax: {} }
+    """
+    name = 'JsonSyntaxValidator'
+
+    def get_readable_config(self, context=None):
+        return "JSON syntax"
+
+    def start(self, context=None):
+        return JsonSyntaxStream(self)
+
+    @staticmethod
+    def parse(config):
+        output = JsonSyntaxValidator()
+        output.config = config
+        return output
+
+
 def parse_extractor(extractor_type, config):
     """ Convert extractor type and config to an extractor instance
         Uses registered parse function for that extractor type
@@ -606,3 +1054,7 @@ register_validator('compare', ComparatorValidator.parse)
 register_validator('assertEqual', ComparatorValidator.parse)
 register_validator('extract_test', ExtractTestValidator.parse)
 register_validator('assertTrue', ExtractTestValidator.parse)
+register_validator('body_size', BodySizeValidator.parse)
+register_validator('digest', DigestValidator.parse)
+register_validator('body_contains', BodyContainsValidator.parse)
+register_validator('json_syntax', JsonSyntaxValidator.parse)
@@ -36,8 +36,8 @@ setup(name='pyresttest',
           'Topic :: Utilities'
       ],
       py_modules=['pyresttest.resttest', 'pyresttest.generators', 'pyresttest.binding',
-                  'pyresttest.parsing', 'pyresttest.validators', 'pyresttest.contenthandling',
-                  'pyresttest.benchmarks', 'pyresttest.tests', 
+                  'pyresttest.parsing', 'pyresttest.validators', 'pyresttest.contenthandling', 'pyresttest.responsehandling',
+                  'pyresttest.benchmarks', 'pyresttest.histogram', 'pyresttest.tests', 
                   'pyresttest.six',
                   'pyresttest.ext.validator_jsonschema',
                   'pyresttest.ext.extractor_jmespath'],